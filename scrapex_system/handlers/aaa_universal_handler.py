@@ -9,10 +9,28 @@ import re
 import base64
 import json
 from typing import Dict, List, Optional, Tuple
-import anthropic
-from PIL import Image
-import io
-import fitz  # PyMuPDF
+from blob_store import BlobStore
+from pdf_attachments import first_pdf
+from page_select import page_blocks, plan_pages
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 2
+
+_blob_store = None
+
+
+def load_stored_pdf(pdf_attachments) -> Tuple[Optional[object], int]:
+    """PDF the Gmail fetcher stored as a blob: (local path or bytes, size), or (None, 0)"""
+    global _blob_store
+    if not pdf_attachments:
+        return None, 0
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    source, attachment = first_pdf(_blob_store, pdf_attachments)
+    return source, (attachment['size'] if attachment else 0)
+
 
 def is_aaa_research(sender_email: str, title: str, content_html: str) -> bool:
     """Detect AAA research emails - any email with AAA in subject"""
@@ -23,13 +41,15 @@ def is_aaa_research(sender_email: str, title: str, content_html: str) -> bool:
 
 
 def extract_pdf_from_email(content_html: str) -> Optional[bytes]:
-    """Extract PDF attachment from email HTML"""
-    pdf_pattern = r'data:application/pdf;base64,([A-Za-z0-9+/=]+)'
-    matches = re.findall(pdf_pattern, content_html)
+    """Extract PDF embedded in email HTML (legacy rows, before PDFs were stored as blobs)"""
+    # Cheap substring check first - most emails have no embedded PDF
+    if 'data:application/pdf;base64,' not in (content_html or ''):
+        return None
+    match = re.search(r'data:application/pdf;base64,([A-Za-z0-9+/=]+)', content_html)
     
-    if matches:
+    if match:
         try:
-            pdf_data = base64.b64decode(matches[0])
+            pdf_data = base64.b64decode(match.group(1))
             return pdf_data
         except Exception as e:
             print(f"Error decoding PDF: {e}")
@@ -37,52 +57,22 @@ def extract_pdf_from_email(content_html: str) -> Optional[bytes]:
     return None
 
 
-def pdf_to_images(pdf_data: bytes, max_pages: int = 20) -> List[Tuple[Image.Image, int]]:
-    """Convert PDF pages to images for Claude Vision"""
-    images = []
-    
+def pdf_to_pages(pdf_data, max_pages: int = 20) -> List[Dict]:
+    """Page plan for Claude Vision - figures as images, text pages as text, boilerplate dropped
+    (pdf_data: bytes or a file path)"""
     try:
-        pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
-        
-        for page_num in range(min(len(pdf_doc), max_pages)):
-            page = pdf_doc[page_num]
-            mat = fitz.Matrix(2.0, 2.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.pil_tobytes(format="PNG")
-            img = Image.open(io.BytesIO(img_data))
-            images.append((img, page_num + 1))
-        
-        pdf_doc.close()
-        
+        return [page for page in plan_pages(pdf_data, max_pages=max_pages) if page['kind'] != 'skip']
     except Exception as e:
         print(f"Error converting PDF: {e}")
-    
-    return images
-
+        return []
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
 
-
-def process_with_source_detection(images: List[Tuple[Image.Image, int]], api_key: str) -> Dict:
+def process_with_source_detection(pages: List[Dict], api_key: str) -> Dict:
     """Process PDF with SOURCE DETECTION + Beautiful Analysis"""
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    # Prepare images
-    image_messages = []
-    for img, page_num in images[:20]:
-        img_b64 = image_to_base64(img)
-        image_messages.append({
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": "image/png",
-                "data": img_b64
-            }
-        })
+    client = get_client(api_key)
+    
+    # Page images (figures, cover) and extracted text, in page order
+    page_content = page_blocks(pages)
     
     # Universal prompt with SOURCE DETECTION
     universal_prompt = """You are analyzing a research document. Provide COMPREHENSIVE, DETAILED analysis.
@@ -156,16 +146,15 @@ CRITICAL: Use ALL 16K output tokens - aim for maximum comprehensive detail!"""
     
     try:
         # Use Claude 3.7 Sonnet with high tokens
-        response = client.messages.create(
+        response = cached_create(
+            client, "aaa_research", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=16384,
+            instructions=universal_prompt,  # static - prompt-cached system block
             messages=[
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": universal_prompt},
-                        *image_messages
-                    ]
+                    "content": page_content
                 }
             ]
         )
@@ -383,18 +372,24 @@ def format_universal_output(vision_result: Dict, title: str) -> Dict:
     }
 
 
-def enrich_aaa_research(title: str, content_html: str, api_key: str, pdf_base64: str = None) -> Dict:
-    """Main enrichment for AAA rule - returns detected source"""
+def enrich_aaa_research(title: str, content_html: str, api_key: str, pdf_base64: str = None,
+                        pdf_attachments=None) -> Dict:
+    """Main enrichment for AAA rule - returns detected source
+    
+    pdf_attachments: the row's pdf_attachments column (PDFs stored as blobs by the fetcher)
+    """
     print(f"   🔍 AAA UNIVERSAL Processing: {title[:50]}...")
     
     # Extract PDF
-    if pdf_base64:
+    pdf_data, pdf_size = load_stored_pdf(pdf_attachments)
+    if pdf_data is None and pdf_base64:
         # PDF provided directly as base64 string
-        import base64
         pdf_data = base64.b64decode(pdf_base64)
-    else:
+    elif pdf_data is None:
         # Try to extract from HTML (legacy method)
         pdf_data = extract_pdf_from_email(content_html)
+    if pdf_data is not None and not pdf_size:
+        pdf_size = len(pdf_data)
     
     if not pdf_data:
         from bs4 import BeautifulSoup
@@ -420,13 +415,13 @@ def enrich_aaa_research(title: str, content_html: str, api_key: str, pdf_base64:
                 'detected_source': None
             }
     
-    print(f"   ✅ PDF found ({len(pdf_data)} bytes)")
+    print(f"   ✅ PDF found ({pdf_size} bytes)")
     print(f"   🔍 Auto-detecting source institution...")
     
-    # Convert to images
-    images = pdf_to_images(pdf_data, max_pages=20)
+    # Select pages (images / text)
+    pages = pdf_to_pages(pdf_data, max_pages=20)
     
-    if not images:
+    if not pages:
         return {
             'smart_summary': f"Rule: AAA Research\n\n📄 {title}\n\n[PDF conversion failed]",
             'actors': ['Error'],
@@ -436,10 +431,10 @@ def enrich_aaa_research(title: str, content_html: str, api_key: str, pdf_base64:
             'detected_source': None
         }
     
-    print(f"   📸 {len(images)} pages ready for analysis")
+    print(f"   📸 {len(pages)} pages ready for analysis")
     
     # Process with source detection
-    vision_result = process_with_source_detection(images, api_key)
+    vision_result = process_with_source_detection(pages, api_key)
     
     if vision_result and 'source_detection' in vision_result:
         detected = vision_result['source_detection']['institution']
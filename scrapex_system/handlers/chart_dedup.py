@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Chart Deduplication
+Index of chart fingerprints -> prior per-chart analyses, shared by the VLM handlers
+
+- Fingerprint per image: 256-bit dHash (16x16 gradient signs) for lookup,
+  plus a 64x64 grayscale thumbnail to confirm the match
+- dHash survives re-encoding / resizing (a resent chart is within a few
+  bits), but a chart updated with one more week of data is too - the
+  thumbnail check tells them apart (re-encoded / resized resend: no
+  changed pixels, update: a few at the new data points)
+- SQLite on local disk (WAL), Hamming distance as a SQL function,
+  eviction by age
+- Handlers: look up every chart before the VLM call, send only the charts
+  without a prior analysis, store the per-chart analysis of the new ones
+- Handlers whose output has no per-chart sections ask for CHART NOTES
+  (split_chart_notes) and store those
+
+Usage:
+    python3 chart_dedup.py                  # index size, lifetime hits
+    python3 chart_dedup.py --evict          # run eviction first
+    python3 chart_dedup.py a.png b.png      # distance between two images
+"""
+
+import base64
+import os
+import re
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+INDEX_PATH = os.getenv('CHART_INDEX_PATH', '/home/ubuntu/newspaper_project/cache/chart_index.sqlite')
+INDEX_MAX_AGE_DAYS = int(os.getenv('CHART_INDEX_MAX_AGE_DAYS', '180'))
+DEDUP_DISABLED = os.getenv('CHART_DEDUP', 'on').lower() in ('off', '0', 'false')
+
+# dHash: HASH_SIZE x HASH_SIZE bits; candidates within MAX_DISTANCE bits
+HASH_SIZE = 16
+MAX_DISTANCE = int(os.getenv('CHART_DEDUP_MAX_DISTANCE', '16'))
+
+# Gradient (gray levels) a bit needs - flat chart background otherwise flips on resampling noise
+HASH_MARGIN = 2
+
+# Confirmation: at most MAX_CHANGED_PIXELS thumbnail pixels off by more than PIXEL_TOLERANCE
+THUMB_SIZE = 64
+PIXEL_TOLERANCE = 16
+MAX_CHANGED_PIXELS = int(os.getenv('CHART_DEDUP_MAX_CHANGED_PIXELS', '0'))
+
+# Run eviction every N writes
+EVICT_EVERY = 100
+
+# Handlers without per-chart sections end their answer with this block
+CHART_NOTES_MARKER = '=== CHART NOTES ==='
+CHART_NOTES_INSTRUCTIONS = f"""
+After the analysis, add a final block for the chart index (it is removed before display):
+{CHART_NOTES_MARKER}
+[Chart 1] 2-3 standalone sentences: what the chart shows, latest values, trend
+[Chart 2] ... one line per attached chart image, numbered as labelled in the input"""
+
+# '[Chart 2]' - or '[Chart 2: name]' when the model echoes the input label
+_NOTE_RE = re.compile(r'^\[Chart (\d+)[^\]\n]*\][ \t]*', re.M)
+
+
+def _image(data):
+    from PIL import Image
+
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    return Image.open(BytesIO(data))
+
+
+def dhash(img, size=HASH_SIZE):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a size+1 x size grayscale"""
+    from PIL import Image
+
+    gray = img.convert('L').resize((size + 1, size), Image.Resampling.LANCZOS).tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (gray[offset + col] > gray[offset + col + 1] + HASH_MARGIN)
+    return bits
+
+
+def fingerprint(data):
+    """(dhash hex, thumbnail bytes) of an image (bytes or base64), None if it does not decode"""
+    from PIL import Image
+
+    try:
+        img = _image(data)
+        img.load()
+    except Exception as e:
+        print(f"   ⚠️  Chart fingerprint failed: {e}")
+        return None
+    thumb = img.convert('L').resize((THUMB_SIZE, THUMB_SIZE), Image.Resampling.BOX).tobytes()
+    return f"{dhash(img):0{HASH_SIZE * HASH_SIZE // 4}x}", thumb
+
+
+def hamming(a, b):
+    """Bits differing between two hex hashes"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def changed_pixels(a, b):
+    """Thumbnail pixels that differ by more than PIXEL_TOLERANCE"""
+    return sum(1 for x, y in zip(a, b) if abs(x - y) > PIXEL_TOLERANCE)
+
+
+def split_chart_notes(text):
+    """(answer without the CHART NOTES block, {chart number: note})"""
+    head, marker, tail = text.partition(CHART_NOTES_MARKER)
+    if not marker:
+        return text, {}
+    notes = {}
+    matches = list(_NOTE_RE.finditer(tail))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(tail)
+        note = tail[match.end():end].strip()
+        if note:
+            notes[int(match.group(1))] = note
+    return head.rstrip(), notes
+
+
+class ChartIndex:
+    """SQLite index of chart fingerprints and their analyses"""
+
+    def __init__(self, path=INDEX_PATH, max_age_days=INDEX_MAX_AGE_DAYS,
+                 max_distance=MAX_DISTANCE, max_changed=MAX_CHANGED_PIXELS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_distance = max_distance
+        self.max_changed = max_changed
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.create_function('hamming', 2, hamming, deterministic=True)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS charts (
+                id INTEGER PRIMARY KEY,
+                dhash TEXT,
+                thumb BLOB,
+                name TEXT,
+                analysis TEXT,
+                rule TEXT,
+                title TEXT,
+                created_at REAL,
+                last_used REAL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS charts_created_at ON charts (created_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value REAL
+            );
+        ''')
+        self.conn.commit()
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def lookup(self, fp):
+        """
+        Closest confirmed prior analysis of a fingerprint, or None:
+        {'name', 'analysis', 'rule', 'title', 'created_at', 'distance'}
+        """
+        dhash_hex, thumb = fp
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT id, thumb, name, analysis, rule, title, created_at, hamming(dhash, ?) AS distance '
+                'FROM charts WHERE created_at >= ? AND hamming(dhash, ?) <= ? ORDER BY distance, created_at DESC',
+                (dhash_hex, now - self.max_age, dhash_hex, self.max_distance)
+            ).fetchall()
+            match = next((row for row in rows if changed_pixels(thumb, row[1]) <= self.max_changed), None)
+            if match is None:
+                self._count(misses=1)
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE charts SET last_used = ?, hits = hits + 1 WHERE id = ?', (now, match[0]))
+            self._count(hits=1)
+            self.conn.commit()
+        return {'name': match[2], 'analysis': match[3], 'rule': match[4], 'title': match[5],
+                'created_at': match[6], 'distance': match[7]}
+
+    def add(self, fp, name, analysis, rule, title=''):
+        dhash_hex, thumb = fp
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO charts (dhash, thumb, name, analysis, rule, title, created_at, last_used, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                (dhash_hex, thumb, name, analysis, rule, title, now, now)
+            )
+            self._count(stored=1)
+            self.conn.commit()
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def _count(self, **deltas):
+        """Bump process and lifetime counters (caller holds the lock)"""
+        for name, delta in deltas.items():
+            self.stats[name] += delta
+            self.conn.execute(
+                'INSERT INTO counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                (name, delta)
+            )
+
+    # ------------------------------------------------------------------
+    # Eviction / reporting
+    # ------------------------------------------------------------------
+
+    def evict(self):
+        """Drop analyses older than max_age"""
+        with self.lock:
+            expired = self.conn.execute(
+                'DELETE FROM charts WHERE created_at < ?', (time.time() - self.max_age,)
+            ).rowcount
+            self.conn.commit()
+        if expired:
+            print(f"🧹 Chart index: evicted {expired} expired")
+        return expired
+
+    def lifetime_stats(self):
+        with self.lock:
+            counters = dict(self.conn.execute('SELECT name, value FROM counters').fetchall())
+            counters['entries'] = self.conn.execute('SELECT COUNT(*) FROM charts').fetchone()[0]
+        return counters
+
+    def summary(self):
+        """One-line report of this process's lookups"""
+        s = self.stats
+        return f"Chart index: {s['hits']} reused / {s['misses']} new, {s['stored']} stored"
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index (None when disabled with CHART_DEDUP=off)"""
+    global _index
+    if DEDUP_DISABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = ChartIndex()
+    return _index
+
+
+def find_prior(index, images):
+    """
+    (fingerprints, priors) for images (bytes or base64), in order.
+    Without an index, or for images that do not decode, both are None.
+    """
+    if index is None:
+        return [None] * len(images), [None] * len(images)
+    fingerprints = [fingerprint(image) for image in images]
+    priors = [index.lookup(fp) if fp else None for fp in fingerprints]
+    return fingerprints, priors
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SCRAPEX chart deduplication index')
+    parser.add_argument('--evict', action='store_true', help='Run eviction now')
+    parser.add_argument('images', nargs='*', help='Two image files to compare')
+    args = parser.parse_args()
+
+    if len(args.images) == 2:
+        fps = []
+        for path in args.images:
+            with open(path, 'rb') as f:
+                fps.append(fingerprint(f.read()))
+        if None in fps:
+            return
+        distance = hamming(fps[0][0], fps[1][0])
+        changed = changed_pixels(fps[0][1], fps[1][1])
+        same = distance <= MAX_DISTANCE and changed <= MAX_CHANGED_PIXELS
+        print(f"🔍 dHash distance {distance}/{HASH_SIZE * HASH_SIZE} (max {MAX_DISTANCE}), "
+              f"{changed} changed thumbnail pixels (max {MAX_CHANGED_PIXELS}) -> "
+              f"{'duplicate' if same else 'different'}")
+        return
+
+    index = ChartIndex()
+    if args.evict:
+        index.evict()
+    stats = index.lifetime_stats()
+    hits, misses = int(stats.get('hits', 0)), int(stats.get('misses', 0))
+    rate = hits / (hits + misses) * 100 if hits + misses else 0.0
+    print(f"📦 {stats['entries']} chart analyses ({index.path})")
+    print(f"♻️  {hits} reused / {misses} new lookups ({rate:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Chart Fetcher
+Concurrent download + resize of newsletter chart images for the VLM handlers
+
+- One pooled requests.Session for the process (keep-alive), at most
+  PER_HOST_CONNECTIONS connections per host, FETCH_WORKERS downloads in flight
+- On-disk cache of the RESIZED image keyed by URL + ETag (or Last-Modified):
+  fresh entries (< FRESH_SECONDS) are served without a request, older ones
+  are revalidated with If-None-Match / If-Modified-Since (304 = reuse)
+- Resize (LANCZOS to the API's 1568 px long edge) runs in a process pool;
+  images already small enough in a format the API accepts are kept as-is
+- Results come back in URL order; failed downloads are skipped
+
+Usage:
+    python3 chart_fixture_server.py     # run against a local HTTP fixture server
+    python3 chart_fetcher.py --prune    # drop cache entries older than CHART_CACHE_MAX_AGE_DAYS
+"""
+
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', '/home/ubuntu/newspaper_project/cache/charts')
+FETCH_WORKERS = int(os.getenv('CHART_FETCH_WORKERS', '8'))
+PER_HOST_CONNECTIONS = int(os.getenv('CHART_PER_HOST_CONNECTIONS', '4'))
+RESIZE_WORKERS = int(os.getenv('CHART_RESIZE_WORKERS', str(min(4, os.cpu_count() or 1))))
+CHART_CACHE_MAX_AGE_DAYS = int(os.getenv('CHART_CACHE_MAX_AGE_DAYS', '30'))
+
+# (connect, read) seconds
+FETCH_TIMEOUT = (5, 15)
+
+# Cached charts younger than this are used without asking the server
+FRESH_SECONDS = 24 * 3600
+
+# Claude downscales anything larger on the long edge
+MAX_EDGE = 1568
+
+# Formats the API accepts, kept as downloaded when small enough
+KEEP_FORMATS = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/gif': 'gif'}
+
+USER_AGENT = 'Mozilla/5.0 (compatible; SCRAPEX chart fetcher)'
+
+
+def resize_image(data, max_edge=MAX_EDGE):
+    """(image bytes, media type) fit for the API - runs in a pool worker"""
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    if img.format in KEEP_FORMATS and img.width <= max_edge and img.height <= max_edge:
+        return data, KEEP_FORMATS[img.format]
+    if img.width > max_edge or img.height > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.convert('RGB').save(buffer, format='PNG')
+    return buffer.getvalue(), 'image/png'
+
+
+def _sha(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ChartFetcher:
+    """Pooled, cached, concurrent image fetcher"""
+
+    def __init__(self, cache_dir=CHART_CACHE_DIR, workers=FETCH_WORKERS, per_host=PER_HOST_CONNECTIONS,
+                 resize_workers=RESIZE_WORKERS, fresh_seconds=FRESH_SECONDS, max_edge=MAX_EDGE):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.fresh_seconds = fresh_seconds
+        self.max_edge = max_edge
+
+        # pool_maxsize / pool_block: never more than per_host connections to one host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=per_host, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+
+        self.resize_workers = resize_workers
+        self._resize_pool = None
+        self._lock = threading.Lock()
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0, 'failed': 0}
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _meta_path(self, url):
+        digest = _sha(url)
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def _image_path(self, url, validator, media_type):
+        digest = _sha(f"{url}\n{validator or ''}")
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.{EXTENSIONS.get(media_type, 'png')}")
+
+    def _load_meta(self, url):
+        try:
+            with open(self._meta_path(url)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(meta.get('file', '')) else None
+
+    def _save_meta(self, url, meta):
+        _write_atomic(self._meta_path(url), json.dumps(meta).encode())
+
+    # ------------------------------------------------------------------
+    # Fetch
+    # ------------------------------------------------------------------
+
+    def _resize(self, data):
+        if self.resize_workers <= 1:
+            return resize_image(data, self.max_edge)
+        with self._lock:
+            if self._resize_pool is None:
+                # spawn: the caller runs threads, fork could copy a held lock
+                self._resize_pool = ProcessPoolExecutor(
+                    max_workers=self.resize_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._resize_pool.submit(resize_image, data, self.max_edge).result()
+
+    def _count(self, counts, outcome):
+        with self._lock:
+            counts[outcome] += 1
+            self.stats[outcome] += 1
+
+    def fetch(self, url):
+        """(image bytes, media type, outcome) for one URL; raises on failure"""
+        meta = self._load_meta(url)
+        now = time.time()
+        if meta and now - meta['checked_at'] < self.fresh_seconds:
+            with open(meta['file'], 'rb') as f:
+                return f.read(), meta['media_type'], 'fresh'
+
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        if response.status_code == 304 and meta:
+            meta['checked_at'] = now
+            self._save_meta(url, meta)
+            with open(meta['file'], 'rb') as f:
+                return f.read(), meta['media_type'], 'revalidated'
+        response.raise_for_status()
+
+        data, media_type = self._resize(response.content)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        path = self._image_path(url, etag or last_modified, media_type)
+        _write_atomic(path, data)
+        self._save_meta(url, {
+            'url': url, 'etag': etag, 'last_modified': last_modified,
+            'file': path, 'media_type': media_type, 'checked_at': now,
+        })
+        if meta and meta['file'] != path:  # image changed upstream
+            try:
+                os.remove(meta['file'])
+            except OSError:
+                pass
+        return data, media_type, 'downloaded'
+
+    def fetch_many(self, urls):
+        """
+        Charts for urls, in order: [{'number', 'url', 'base64', 'media_type'}]
+        (number = position in urls, 1-based; failed URLs are left out)
+        """
+        counts = {outcome: 0 for outcome in self.stats}
+
+        def one(url):
+            try:
+                data, media_type, outcome = self.fetch(url)
+            except Exception as e:
+                print(f"   ⚠️  Failed to download image: {e}")
+                outcome, result = 'failed', None
+            else:
+                result = data, media_type
+            self._count(counts, outcome)
+            return result
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(urls)))) as pool:
+            results = list(pool.map(one, urls))
+
+        charts = []
+        for number, (url, result) in enumerate(zip(urls, results), 1):
+            if result is not None:
+                data, media_type = result
+                charts.append({
+                    'number': number,
+                    'url': url,
+                    'base64': base64.b64encode(data).decode('ascii'),
+                    'media_type': media_type,
+                })
+        print(f"   📥 {len(charts)}/{len(urls)} charts in {time.time() - started:.1f}s ({self.summary(counts)})")
+        return charts
+
+    def summary(self, counts=None):
+        """Outcome counts of one fetch_many call, or of the fetcher's lifetime"""
+        s = counts or self.stats
+        return (f"{s['downloaded']} downloaded, {s['revalidated']} revalidated, "
+                f"{s['fresh']} from cache, {s['failed']} failed")
+
+    def close(self):
+        self.session.close()
+        with self._lock:
+            if self._resize_pool is not None:
+                self._resize_pool.shutdown()
+                self._resize_pool = None
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Process-wide fetcher (one session / connection pool for all handlers)"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ChartFetcher()
+    return _fetcher
+
+
+def fetch_charts(urls):
+    return get_fetcher().fetch_many(urls)
+
+
+def prune(max_age_days=CHART_CACHE_MAX_AGE_DAYS, cache_dir=CHART_CACHE_DIR):
+    """Drop cached charts not checked for max_age_days; returns files removed"""
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    print(f"🧹 Chart cache: removed {removed} files older than {max_age_days} days")
+    return removed
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SCRAPEX chart fetcher')
+    parser.add_argument('--prune', action='store_true', help='Remove old cached charts')
+    parser.add_argument('urls', nargs='*', help='Fetch these image URLs')
+    args = parser.parse_args()
+
+    if args.prune:
+        prune()
+    elif args.urls:
+        fetcher = get_fetcher()
+        for chart in fetcher.fetch_many(args.urls):
+            print(f"   #{chart['number']} {chart['media_type']} {len(chart['base64']) * 3 // 4:,} bytes  {chart['url']}")
+        fetcher.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
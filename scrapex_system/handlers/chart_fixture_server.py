@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Chart Fixture Server
+Local HTTP server with generated chart images, for exercising chart_fetcher
+without the network
+
+- /chart/<n>.png (or .jpg): deterministic images, every third one larger than
+  the 1568 px API limit so the resize path runs
+- Strong ETag + Last-Modified on every image; If-None-Match /
+  If-Modified-Since answer 304
+- ?delay=<seconds> (or the server default) simulates a slow CDN
+- Counts requests, 304s and the peak number of concurrent requests
+
+Usage:
+    python3 chart_fixture_server.py                 # cold / cached / revalidated runs + sequential baseline
+    python3 chart_fixture_server.py --serve 8765    # just serve (manual testing)
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+# Fixed Last-Modified for all fixtures
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+
+
+def make_chart(number, fmt='png'):
+    """Deterministic line chart image for fixture number"""
+    from PIL import Image, ImageDraw
+
+    width, height = (2400, 1600) if number % 3 == 0 else (1200, 800)
+    img = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(img)
+    for x in range(0, width, width // 10):
+        draw.line([(x, 0), (x, height)], fill=(230, 230, 230))
+    points = [(x, height // 2 + int((height / 3) * ((x * (number + 7)) % 97 - 48) / 48))
+              for x in range(0, width, 20)]
+    draw.line(points, fill=(20, 60, 160), width=3)
+    draw.text((20, 20), f"Chart {number}", fill='black')
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG' if fmt == 'jpg' else 'PNG')
+    return buffer.getvalue()
+
+
+class ChartFixtureServer:
+    """ThreadingHTTPServer on 127.0.0.1 in a background thread"""
+
+    def __init__(self, port=0, delay=0.0):
+        self.delay = delay
+        self.images = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.active = 0
+        self.peak = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def chart_url(self, number, fmt='png'):
+        return f"{self.url}/chart/{number}.{fmt}"
+
+    def image(self, name):
+        with self.lock:
+            if name not in self.images:
+                stem, fmt = name.rsplit('.', 1)
+                body = make_chart(int(stem), fmt)
+                self.images[name] = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+            return self.images[name]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like a CDN
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    self._serve()
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+            def _serve(self):
+                parsed = urlparse(self.path)
+                delay = float(parse_qs(parsed.query).get('delay', [server.delay])[0])
+                if delay:
+                    time.sleep(delay)
+                name = parsed.path.rsplit('/', 1)[-1]
+                if not parsed.path.startswith('/chart/') or not name.split('.')[0].isdigit():
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body, etag = server.image(name)
+                if self.headers.get('If-None-Match') == etag or (
+                        self.headers.get('If-None-Match') is None
+                        and self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+                    with server.lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg' if name.endswith('.jpg') else 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', LAST_MODIFIED)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests = self.not_modified = self.peak = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    import argparse
+
+    import requests
+
+    from chart_fetcher import ChartFetcher
+
+    parser = argparse.ArgumentParser(description='SCRAPEX chart fixture server')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='Only serve fixtures on PORT')
+    parser.add_argument('--charts', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=0.2, help='Seconds per response')
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        server = ChartFixtureServer(port=args.serve, delay=args.delay)
+        print(f"🖼️  Serving charts on {server.url}/chart/<n>.png (Ctrl-C to stop)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+        return
+
+    cache_dir = tempfile.mkdtemp(prefix='chart-cache-')
+    try:
+        with ChartFixtureServer(delay=args.delay) as server:
+            urls = [server.chart_url(n, 'jpg' if n % 4 == 0 else 'png') for n in range(1, args.charts + 1)]
+            urls.append(f"{server.url}/missing.png")
+            for n in range(1, args.charts + 1):  # render fixtures up front
+                server.image(urls[n - 1].rsplit('/', 1)[-1])
+
+            # Baseline: the old loop, one request after another
+            started = time.time()
+            for url in urls:
+                try:
+                    requests.get(url, timeout=10)
+                except requests.RequestException:
+                    pass
+            print(f"🐢 sequential: {time.time() - started:.2f}s for {len(urls)} URLs")
+
+            fetcher = ChartFetcher(cache_dir=cache_dir)
+            for label, fresh_seconds in (('cold', None), ('cached', None), ('revalidate', 0)):
+                if fresh_seconds is not None:
+                    fetcher.fresh_seconds = fresh_seconds
+                server.reset_counts()
+                started = time.time()
+                charts = fetcher.fetch_many(urls)
+                print(f"⚡ {label}: {time.time() - started:.2f}s, {len(charts)} charts, "
+                      f"{server.requests} requests ({server.not_modified} x 304), "
+                      f"peak {server.peak} concurrent")
+            fetcher.close()
+
+            sizes = sorted({(c['media_type'], len(c['base64'])) for c in charts})
+            print(f"📏 {len(sizes)} distinct outputs, media types: {sorted({m for m, _ in sizes})}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
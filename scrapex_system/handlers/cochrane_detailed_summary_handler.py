@@ -4,7 +4,11 @@ Rich extraction with direct quotes, citations, and extracted phrases
 Always applied to The Grumpy Economist emails
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_cochrane_email(sender_email, sender_display_name, title):
     """
@@ -36,7 +40,7 @@ def enrich_cochrane_detailed(title, content_text, api_key):
     - Uses Claude 3.7 Sonnet with 4K tokens
     """
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Limit content to avoid token limits
     content_for_analysis = content_text[:15000]
@@ -83,7 +87,8 @@ Use: "Cochrane notes 'we really don't know if, how much, or how soon' lower rate
 OUTPUT ONLY the formatted summary, nothing else."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "cochrane_detailed", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             messages=[{
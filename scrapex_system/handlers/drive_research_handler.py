@@ -4,13 +4,14 @@ Auto-detects company, author, and title from PDFs
 October 2025
 """
 
-import anthropic
 import os
-import base64
 from typing import Dict, List, Optional, Tuple
-import fitz  # PyMuPDF
-from PIL import Image
-import io
+from page_select import image_block, kept_text, plan_pages
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 # --- Configuration ---
 MODEL = "claude-3-7-sonnet-20250219"
@@ -18,42 +19,28 @@ MAX_TOKENS = 8192
 PAGES_TO_PROCESS = 20
 
 def extract_pdf_content(pdf_path: str) -> tuple:
-    """Extract text and convert pages to images for VLM"""
+    """
+    Extract text and page images for VLM: (text, image blocks, pages read)
+    Blank / boilerplate pages are dropped; only the cover and figure pages go as images
+    """
     
     print(f"   📄 Extracting content from PDF...")
     
     try:
-        doc = fitz.open(pdf_path)
-        
-        # Extract text
-        full_text = ""
-        for page_num in range(min(PAGES_TO_PROCESS, len(doc))):
-            page = doc[page_num]
-            full_text += page.get_text()
-        
-        # Convert pages to images for VLM
-        images_base64 = []
-        for page_num in range(min(PAGES_TO_PROCESS, len(doc))):
-            page = doc[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x resolution
-            img_bytes = pix.tobytes("png")
-            
-            # Convert to base64
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            images_base64.append(img_base64)
+        plan = plan_pages(pdf_path, max_pages=PAGES_TO_PROCESS)
+        full_text = kept_text(plan)
+        image_blocks = [image_block(page) for page in plan if page['kind'] == 'image']
         
-        doc.close()
+        print(f"   ✅ Extracted {len(full_text)} chars, {len(image_blocks)} page images")
         
-        print(f"   ✅ Extracted {len(full_text)} chars, {len(images_base64)} pages")
-        
-        return full_text, images_base64
+        return full_text, image_blocks, len(plan)
         
     except Exception as e:
         print(f"   ❌ PDF extraction error: {e}")
-        return "", []
+        return "", [], 0
 
 
-def detect_metadata(text_content: str, images_base64: List[str], api_key: str) -> Dict:
+def detect_metadata(text_content: str, image_blocks: List[Dict], api_key: str) -> Dict:
     """
     Detect company, author, and title from PDF using Claude VLM
     Returns: {'company': str, 'author': str, 'title': str}
@@ -62,21 +49,13 @@ def detect_metadata(text_content: str, images_base64: List[str], api_key: str) -
     print(f"   🔍 Detecting metadata (company, author, title)...")
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
         # Build content with first few pages for metadata detection
         content = []
         
         # Add first page images (most likely to have metadata)
-        for img_base64 in images_base64[:3]:
-            content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/png",
-                    "data": img_base64
-                }
-            })
+        content.extend(image_blocks[:3])
         
         # Add text excerpt
         content.append({
@@ -111,7 +90,8 @@ If you cannot determine something, use "Unknown" for that field."""
         })
         
         # Quick metadata detection call
-        message = client.messages.create(
+        message = cached_create(
+            client, "drive_research_metadata", PROMPT_VERSION,
             model="claude-3-5-haiku-20241022",  # Haiku for quick metadata
             max_tokens=500,
             messages=[{
@@ -170,9 +150,9 @@ def enrich_drive_research(
     print(f"   🔬 Processing Drive Research: {filename}...")
     
     # Extract content
-    text_content, images_base64 = extract_pdf_content(pdf_path)
+    text_content, image_blocks, page_count = extract_pdf_content(pdf_path)
     
-    if not text_content and not images_base64:
+    if not text_content and not image_blocks:
         return {
             'smart_summary': f"Rule: Drive Research\n\n# 📁 {filename}\n\n[Could not extract content from PDF]",
             'actors': ['Drive Research'],
@@ -186,7 +166,7 @@ def enrich_drive_research(
         }
     
     # STEP 1: Detect metadata
-    metadata = detect_metadata(text_content, images_base64, api_key)
+    metadata = detect_metadata(text_content, image_blocks, api_key)
     
     # STEP 2: Create comprehensive analysis
     company = metadata.get('company', 'Unknown')
@@ -208,7 +188,7 @@ Format your response as:
 Rule: Drive Research
 
 # {company.upper()} RESEARCH - {title}
-Author: {author} | Pages: {len(images_base64)} | Source: Google Drive
+Author: {author} | Pages: {page_count} | Source: Google Drive
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 🎯 KEY TAKEAWAYS
@@ -276,7 +256,7 @@ CRITICAL INSTRUCTIONS:
 - Topic-organized with emoji headers"""
 
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
         # Build content array with text + images for VLM
         content = []
@@ -288,16 +268,8 @@ CRITICAL INSTRUCTIONS:
                 "text": f"Document text content (first {len(text_content)} chars):\n\n{text_content[:25000]}"
             })
         
-        # Add all page images for VLM analysis
-        for i, img_base64 in enumerate(images_base64[:PAGES_TO_PROCESS], 1):
-            content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/png",
-                    "data": img_base64
-                }
-            })
+        # Add the cover and figure page images for VLM analysis
+        content.extend(image_blocks)
         
         # Add the main prompt
         content.append({
@@ -306,7 +278,8 @@ CRITICAL INSTRUCTIONS:
         })
         
         # Call Claude with VLM
-        message = client.messages.create(
+        message = cached_create(
+            client, "drive_research", PROMPT_VERSION,
             model=MODEL,
             max_tokens=MAX_TOKENS,
             messages=[{
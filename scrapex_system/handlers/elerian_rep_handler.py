@@ -6,8 +6,12 @@ October 2025
 
 from typing import Dict
 from bs4 import BeautifulSoup
-import anthropic
 import re
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 
 def is_elerian_email(sender_email: str, sender_display_name: str, title: str, content_text: str) -> bool:
@@ -162,10 +166,11 @@ Provide a JSON response with:
 }}"""
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
         # Use Claude 3.7 Sonnet with 12K tokens for comprehensive extraction
-        message = client.messages.create(
+        message = cached_create(
+            client, "elerian_rep", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=12288,  # 12K for 80% preservation
             messages=[{
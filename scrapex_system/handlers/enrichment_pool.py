@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Enrichment Worker Pool
+Runs handler calls concurrently for unified_adaptive_enrichment
+
+- N worker threads (handler calls are blocking Anthropic requests)
+- Per-rule concurrency limits (e.g. vision rules capped lower)
+- API requests per minute are limited in llm_client (per request, not per job)
+- Results committed in job order, on the caller's thread, once per item id
+"""
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EnrichmentJob:
+    """One row to enrich: key = item id, rule = enrichment rule, payload = handler args"""
+
+    def __init__(self, key, rule, payload):
+        self.key = key
+        self.rule = rule
+        self.payload = payload
+
+
+class EnrichmentPool:
+    """Bounded concurrent executor with per-rule limits and ordered commits"""
+
+    def __init__(self, workers=4, rule_limits=None):
+        """rule_limits: {rule: max concurrent calls}, rules not listed may use every worker"""
+        self.workers = max(1, workers)
+        self.rule_limits = rule_limits or {}
+
+    def _limit(self, rule):
+        return max(1, self.rule_limits.get(rule, self.workers))
+
+    def run(self, jobs, handle, commit):
+        """
+        handle(job) -> result runs on a worker thread.
+        commit(job, result, error) runs on the calling thread, in job order;
+        error is the exception handle() raised (result is None then).
+        Jobs with an id already seen in this run are dropped.
+        Returns the number of jobs committed.
+        """
+        seen = set()
+        unique = []
+        for job in jobs:
+            if job.key in seen:
+                continue
+            seen.add(job.key)
+            unique.append(job)
+        if not unique:
+            return 0
+
+        cond = threading.Condition()
+        waiting = list(range(len(unique)))  # job indexes not yet dispatched, in order
+        running = defaultdict(int)          # rule -> calls in flight
+        finished = {}                       # index -> (result, error)
+        state = {'active': 0}
+
+        def work(index):
+            job = unique[index]
+            result, error = None, None
+            try:
+                result = handle(job)
+            except Exception as e:
+                error = e
+            with cond:
+                running[job.rule] -= 1
+                state['active'] -= 1
+                finished[index] = (result, error)
+                cond.notify()
+
+        next_commit = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enrich') as executor:
+            while next_commit < len(unique):
+                with cond:
+                    # Dispatch in order, skipping jobs whose rule is at its limit
+                    for index in list(waiting):
+                        if state['active'] >= self.workers:
+                            break
+                        rule = unique[index].rule
+                        if running[rule] >= self._limit(rule):
+                            continue
+                        waiting.remove(index)
+                        running[rule] += 1
+                        state['active'] += 1
+                        executor.submit(work, index)
+
+                    ready = []
+                    while next_commit + len(ready) in finished:
+                        index = next_commit + len(ready)
+                        ready.append((index, finished.pop(index)))
+                    if not ready:
+                        cond.wait()
+                        continue
+
+                for index, (result, error) in ready:
+                    commit(unique[index], result, error)
+                next_commit += len(ready)
+
+        return next_commit
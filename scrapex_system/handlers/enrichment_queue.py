@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Enrichment Queue
+enrichment_queue side table: which unified_feed items still need a rule applied
+
+- One row per feed item: state pending / in_progress / done / failed
+- sync() enqueues items the queue has not seen yet (id column only, no full
+  table read); already-enriched items ("Rule:" summary) go straight to done
+- claim() leases the newest pending ids to one worker (lease_until + token);
+  leases of crashed workers expire and are put back to pending
+- Failed items wait RETRY_DELAY x attempts (lease_until doubles as "not
+  before" for pending rows) and are retried until MAX_ATTEMPTS, then stay failed
+"""
+
+import uuid
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+
+QUEUE_TABLE = "enrichment_queue"
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(minutes=5)
+
+QUEUE_SCHEMA = pa.schema([
+    pa.field('id', pa.string()),
+    pa.field('created_at', pa.timestamp('us')),
+    pa.field('state', pa.string()),
+    pa.field('attempts', pa.int32()),
+    pa.field('lease_until', pa.timestamp('us')),
+    pa.field('lease_token', pa.string()),
+    pa.field('updated_at', pa.timestamp('us')),
+    pa.field('error', pa.string()),
+])
+
+
+def sql_quote(value):
+    """Quote a string literal for a LanceDB filter"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_timestamp(value):
+    return f"timestamp '{value.strftime('%Y-%m-%d %H:%M:%S.%f')}'"
+
+
+def id_filter(ids):
+    return f"id IN ({', '.join(sql_quote(i) for i in ids)})"
+
+
+def is_enriched(summary):
+    """Same test the enrichment loop always used to skip done items"""
+    summary = summary if isinstance(summary, str) else ''
+    return len(summary) > 100 and "Rule:" in summary
+
+
+class EnrichmentQueue:
+    """Lease-based work queue over unified_feed ids"""
+
+    def __init__(self, db, feed_table, lease_seconds=1800, max_attempts=MAX_ATTEMPTS):
+        self.db = db
+        self.feed_table = feed_table
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.table = self._open_or_create()
+
+    def _open_or_create(self):
+        try:
+            return self.db.open_table(QUEUE_TABLE)
+        except ValueError:
+            print(f"➕ Creating {QUEUE_TABLE} table")
+            return self.db.create_table(QUEUE_TABLE, schema=QUEUE_SCHEMA)
+
+    def _ids(self, table, where=None):
+        query = table.search().select(['id'])
+        if where:
+            query = query.where(where)
+        return set(query.limit(None).to_pandas()['id'].dropna())
+
+    # ------------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------------
+
+    def sync(self, chunk_size=500):
+        """Enqueue feed items not in the queue yet; returns how many were added"""
+        new_ids = list(self._ids(self.feed_table) - self._ids(self.table))
+        if not new_ids:
+            return 0
+
+        now = datetime.utcnow()
+        rows = []
+        for start in range(0, len(new_ids), chunk_size):
+            chunk = new_ids[start:start + chunk_size]
+            df = (
+                self.feed_table.search()
+                .where(id_filter(chunk))
+                .select(['id', 'created_at', 'smart_summary'])
+                .limit(len(chunk))
+                .to_pandas()
+            )
+            created = pd.to_datetime(df['created_at'], format='mixed', errors='coerce', utc=True)
+            for item_id, created_at, summary in zip(df['id'], created, df['smart_summary']):
+                rows.append({
+                    'id': item_id,
+                    'created_at': None if pd.isna(created_at) else created_at.tz_convert(None).to_pydatetime(),
+                    'state': DONE if is_enriched(summary) else PENDING,
+                    'attempts': 0,
+                    'lease_until': None,
+                    'lease_token': None,
+                    'updated_at': now,
+                    'error': None,
+                })
+
+        self.table.add(pa.Table.from_pylist(rows, schema=QUEUE_SCHEMA))
+        pending = sum(1 for row in rows if row['state'] == PENDING)
+        print(f"📥 Queued {len(rows)} new items ({pending} pending, {len(rows) - pending} already enriched)")
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Leases
+    # ------------------------------------------------------------------
+
+    def requeue_expired(self):
+        """Put items whose lease ran out (crashed / killed worker) back to pending"""
+        now = datetime.utcnow()
+        where = f"state = '{IN_PROGRESS}' AND lease_until < {sql_timestamp(now)}"
+        expired = self.table.count_rows(where)
+        if expired:
+            self.table.update(
+                where=where,
+                values={'state': PENDING, 'lease_until': None, 'lease_token': None, 'updated_at': now}
+            )
+            print(f"♻️  Re-queued {expired} items with expired leases")
+        return expired
+
+    def claim(self, limit=50):
+        """Lease up to `limit` pending ids (newest first) to this worker"""
+        self.requeue_expired()
+
+        now = datetime.utcnow()
+        df = (
+            self.table.search()
+            .where(f"state = '{PENDING}' AND (lease_until IS NULL OR lease_until < {sql_timestamp(now)})")
+            .select(['id', 'created_at'])
+            .limit(None)
+            .to_pandas()
+        )
+        if df.empty:
+            return []
+        ids = df.sort_values('created_at', ascending=False, na_position='last')['id'].head(limit).tolist()
+
+        token = uuid.uuid4().hex
+        self.table.update(
+            where=f"{id_filter(ids)} AND state = '{PENDING}'",
+            values={
+                'state': IN_PROGRESS,
+                'lease_until': now + timedelta(seconds=self.lease_seconds),
+                'lease_token': token,
+                'updated_at': now,
+            }
+        )
+        # Another worker may have claimed some of them in between
+        claimed = self._ids(self.table, f"lease_token = {sql_quote(token)}")
+        return [item_id for item_id in ids if item_id in claimed]
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+
+    def complete(self, ids):
+        """Mark items done"""
+        if not ids:
+            return
+        self.table.update(
+            where=id_filter(ids),
+            values={'state': DONE, 'lease_until': None, 'lease_token': None,
+                    'updated_at': datetime.utcnow(), 'error': None}
+        )
+
+    def fail(self, item_id, error):
+        """Count a failed attempt: back to pending, or failed after max_attempts"""
+        where = id_filter([item_id])
+        rows = self.table.search().where(where).select(['attempts']).limit(1).to_pandas()
+        attempts = (int(rows['attempts'].iloc[0]) if not rows.empty else 0) + 1
+        now = datetime.utcnow()
+        self.table.update(
+            where=where,
+            values={
+                'attempts': attempts,
+                'state': FAILED if attempts >= self.max_attempts else PENDING,
+                'lease_until': now + RETRY_DELAY * attempts,  # not retried before then
+                'lease_token': None,
+                'updated_at': now,
+                'error': str(error)[:500],
+            }
+        )
+
+    def retry_failed(self):
+        """Give items that used up their attempts another round"""
+        where = f"state = '{FAILED}'"
+        failed = self.table.count_rows(where)
+        if failed:
+            self.table.update(
+                where=where,
+                values={'state': PENDING, 'attempts': 0, 'lease_until': None, 'updated_at': datetime.utcnow()}
+            )
+            print(f"♻️  Re-queued {failed} failed items")
+        return failed
+
+    def counts(self):
+        """{state: number of items}"""
+        return {state: self.table.count_rows(f"state = '{state}'")
+                for state in (PENDING, IN_PROGRESS, DONE, FAILED)}
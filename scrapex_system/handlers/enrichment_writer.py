@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Enrichment Result Writer
+Buffered write-back of enrichment results to unified_feed
+
+- Results are buffered and written as ONE merge_insert keyed on id per flush
+  (every FLUSH_ROWS results or FLUSH_SECONDS, whichever comes first), instead
+  of one tbl.update per item - one table version / manifest per flush
+- Keys travel in the merged data, never interpolated into SQL
+- The queue is updated in the same rhythm (one complete() per flush)
+- compact() folds the small fragments left by frequent flushes back together
+"""
+
+import time
+import pandas as pd
+
+FLUSH_ROWS = 20
+FLUSH_SECONDS = 120
+
+# Compact once this many small fragments have piled up
+COMPACT_SMALL_FRAGMENTS = 32
+
+RESULT_COLUMNS = ['smart_summary', 'actors', 'themes', 'smart_category', 'ai_relevance_score']
+
+
+def compact(table, min_small_fragments=COMPACT_SMALL_FRAGMENTS):
+    """Compact a table's files when small fragments pile up; True if it ran"""
+    try:
+        small = table.stats()['fragment_stats']['num_small_fragments']
+    except Exception as e:
+        print(f"   ⚠️  Could not read stats for {table.name}: {e}")
+        return False
+    if small < min_small_fragments:
+        return False
+    started = time.time()
+    table.optimize()  # compaction + index update, prunes versions older than 7 days
+    print(f"🧹 Compacted {table.name} ({small} small fragments, {time.time() - started:.1f}s)")
+    return True
+
+
+class ResultWriter:
+    """Buffer enrichment results, flush them as one keyed merge"""
+
+    def __init__(self, table, queue, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.table = table
+        self.queue = queue
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.buffer = {}  # id -> result columns (a re-enriched id keeps the latest)
+        self.first_buffered = None
+        self.flushes = 0
+        self.written = 0
+
+    def add(self, item_id, values):
+        """Buffer one result; flushes when the batch is full or old enough"""
+        if not self.buffer:
+            self.first_buffered = time.time()
+        self.buffer[item_id] = {column: values[column] for column in RESULT_COLUMNS}
+        if len(self.buffer) >= self.flush_rows or time.time() - self.first_buffered >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered results in one merge_insert; returns rows written"""
+        if not self.buffer:
+            return 0
+        ids = list(self.buffer)
+        df = pd.DataFrame([{'id': item_id, **self.buffer[item_id]} for item_id in ids],
+                          columns=['id'] + RESULT_COLUMNS)
+        df['ai_relevance_score'] = df['ai_relevance_score'].astype(float)
+        self.buffer = {}
+
+        try:
+            self.table.merge_insert("id").when_matched_update_all().execute(df)
+        except Exception as e:
+            print(f"   ❌ Error saving {len(ids)} results: {e}\n")
+            for item_id in ids:
+                self.queue.fail(item_id, e)
+            return 0
+
+        self.queue.complete(ids)
+        self.flushes += 1
+        self.written += len(ids)
+        print(f"💾 Saved {len(ids)} results (1 table version)")
+        return len(ids)
+
+    def close(self):
+        """Flush what is left, then compact the feed and queue tables if needed"""
+        self.flush()
+        for table in (self.table, self.queue.table):
+            try:
+                compact(table)
+            except Exception as e:
+                print(f"   ⚠️  Compaction of {table.name} failed: {e}")
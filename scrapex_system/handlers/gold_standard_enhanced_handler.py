@@ -4,7 +4,11 @@ Deep dive on main theme + quick hits for supporting stories
 Applies to: Bloomberg Economics Daily, similar thematic content
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_gold_standard_enhanced(sender_email, sender_display_name, title, content_text):
     """
@@ -63,7 +67,7 @@ def enrich_gold_standard_enhanced(title, content_text, newsletter_type, api_key)
     - Uses Claude 3.7 Sonnet with 8K tokens
     """
     
-    client = Anthropic(api_key='YOUR_ANTHROPIC_API_KEY_HERE')
+    client = get_client('YOUR_ANTHROPIC_API_KEY_HERE')
     
     # Use full content for analysis
     content_for_analysis = content_text[:15000]
@@ -126,7 +130,8 @@ Use: "Stephen Jen argues QE 'spoilt fiscal authorities' like 'children of wealth
 OUTPUT ONLY the formatted summary, starting with "Rule: Gold Standard Enhanced"."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "gold_standard_enhanced", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
             messages=[{
@@ -7,7 +7,11 @@ October 2025
 import re
 from typing import Dict, Optional
 from bs4 import BeautifulSoup
-import anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 
 def is_gs_rates(sender_email: str, sender_display_name: str, title: str, content_text: str) -> bool:
@@ -136,8 +140,9 @@ CRITICAL:
     
     try:
         # Use Claude 3.7 Sonnet with high tokens for comprehensive analysis
-        client = anthropic.Anthropic(api_key=api_key)
-        message = client.messages.create(
+        client = get_client(api_key)
+        message = cached_create(
+            client, "gs_rates", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
             messages=[
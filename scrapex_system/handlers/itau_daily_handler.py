@@ -5,8 +5,12 @@ ONE Claude call extracts: formatted_content + actors + themes
 
 from bs4 import BeautifulSoup
 import re
-from anthropic import Anthropic
 import json
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_itau_daily(title, sender_display_name, content_text):
     """Detect if this is an Itau Daily macro report"""
@@ -63,7 +67,7 @@ def extract_with_claude_v26(content_html, content_text, api_key):
         raw_text = raw_text[:15000]
     
     # ONE Claude call for everything
-    client = Anthropic(api_key='YOUR_ANTHROPIC_API_KEY_HERE')
+    client = get_client('YOUR_ANTHROPIC_API_KEY_HERE')
     
     prompt = f"""Extract and format this Itau Daily macro report, then analyze it.
 
@@ -111,7 +115,8 @@ OUTPUT FORMAT (JSON only):
 Return ONLY valid JSON. No commentary before or after."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "itau_daily", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             messages=[{
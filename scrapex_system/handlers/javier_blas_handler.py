@@ -4,7 +4,11 @@ Focused extraction using Javier's actual words about the topic
 Always applied to Javier Blas author alerts from Bloomberg
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_javier_blas_article(sender_email, sender_display_name, content_text):
     """
@@ -38,7 +42,7 @@ def enrich_javier_blas(title, content_text, api_key):
     - Uses Claude 3.7 Sonnet with 4K tokens
     """
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Clean the content - remove the intro line
     cleaned_content = content_text
@@ -89,7 +93,8 @@ Use: "Javier admits 'I'm slightly embarrassed' that his rental Ford Explorer ach
 OUTPUT ONLY the formatted summary, starting with "Rule: Javier"."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "javier_blas", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             messages=[{
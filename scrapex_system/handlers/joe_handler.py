@@ -3,7 +3,11 @@ Joe Rule - Joe Weisenthal / Odd Lots Commentary
 Captures full argument with thesis → evidence → conclusion
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_joe_odd_lots(sender_email, sender_display_name, title, content_text):
     """
@@ -44,7 +48,7 @@ def enrich_joe(title, content_text, api_key):
     - Uses Claude 3.7 Sonnet with 4K tokens
     """
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Use substantial content for full context
     content_for_analysis = content_text[:15000]
@@ -100,7 +104,8 @@ CRITICAL RULES - Joe:
 Output the formatted commentary, starting with "Rule: Joe"."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "joe", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             messages=[{
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Message Batches
+Runs enrichment handlers through the Anthropic Message Batches API (half price,
+asynchronous) instead of one interactive request per item
+
+- The handlers are unchanged: BatchCollector stands in for the client
+  (llm_client.set_client) and records every request instead of sending it
+- Each round: run the handlers, submit the recorded requests as ONE batch,
+  poll until it ends, then run the handlers again - requests answered by the
+  batch return the batch result, new requests (a second call that depends on
+  the first answer) go into the next round
+- Results pass through cached_create as usual, so they fill the response cache
+- Transport is pluggable: AnthropicBatchTransport(client) talks to the API
+  (or any client with the same messages.batches interface, e.g.
+  llm_stub.StubAnthropic for a local fake batch server)
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+# Batch API limits (per batch): 10,000 requests or 256 MB - PDF page / chart
+# images make requests several MB each, so the size cap is hit first
+MAX_BATCH_REQUESTS = 10000
+MAX_BATCH_BYTES = 200 * 1024 * 1024  # margin under 256 MB for the envelope
+
+POLL_SECONDS = 60
+
+# Rounds per run (handlers making dependent calls need one round per call)
+MAX_ROUNDS = 3
+
+
+class Deferred(BaseException):
+    """
+    Raised by BatchCollector for a request that waits for the batch.
+    BaseException so handler fallbacks (`except Exception`) do not fire
+    a second request for the same item.
+    """
+
+
+class BatchRequestError(Exception):
+    """A request of the batch came back errored / canceled / expired"""
+
+
+def request_id(request):
+    """Batch custom_id for a messages.create request (SHA-256, 64 chars)"""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _CollectorMessages:
+    def __init__(self, collector):
+        self.collector = collector
+
+    def create(self, **kwargs):
+        return self.collector._create(kwargs)
+
+
+class BatchCollector:
+    """
+    Client stand-in for batch rounds: answers requests the previous batch
+    answered, records the others and raises Deferred
+    """
+
+    def __init__(self, answers=None, errors=None):
+        self.answers = answers if answers is not None else {}  # custom_id -> Message
+        self.errors = errors if errors is not None else {}     # custom_id -> error text
+        self.requests = {}                                     # custom_id -> request
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.messages = _CollectorMessages(self)
+
+    def _create(self, request):
+        custom_id = request_id(request)
+        if custom_id in self.answers:
+            return self.answers[custom_id]
+        if custom_id in self.errors:
+            raise BatchRequestError(self.errors[custom_id])
+        with self.lock:
+            self.requests.setdefault(custom_id, request)
+        self.local.deferred = True
+        raise Deferred(custom_id)
+
+    def run(self, handle, job):
+        """
+        handle(job), tracking deferred requests of the calling thread.
+        Returns (result, deferred): deferred is True when the item still waits
+        for a batch answer (its result is then meaningless).
+        """
+        self.local.deferred = False
+        try:
+            result = handle(job)
+        except Deferred:
+            result = None
+        return result, self.local.deferred
+
+
+class AnthropicBatchTransport:
+    """Message Batches over an anthropic.Anthropic-compatible client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests):
+        """requests: {custom_id: params} -> batch id"""
+        batch = self.client.messages.batches.create(
+            requests=[{'custom_id': custom_id, 'params': params} for custom_id, params in requests.items()]
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        """(processing_status, request_counts) - status is 'ended' when done"""
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return batch.processing_status, batch.request_counts
+
+    def results(self, batch_id):
+        """Yields (custom_id, message or None, error text or None)"""
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == 'succeeded':
+                yield entry.custom_id, result.message, None
+            else:
+                error = getattr(result, 'error', None)
+                yield entry.custom_id, None, f"{result.type}: {error}" if error else result.type
+
+
+def request_size(custom_id, params):
+    """Bytes a request adds to the batch body (JSON, as the SDK sends it)"""
+    entry = {'custom_id': custom_id, 'params': params}
+    return len(json.dumps(entry, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def split_batches(requests, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES):
+    """
+    Yields ({custom_id: params}, bytes) chunks within both batch limits
+    (a single request over max_bytes goes alone - the API reports it)
+    """
+    chunk, chunk_bytes = {}, 0
+    for custom_id, params in requests.items():
+        size = request_size(custom_id, params)
+        if chunk and (len(chunk) >= max_requests or chunk_bytes + size > max_bytes):
+            yield chunk, chunk_bytes
+            chunk, chunk_bytes = {}, 0
+        chunk[custom_id] = params
+        chunk_bytes += size
+    if chunk:
+        yield chunk, chunk_bytes
+
+
+def run_batch(transport, requests, poll_seconds=POLL_SECONDS):
+    """
+    Submit requests ({custom_id: params}) in batches within MAX_BATCH_REQUESTS /
+    MAX_BATCH_BYTES, wait for them to end. Returns (answers, errors) keyed on custom_id.
+    """
+    answers, errors = {}, {}
+    for chunk, chunk_bytes in split_batches(requests):
+        batch_id = transport.submit(chunk)
+        print(f"📦 Submitted batch {batch_id} ({len(chunk)} requests, {chunk_bytes / 1024 / 1024:.1f} MB)")
+
+        started = time.time()
+        while True:
+            status, counts = transport.status(batch_id)
+            if status == 'ended':
+                break
+            print(f"   ⏳ {batch_id}: {status}, {counts.processing} processing, "
+                  f"{counts.succeeded} succeeded ({(time.time() - started) / 60:.0f} min)")
+            time.sleep(poll_seconds)
+
+        for custom_id, message, error in transport.results(batch_id):
+            if message is not None:
+                answers[custom_id] = message
+            else:
+                errors[custom_id] = error
+        print(f"   ✅ Batch {batch_id} ended: {len(chunk)} requests in {(time.time() - started) / 60:.1f} min")
+
+    # Requests missing from the results count as errors (retried by the queue)
+    for custom_id in requests:
+        if custom_id not in answers and custom_id not in errors:
+            errors[custom_id] = "missing from batch results"
+    return answers, errors
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - LLM Response Cache
+Persistent cache of Claude responses shared by all enrichment handlers
+
+- Key = SHA-256 of (model, rule, prompt template version, full request:
+  system + messages + max_tokens + ...) - identical input never pays twice
+- SQLite on local disk (WAL, safe across worker threads and processes)
+- Eviction by age (max_age_days) and total size (max_bytes, least recently used first)
+- Hit / miss counters with the input / output tokens (and dollars) saved,
+  kept per process and accumulated in the database
+
+Handlers call cached_create(client, rule, PROMPT_VERSION, **kwargs) in place of
+client.messages.create(**kwargs); bump PROMPT_VERSION when a prompt changes.
+Static instructions go in instructions=..., sent as a prompt-cached system block.
+
+Usage:
+    python3 llm_cache.py              # lifetime hits / misses / savings
+    python3 llm_cache.py --evict      # run eviction first
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from llm_client import instructions_system
+
+CACHE_PATH = os.getenv('LLM_CACHE_PATH', '/home/ubuntu/newspaper_project/cache/llm_cache.sqlite')
+CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_MB', '500')) * 1024 * 1024
+CACHE_MAX_AGE_DAYS = int(os.getenv('LLM_CACHE_MAX_AGE_DAYS', '30'))
+CACHE_DISABLED = os.getenv('LLM_CACHE', 'on').lower() in ('off', '0', 'false')
+
+# Run eviction every N writes
+EVICT_EVERY = 100
+
+# USD per million (input, output) tokens, for the savings estimate
+MODEL_PRICES = {
+    'claude-3-5-haiku': (0.80, 4.00),
+    'claude-3-7-sonnet': (3.00, 15.00),
+    'claude-sonnet-4': (3.00, 15.00),
+    'claude-opus-4': (15.00, 75.00),
+}
+DEFAULT_PRICE = (3.00, 15.00)
+
+
+def model_price(model):
+    for prefix, price in MODEL_PRICES.items():
+        if (model or '').startswith(prefix):
+            return price
+    return DEFAULT_PRICE
+
+
+def cost_usd(model, input_tokens, output_tokens):
+    price_in, price_out = model_price(model)
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+def cache_key(model, rule, prompt_version, request):
+    """SHA-256 over everything that determines the response"""
+    payload = json.dumps(
+        {'model': model, 'rule': rule, 'prompt_version': prompt_version, 'request': request},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _TextBlock:
+    type = 'text'
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _Usage:
+    def __init__(self, input_tokens, output_tokens):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class CachedResponse:
+    """Stand-in for an anthropic Message (.content[0].text, .usage, .model)"""
+
+    def __init__(self, text, model, input_tokens=0, output_tokens=0, stop_reason='end_turn'):
+        self.content = [_TextBlock(text)]
+        self.model = model
+        self.usage = _Usage(input_tokens, output_tokens)
+        self.stop_reason = stop_reason
+        self.cached = True
+
+
+def response_text(response):
+    """Concatenated text blocks of a Message"""
+    return ''.join(getattr(block, 'text', '') for block in response.content or [])
+
+
+class LLMCache:
+    """SQLite-backed response cache with eviction and hit/miss accounting"""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'saved_input_tokens': 0,
+                      'saved_output_tokens': 0, 'saved_usd': 0.0}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                rule TEXT,
+                model TEXT,
+                response TEXT,
+                input_tokens INTEGER,
+                output_tokens INTEGER,
+                size INTEGER,
+                created_at REAL,
+                last_used REAL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value REAL
+            );
+        ''')
+        self.conn.commit()
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get(self, key):
+        """CachedResponse for a key, or None (expired entries count as misses)"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT response, model, input_tokens, output_tokens, created_at FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None or now - row[4] > self.max_age:
+                self._count(misses=1)
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            saved = cost_usd(row[1], row[2], row[3])
+            self._count(hits=1, saved_input_tokens=row[2], saved_output_tokens=row[3], saved_usd=saved)
+            self.conn.commit()
+        return CachedResponse(row[0], row[1], row[2], row[3])
+
+    def put(self, key, rule, model, text, input_tokens, output_tokens):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, rule, model, response, input_tokens, output_tokens, size, created_at, last_used, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                (key, rule, model, text, input_tokens, output_tokens, len(text.encode('utf-8')), now, now)
+            )
+            self.conn.commit()
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def _count(self, **deltas):
+        """Bump process and lifetime counters (caller holds the lock)"""
+        for name, delta in deltas.items():
+            self.stats[name] += delta
+            self.conn.execute(
+                'INSERT INTO counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                (name, delta)
+            )
+
+    # ------------------------------------------------------------------
+    # Eviction / reporting
+    # ------------------------------------------------------------------
+
+    def evict(self):
+        """Drop entries older than max_age, then least recently used until under max_bytes"""
+        with self.lock:
+            expired = self.conn.execute(
+                'DELETE FROM responses WHERE created_at < ?', (time.time() - self.max_age,)
+            ).rowcount
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            dropped = 0
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY last_used').fetchall():
+                    if excess <= 0:
+                        break
+                    self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    excess -= size
+                    dropped += 1
+            self.conn.commit()
+        if expired or dropped:
+            print(f"🧹 LLM cache: evicted {expired} expired, {dropped} for size")
+        return expired + dropped
+
+    def lifetime_stats(self):
+        with self.lock:
+            counters = dict(self.conn.execute('SELECT name, value FROM counters').fetchall())
+            entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        counters.update({'entries': entries, 'bytes': size})
+        return counters
+
+    def summary(self):
+        """One-line report of this process's hits / misses / savings"""
+        s = self.stats
+        lookups = s['hits'] + s['misses']
+        rate = s['hits'] / lookups * 100 if lookups else 0.0
+        return (f"LLM cache: {s['hits']} hits / {s['misses']} misses ({rate:.0f}%), "
+                f"saved {s['saved_input_tokens'] + s['saved_output_tokens']:,} tokens ≈ ${s['saved_usd']:.2f}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache (None when disabled with LLM_CACHE=off)"""
+    global _cache
+    if CACHE_DISABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
+
+
+def cached_create(client, rule, prompt_version, instructions=None, **kwargs):
+    """
+    client.messages.create(**kwargs) through the response cache.
+    instructions: static per-handler prompt text, sent first as a system block
+    marked for prompt caching (per-item content stays in messages).
+    """
+    if instructions:
+        kwargs['system'] = instructions_system(instructions, kwargs.get('system'))
+
+    cache = get_cache()
+    if cache is None:
+        return client.messages.create(**kwargs)
+
+    model = kwargs.get('model')
+    key = cache_key(model, rule, prompt_version, kwargs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = client.messages.create(**kwargs)
+    # Only complete answers are worth replaying
+    if getattr(response, 'stop_reason', None) in ('end_turn', 'stop_sequence'):
+        usage = getattr(response, 'usage', None)
+        cache.put(
+            key, rule, model, response_text(response),
+            getattr(usage, 'input_tokens', 0) or 0,
+            getattr(usage, 'output_tokens', 0) or 0
+        )
+    return response
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SCRAPEX LLM response cache')
+    parser.add_argument('--evict', action='store_true', help='Run eviction now')
+    args = parser.parse_args()
+
+    cache = LLMCache()
+    if args.evict:
+        cache.evict()
+    stats = cache.lifetime_stats()
+    hits, misses = int(stats.get('hits', 0)), int(stats.get('misses', 0))
+    rate = hits / (hits + misses) * 100 if hits + misses else 0.0
+    print(f"📦 {stats['entries']} responses, {stats['bytes'] / 1e6:.1f} MB ({cache.path})")
+    print(f"🎯 {hits} hits / {misses} misses ({rate:.0f}%)")
+    print(f"💰 Saved {int(stats.get('saved_input_tokens', 0)):,} input + "
+          f"{int(stats.get('saved_output_tokens', 0)):,} output tokens ≈ ${stats.get('saved_usd', 0.0):.2f}")
+
+
+if __name__ == "__main__":
+    main()
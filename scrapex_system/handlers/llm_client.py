@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - LLM Client
+Shared Anthropic client for the enrichment handlers
+
+- get_client(api_key): one client per API key for the whole process, on a
+  keep-alive HTTP connection pool shared by all worker threads (no TLS
+  handshake / pool setup per call)
+- Retries 429 (rate limit), 529 (overloaded) and dropped connections with
+  full-jitter exponential backoff (honours retry-after)
+- Per-model timeouts (MODEL_TIMEOUTS); a request may still pass timeout=
+- set_rate_limit(rpm): token bucket on requests per minute, shared by all
+  threads - one token per request actually sent (responses served by
+  llm_cache take none, every retry and every call of a multi-call handler
+  takes one)
+- Requests with max_tokens >= STREAM_MIN_TOKENS are streamed (long
+  non-streaming requests hit read timeouts / are refused by the API) and
+  return the same Message as a plain call
+- Per-call latency and token metrics (metrics.summary() at the end of a run)
+- set_client(client): inject a replacement (llm_stub.StubAnthropic, the
+  batch collector, ...) - every handler using get_client() picks it up
+- instructions_system(): static handler instructions as a cacheable system
+  block (prompt caching), so only the per-item content is billed in full
+"""
+
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+# Prompt-cache marker for static instruction blocks (5 minute TTL, refreshed on use)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Connection pool (shared by all threads using the same API key)
+MAX_CONNECTIONS = int(os.getenv('ANTHROPIC_MAX_CONNECTIONS', '20'))
+KEEPALIVE_SECONDS = 60
+CONNECT_TIMEOUT = 10
+
+# Retry policy
+RETRY_STATUS = {429, 529}
+MAX_RETRIES = int(os.getenv('ANTHROPIC_MAX_RETRIES', '5'))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Read timeout per model family (seconds)
+MODEL_TIMEOUTS = {
+    'claude-3-5-haiku': 60,
+    'claude-3-7-sonnet': 300,
+    'claude-sonnet-4': 300,
+    'claude-opus-4': 600,
+}
+DEFAULT_TIMEOUT = 300
+
+# Stream responses this long (16K-token answers take minutes)
+STREAM_MIN_TOKENS = 16000
+
+_clients = {}
+_override = None
+_rate_limiter = None
+_lock = threading.Lock()
+
+
+def model_timeout(model):
+    for prefix, seconds in MODEL_TIMEOUTS.items():
+        if (model or '').startswith(prefix):
+            return seconds
+    return DEFAULT_TIMEOUT
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; retry-after (seconds) is a lower bound"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate_per_minute` tokens/min, at most `burst` saved up"""
+
+    def __init__(self, rate_per_minute, burst=5):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def set_rate_limit(rate_per_minute, burst=5):
+    """Limit requests sent by every LLMClient to rate_per_minute (0 / None = no limit)"""
+    global _rate_limiter
+    _rate_limiter = TokenBucket(rate_per_minute, burst) if rate_per_minute else None
+
+
+class CallMetrics:
+    """Per-model call counts, latency and token totals (thread-safe)"""
+
+    def __init__(self, keep_latencies=1000):
+        self.lock = threading.Lock()
+        self.keep_latencies = keep_latencies
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.models = defaultdict(lambda: {
+                'calls': 0, 'errors': 0, 'retries': 0, 'streamed': 0, 'seconds': 0.0,
+                'input_tokens': 0, 'output_tokens': 0,
+                'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0,
+            })
+            self.latencies = defaultdict(lambda: deque(maxlen=self.keep_latencies))
+
+    def record(self, model, seconds, usage=None, retries=0, streamed=False, error=False):
+        with self.lock:
+            stats = self.models[model]
+            stats['calls'] += 1
+            stats['retries'] += retries
+            stats['seconds'] += seconds
+            if error:
+                stats['errors'] += 1
+                return
+            stats['streamed'] += int(streamed)
+            self.latencies[model].append(seconds)
+            for name in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                stats[name] += getattr(usage, name, 0) or 0
+
+    def percentile(self, model, pct):
+        with self.lock:
+            values = sorted(self.latencies[model])
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    def summary(self):
+        """One line per model used in this process"""
+        lines = []
+        for model in sorted(self.models):
+            s = self.models[model]
+            lines.append(
+                f"{model}: {s['calls']} calls ({s['errors']} failed, {s['retries']} retries, {s['streamed']} streamed), "
+                f"p50 {self.percentile(model, 50):.1f}s / p95 {self.percentile(model, 95):.1f}s, "
+                f"{s['input_tokens']:,} in (+{s['cache_read_input_tokens']:,} cache read, "
+                f"{s['cache_creation_input_tokens']:,} cache write) / {s['output_tokens']:,} out"
+            )
+        return lines
+
+
+metrics = CallMetrics()
+
+
+class _Messages:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, **kwargs):
+        return self.owner.create(kwargs)
+
+    def __getattr__(self, name):
+        # batches, count_tokens, ... go straight to the SDK
+        return getattr(self.owner.client.messages, name)
+
+
+class LLMClient:
+    """anthropic.Anthropic with a pooled connection, retries, timeouts, streaming and metrics"""
+
+    def __init__(self, api_key):
+        import anthropic
+        import httpx
+
+        self.anthropic = anthropic
+        self.client = anthropic.Anthropic(
+            api_key=api_key,
+            max_retries=0,  # retried here, with jitter
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+            ),
+        )
+        self.messages = _Messages(self)
+
+    def _retryable(self, error):
+        if isinstance(error, self.anthropic.APIConnectionError):  # includes timeouts
+            return True
+        return getattr(error, 'status_code', None) in RETRY_STATUS
+
+    def _send(self, kwargs, stream):
+        if stream:
+            with self.client.messages.stream(**kwargs) as response:
+                return response.get_final_message()
+        return self.client.messages.create(**kwargs)
+
+    def create(self, kwargs):
+        """messages.create with retries; streamed when max_tokens >= STREAM_MIN_TOKENS"""
+        model = kwargs.get('model')
+        kwargs.setdefault('timeout', model_timeout(model))
+        stream = (kwargs.get('max_tokens') or 0) >= STREAM_MIN_TOKENS
+
+        started = time.monotonic()
+        waited = 0.0
+        attempt = 0
+        while True:
+            if _rate_limiter is not None:
+                wait_started = time.monotonic()
+                _rate_limiter.acquire()
+                waited += time.monotonic() - wait_started
+            try:
+                message = self._send(kwargs, stream)
+                break
+            except Exception as e:
+                if attempt >= MAX_RETRIES or not self._retryable(e):
+                    metrics.record(model, time.monotonic() - started - waited, retries=attempt, error=True)
+                    raise
+                response = getattr(e, 'response', None)
+                retry_after = response.headers.get('retry-after') if response is not None else None
+                delay = backoff_delay(attempt, retry_after)
+                status = getattr(e, 'status_code', None) or type(e).__name__
+                print(f"   ⏳ {model}: {status}, retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+        # Latency without time spent waiting for a rate-limit token
+        seconds = time.monotonic() - started - waited
+        metrics.record(model, seconds, message.usage, retries=attempt, streamed=stream)
+        usage = message.usage
+        print(f"   ⏱️  {model}: {seconds:.1f}s, {usage.input_tokens:,} in / {usage.output_tokens:,} out"
+              f"{' (streamed)' if stream else ''}")
+        return message
+
+
+def get_client(api_key):
+    """Process-wide client for api_key (or the injected one)"""
+    if _override is not None:
+        return _override
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = LLMClient(api_key)
+            _clients[api_key] = client
+    return client
+
+
+def set_client(client):
+    """Use `client` for every get_client() call (None restores the real client)"""
+    global _override
+    _override = client
+
+
+def instructions_system(instructions, system=None):
+    """
+    System blocks with the static instructions marked cacheable.
+    `system` (optional, str or blocks) is appended after the marker - not cached.
+    """
+    blocks = [{"type": "text", "text": instructions, "cache_control": CACHE_CONTROL}]
+    if isinstance(system, str):
+        blocks.append({"type": "text", "text": system})
+    elif system:
+        blocks.extend(system)
+    return blocks
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SCRAPEX LLM client check')
+    parser.add_argument('--calls', type=int, default=3, help='Sequential calls over one pooled client')
+    parser.add_argument('--model', default='claude-3-5-haiku-20241022')
+    args = parser.parse_args()
+
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        print("❌ Error: ANTHROPIC_API_KEY not found")
+        return
+    client = get_client(api_key)
+    for i in range(args.calls):
+        client.messages.create(
+            model=args.model, max_tokens=20,
+            messages=[{"role": "user", "content": f"Reply with the number {i}."}]
+        )
+    for line in metrics.summary():
+        print(f"📊 {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - Local Messages API Stub
+Offline stand-in for anthropic.Anthropic, to check handler requests
+
+- StubAnthropic().messages.create(**kwargs) records every request and returns a
+  Message-like object; usage simulates prompt caching (first request with a
+  cached prefix -> cache_creation_input_tokens, repeats -> cache_read_input_tokens)
+- cache_marker_problems(request) lists misplaced / missing cache_control markers
+- messages.batches (create / retrieve / results) is a local fake batch server:
+  a batch reports in_progress for `batch_polls` polls, then ended; a reply
+  callable that raises makes that request come back errored
+- Install with llm_client.set_client(StubAnthropic()) - handlers are unchanged
+
+Usage:
+    LLM_CACHE=off python3 llm_stub.py     # run the prompt-cached handlers against the stub
+"""
+
+import hashlib
+import json
+from types import SimpleNamespace
+
+# API limit on cache_control breakpoints per request
+MAX_CACHE_MARKERS = 4
+
+
+def _tokens(value):
+    """Rough token estimate (4 chars per token) of a request fragment"""
+    return len(json.dumps(value, ensure_ascii=False, default=str)) // 4
+
+
+def _blocks(content):
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content or [])
+
+
+def cache_markers(request):
+    """Locations of cache_control markers: ('system', i) / ('messages', i, j)"""
+    markers = []
+    for i, block in enumerate(_blocks(request.get('system'))):
+        if isinstance(block, dict) and 'cache_control' in block:
+            markers.append(('system', i))
+    for i, message in enumerate(request.get('messages', [])):
+        for j, block in enumerate(_blocks(message.get('content'))):
+            if isinstance(block, dict) and 'cache_control' in block:
+                markers.append(('messages', i, j))
+    return markers
+
+
+def cache_marker_problems(request):
+    """Empty list when the static part (system) is cached and per-item content is not"""
+    problems = []
+    markers = cache_markers(request)
+    if len(markers) > MAX_CACHE_MARKERS:
+        problems.append(f"{len(markers)} cache_control markers (API limit {MAX_CACHE_MARKERS})")
+    if not request.get('system'):
+        problems.append("no system block - static instructions are sent with the per-item content")
+    elif not any(marker[0] == 'system' for marker in markers):
+        problems.append("system block has no cache_control marker")
+    for marker in markers:
+        if marker[0] == 'messages':
+            problems.append(f"per-item content marked cacheable at messages[{marker[1]}].content[{marker[2]}]")
+    return problems
+
+
+class _StubBatches:
+    def __init__(self, stub):
+        self.stub = stub
+        self.batches = {}
+
+    def create(self, requests):
+        batch_id = f"msgbatch_stub_{len(self.batches) + 1}"
+        results = []
+        for entry in requests:
+            try:
+                result = SimpleNamespace(type="succeeded", message=self.stub._create(dict(entry['params'])))
+            except Exception as e:
+                result = SimpleNamespace(type="errored", error=str(e))
+            results.append(SimpleNamespace(custom_id=entry['custom_id'], result=result))
+        self.batches[batch_id] = {'results': results, 'polls': 0}
+        return self.retrieve(batch_id, poll=False)
+
+    def retrieve(self, batch_id, poll=True):
+        batch = self.batches[batch_id]
+        if poll:
+            batch['polls'] += 1
+        ended = batch['polls'] > self.stub.batch_polls
+        succeeded = sum(1 for entry in batch['results'] if entry.result.type == "succeeded")
+        return SimpleNamespace(
+            id=batch_id,
+            type="message_batch",
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(
+                processing=0 if ended else len(batch['results']),
+                succeeded=succeeded if ended else 0,
+                errored=len(batch['results']) - succeeded if ended else 0,
+                canceled=0,
+                expired=0,
+            ),
+        )
+
+    def results(self, batch_id):
+        if self.retrieve(batch_id, poll=False).processing_status != "ended":
+            raise RuntimeError(f"{batch_id} has not ended yet")
+        return iter(self.batches[batch_id]['results'])
+
+
+class _StubMessages:
+    def __init__(self, stub):
+        self.stub = stub
+        self.batches = _StubBatches(stub)
+
+    def create(self, **kwargs):
+        return self.stub._create(kwargs)
+
+
+class StubAnthropic:
+    """Records requests; answers with `reply` (str or callable(request) -> str)"""
+
+    def __init__(self, reply="Rule: Stub\n\nStub response.", batch_polls=1):
+        self.reply = reply
+        self.batch_polls = batch_polls
+        self.requests = []
+        self.responses = []
+        self.cached_prefixes = set()
+        self.messages = _StubMessages(self)
+
+    def _create(self, request):
+        self.requests.append(request)
+
+        # Cached prefix = system blocks up to (and including) the last marker
+        system = _blocks(request.get('system'))
+        marked = [i for i, block in enumerate(system) if isinstance(block, dict) and 'cache_control' in block]
+        prefix = system[:marked[-1] + 1] if marked else []
+        prefix_tokens = _tokens(prefix) if prefix else 0
+        creation = read = 0
+        if prefix:
+            digest = hashlib.sha256(json.dumps(prefix, sort_keys=True, default=str).encode()).hexdigest()
+            if digest in self.cached_prefixes:
+                read = prefix_tokens
+            else:
+                creation = prefix_tokens
+                self.cached_prefixes.add(digest)
+        uncached = _tokens(system[len(prefix):]) + _tokens(request.get('messages', []))
+
+        text = self.reply(request) if callable(self.reply) else self.reply
+        response = SimpleNamespace(
+            id=f"msg_stub_{len(self.requests)}",
+            type="message",
+            role="assistant",
+            model=request.get('model'),
+            content=[SimpleNamespace(type="text", text=text)],
+            stop_reason="end_turn",
+            usage=SimpleNamespace(
+                input_tokens=uncached,
+                output_tokens=_tokens(text),
+                cache_creation_input_tokens=creation,
+                cache_read_input_tokens=read,
+            ),
+        )
+        self.responses.append(response)
+        return response
+
+
+def main():
+    import llm_client
+    from shadow_handler import analyze_with_vlm
+    from video_handler import enrich_video_transcript
+
+    stub = StubAnthropic()
+    llm_client.set_client(stub)
+    try:
+        transcript = "HOST: Welcome back. Today we discuss rates, inflation and the dollar. " * 20
+        for i in range(2):
+            enrich_video_transcript(f"Macro talk {i}", transcript + str(i), "", api_key="stub")
+            analyze_with_vlm(f"Sanctions note {i}. " * 50, [], api_key="stub")
+    finally:
+        llm_client.set_client(None)
+
+    for request, response in zip(stub.requests, stub.responses):
+        problems = cache_marker_problems(request)
+        status = "✅" if not problems else "❌ " + "; ".join(problems)
+        usage = response.usage
+        print(f"{status}  markers={cache_markers(request)}  "
+              f"cache write {usage.cache_creation_input_tokens} / read {usage.cache_read_input_tokens} / "
+              f"uncached {usage.input_tokens} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,21 @@ Supports: Macro Charts, ChartStorm (Callum Thomas)
 October 2025
 """
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from bs4 import BeautifulSoup
-import anthropic
 import re
-import base64
-import requests
-from io import BytesIO
-from PIL import Image
+import time
+from chart_dedup import find_prior, get_index
+from chart_fetcher import fetch_charts
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 2
+
+SEPARATOR = '─' * 60
+
+CHART_SECTION_RE = re.compile(r'^### Chart (\d+):[ \t]*(.*)$', re.M)
 
 
 def is_macro_charts(sender_email: str, sender_display_name: str, title: str, content_text: str) -> bool:
@@ -62,30 +69,22 @@ def extract_images_from_html(content_html: str) -> List[str]:
     return image_urls
 
 
-def download_and_encode_image(url: str) -> str:
-    """Download image and convert to base64"""
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            # Convert to PIL Image and resize if needed
-            img = Image.open(BytesIO(response.content))
-            
-            # Resize if too large (Claude has limits)
-            max_size = 1568
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # Convert to PNG bytes
-            buffer = BytesIO()
-            img.convert('RGB').save(buffer, format='PNG')
-            img_bytes = buffer.getvalue()
-            
-            # Encode to base64
-            return base64.b64encode(img_bytes).decode('utf-8')
-    except Exception as e:
-        print(f"   ⚠️  Failed to download image: {e}")
-    
-    return None
+def split_chart_sections(text: str) -> Dict[int, Tuple[str, str]]:
+    """{chart number: (name, analysis)} from the '### Chart N: name' sections of an answer"""
+    matches = list(CHART_SECTION_RE.finditer(text))
+    sections = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = re.split(r'^(?:─{3,}|### )', text[match.end():end], maxsplit=1, flags=re.M)[0]
+        sections[int(match.group(1))] = (match.group(2).strip(), body.strip())
+    return sections
+
+
+def reused_section(number: int, prior: Dict) -> str:
+    """Chart section rebuilt from a prior analysis in the chart index"""
+    seen = time.strftime('%Y-%m-%d', time.localtime(prior['created_at']))
+    return (f"### Chart {number}: {prior['name']}\n\n{prior['analysis']}\n\n"
+            f"*♻️ Analysis reused from \"{prior['title']}\" ({seen})*")
 
 
 def enrich_macro_charts(title: str, content_text: str, content_html: str, api_key: str) -> Dict:
@@ -109,17 +108,8 @@ def enrich_macro_charts(title: str, content_text: str, content_html: str, api_ke
             'ai_relevance_score': 6.0
         }
     
-    # Download and encode images (limit to first 10)
-    chart_images = []
-    for i, url in enumerate(image_urls[:10], 1):
-        print(f"   📥 Downloading chart {i}/{min(len(image_urls), 10)}...")
-        img_b64 = download_and_encode_image(url)
-        if img_b64:
-            chart_images.append({
-                'number': i,
-                'url': url,
-                'base64': img_b64
-            })
+    # Download and encode images (limit to first 10) - concurrent, cached on disk
+    chart_images = fetch_charts(image_urls[:10])
     
     print(f"   ✅ Downloaded {len(chart_images)} charts")
     
@@ -132,14 +122,46 @@ def enrich_macro_charts(title: str, content_text: str, content_html: str, api_ke
             'ai_relevance_score': 6.0
         }
     
+    # Charts resent from earlier issues / other newsletters keep their analysis
+    index = get_index()
+    fingerprints, priors = find_prior(index, [chart['base64'] for chart in chart_images])
+    new_charts = [chart for chart, prior in zip(chart_images, priors) if prior is None]
+    reused = len(chart_images) - len(new_charts)
+    if reused:
+        print(f"   ♻️  {reused} chart(s) analyzed before, {len(new_charts)} new")
+    
+    if not new_charts:
+        sections = [reused_section(number, prior) for number, prior in enumerate(priors, 1)]
+        overall = ("### 💡 Overall Market Implications\n\n"
+                   "[All charts in this email were analyzed in earlier newsletters - analyses above]")
+        summary = f"\n\n{SEPARATOR}\n\n".join(
+            [f"Rule: Charts\n\n# 📊 Macro Charts\n## {title}", *sections, overall])
+        return {
+            'smart_summary': summary,
+            'actors': ['Macro Charts'],
+            'themes': ['Economic Charts', 'Market Analysis'],
+            'smart_category': 'CHART_ANALYSIS',
+            'ai_relevance_score': 9.0
+        }
+    
+    prior_context = ""
+    if reused:
+        prior_notes = "\n\n".join(f"- {prior['name']}: {prior['analysis'][:600]}" for prior in priors if prior)
+        prior_context = f"""
+
+ALREADY ANALYZED: {reused} other chart(s) in this email were analyzed in earlier newsletters.
+Do NOT write sections for them, but use them in the Overall Market Implications:
+
+{prior_notes}"""
+    
     # Prepare images for Claude Vision
     image_messages = []
-    for chart in chart_images:
+    for chart in new_charts:
         image_messages.append({
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
+                "media_type": chart['media_type'],
                 "data": chart['base64']
             }
         })
@@ -149,7 +171,7 @@ def enrich_macro_charts(title: str, content_text: str, content_html: str, api_ke
 
 TITLE: {title}
 
-NUMBER OF CHARTS: {len(chart_images)}
+NUMBER OF CHARTS: {len(new_charts)}{prior_context}
 
 For EACH chart, provide detailed analysis.
 
@@ -191,10 +213,11 @@ Rule: Charts
 CRITICAL: Start your response with EXACTLY "Rule: Charts" on the first line."""
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
         # Use Claude 3.7 Sonnet with VLM
-        response = client.messages.create(
+        response = cached_create(
+            client, "charts_vlm", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
             messages=[{
@@ -216,7 +239,36 @@ CRITICAL: Start your response with EXACTLY "Rule: Charts" on the first line."""
         actors = ['Macro Charts']
         themes = ['Economic Charts', 'Market Analysis']
         
-        print(f"   ✅ Analyzed {len(chart_images)} charts - {len(summary)} chars")
+        # Index the new per-chart analyses; splice the reused ones back in chart order
+        sections = split_chart_sections(response_text)
+        complete = sorted(sections) == list(range(1, len(new_charts) + 1))
+        if index is not None and complete:
+            new_fingerprints = [fp for fp, prior in zip(fingerprints, priors) if prior is None]
+            for number, fp in enumerate(new_fingerprints, 1):
+                name, analysis = sections[number]
+                if fp:
+                    index.add(fp, name, analysis, rule='charts', title=title)
+        elif index is not None:
+            print(f"   ⚠️  {len(sections)} chart sections for {len(new_charts)} charts - not indexed")
+        
+        if reused and complete:
+            parts = [f"Rule: Charts\n\n# 📊 Macro Charts\n## {title}"]
+            new_numbers = iter(range(1, len(new_charts) + 1))
+            for number, prior in enumerate(priors, 1):
+                if prior:
+                    parts.append(reused_section(number, prior))
+                else:
+                    name, analysis = sections[next(new_numbers)]
+                    parts.append(f"### Chart {number}: {name}\n\n{analysis}")
+            overall = response_text.find('### 💡')
+            if overall >= 0:
+                parts.append(response_text[overall:].strip())
+            summary = f"\n\n{SEPARATOR}\n\n".join(parts)
+        elif reused:
+            summary += "\n\n" + "\n\n".join(
+                reused_section(number, prior) for number, prior in enumerate(priors, 1) if prior)
+        
+        print(f"   ✅ Analyzed {len(new_charts)} charts ({reused} reused) - {len(summary)} chars")
         
         return {
             'smart_summary': summary,
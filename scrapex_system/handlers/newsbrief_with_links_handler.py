@@ -6,7 +6,11 @@ Fixed NewsBrief handler with proper response parsing
 import os
 from typing import Dict
 import re
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def enrich_newsbrief_with_links(title, content_text, sender_tag, api_key):
     """
@@ -64,9 +68,10 @@ def enrich_newsbrief_with_links(title, content_text, sender_tag, api_key):
     
     # Call API
     try:
-        client = Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
-        message = client.messages.create(
+        message = cached_create(
+            client, "newsbrief", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             temperature=0,
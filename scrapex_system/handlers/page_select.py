@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - PDF Page Selection
+Decides how each PDF page goes to the VLM, from PyMuPDF's page dictionary
+
+- Scores every page: text density, raster image area, vector figure area
+  (clustered drawings), body font size
+- Blank pages and disclaimer / legal boilerplate are dropped
+- Text-heavy pages go as extracted text (a fraction of the tokens of a page image)
+- Figure pages (and the cover, kept for logos / source detection) go as images
+  at the lowest DPI step where body text stays legible, capped at the API's
+  1568 px long edge (larger images are downscaled server-side anyway);
+  PNG for vector charts and text, JPEG when photos dominate the page
+- Images are rendered through pdf_raster (cached, process pool)
+
+Image tokens are ~ width x height / 750, so a 2x letter page (1224x1584 px)
+costs ~2,600 tokens; the same page at 96 dpi ~1,150; as text often < 800.
+
+Usage:
+    python3 page_select.py report.pdf [more.pdf ...]    # show the plan and the savings
+    python3 page_select.py --check                      # vector chart deck must go as images
+"""
+
+import re
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+from pdf_raster import MAX_PAGES, RASTER_CACHE_DIR, page_base64, pdf_digest, rasterize
+
+DPI_STEPS = (72, 96, 120, 144)
+FULL_DPI = 144
+
+# Body text must render at least this many pixels per em
+MIN_TEXT_PX = 13
+MAX_LONG_EDGE_PX = 1568
+
+BLANK_MAX_CHARS = 40
+TEXT_PAGE_MIN_CHARS = 1200
+
+# Fraction of the page covered by figures / photos
+FIGURE_MIN_AREA = 0.12
+PHOTO_MIN_AREA = 0.25
+
+# Drawings closer than this (pt) belong to one figure - bars, ticks and
+# gridlines of a vector chart are many small separate paths
+FIGURE_GAP_PT = 12
+
+# Clusters thinner than this (pt) are rules / underlines, not charts
+RULE_MAX_PT = 3
+
+# Distinct boilerplate phrases on a page before it is treated as legal text
+BOILERPLATE_MIN_HITS = 3
+BOILERPLATE_PATTERNS = [re.compile(p, re.I) for p in (
+    r'important disclosures?',
+    r'disclaimer',
+    r'analyst certification',
+    r'conflicts? of interest',
+    r'not (?:an?|to be construed as an?) (?:offer|solicitation)',
+    r'for (?:institutional|professional) (?:investors|clients) only',
+    r'all rights reserved',
+    r'(?:authori[sz]ed and )?regulated by',
+    r'past performance is not',
+    r'this (?:report|document|material|publication) (?:has been|is|was) (?:prepared|issued|distributed)',
+    r'may not be (?:reproduced|redistributed|copied)',
+    r'\b(?:FINRA|SIPC|FCA|CVM|SEC)\b',
+    r'legal entit(?:y|ies)',
+    r'should not be relied upon',
+)]
+
+
+def _text_flags():
+    # Text only - image blocks in the dict carry the whole image payload
+    return fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+def _area(rect, page_rect):
+    rect = fitz.Rect(rect) & page_rect
+    return 0.0 if rect.is_empty else rect.width * rect.height
+
+
+def body_font_size(spans):
+    """Font size (pt) of the smallest 10% of the page's characters - footnotes aside"""
+    sizes = sorted((span['size'], len(span['text'].strip())) for span in spans if span['text'].strip())
+    total = sum(chars for _, chars in sizes)
+    if not total:
+        return None
+    seen = 0
+    for size, chars in sizes:
+        seen += chars
+        if seen >= total * 0.1:
+            return size
+    return sizes[-1][0]
+
+
+def legible_dpi(font_size, width_pt, height_pt):
+    """Lowest DPI step that renders font_size at MIN_TEXT_PX, within the long-edge cap"""
+    max_dpi = MAX_LONG_EDGE_PX * 72.0 / max(width_pt, height_pt, 1)
+    needed = MIN_TEXT_PX * 72.0 / font_size if font_size else DPI_STEPS[0]
+    for dpi in DPI_STEPS:
+        if dpi >= needed:
+            return int(min(dpi, max_dpi))
+    return int(min(DPI_STEPS[-1], max_dpi))
+
+
+def merge_rects(rects, gap=FIGURE_GAP_PT):
+    """Union rects that lie within gap of each other, until no two are that close"""
+    merged = [fitz.Rect(rect) for rect in rects]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for rect in sorted(merged, key=lambda r: r.x0):
+            grown = fitz.Rect(rect.x0 - gap, rect.y0 - gap, rect.x1 + gap, rect.y1 + gap)
+            for other in result:
+                if grown.intersects(other):
+                    other.include_rect(rect)
+                    changed = True
+                    break
+            else:
+                result.append(rect)
+        merged = result
+    return merged
+
+
+def figure_rects(page):
+    """Bounding boxes of the page's vector figures (drawings joined across FIGURE_GAP_PT)"""
+    drawings = page.get_drawings()
+    if not drawings:
+        return []
+    if hasattr(page, 'cluster_drawings'):
+        return page.cluster_drawings(drawings=drawings, x_tolerance=FIGURE_GAP_PT, y_tolerance=FIGURE_GAP_PT)
+    return merge_rects([drawing['rect'] for drawing in drawings])  # older PyMuPDF
+
+
+def analyze_page(page):
+    """Score one page from its text dictionary, images and drawings"""
+    page_rect = page.rect
+    page_area = max(page_rect.width * page_rect.height, 1.0)
+
+    info = page.get_text('dict', flags=_text_flags())
+    spans = [span for block in info['blocks'] if block.get('type') == 0
+             for line in block['lines'] for span in line['spans']]
+    text = page.get_text('text', sort=True)
+    chars = len(text.strip())
+
+    photo_area = sum(_area(image['bbox'], page_rect) for image in page.get_image_info())
+    drawing_rects = figure_rects(page)
+    # FIGURE_MIN_AREA applies to the total - one chart can be several clusters
+    figure_area = sum(_area(rect, page_rect) for rect in drawing_rects
+                      if min(rect.width, rect.height) > RULE_MAX_PT)
+
+    hits = sum(1 for pattern in BOILERPLATE_PATTERNS if pattern.search(text))
+    return {
+        'chars': chars,
+        'text': text,
+        'font_size': body_font_size(spans),
+        'photo_area': min(photo_area / page_area, 1.0),
+        'figure_area': min((photo_area + figure_area) / page_area, 1.0),
+        'boilerplate_hits': hits,
+        'width': page_rect.width,
+        'height': page_rect.height,
+    }
+
+
+def classify(score, page_number):
+    """(kind, reason): kind is 'image', 'text' or 'skip'"""
+    if page_number == 1:
+        return 'image', 'cover'
+    if score['figure_area'] >= FIGURE_MIN_AREA:
+        return 'image', 'figure'
+    if score['chars'] <= BLANK_MAX_CHARS:
+        return 'skip', 'blank'
+    if score['boilerplate_hits'] >= BOILERPLATE_MIN_HITS:
+        return 'skip', 'boilerplate'
+    if score['chars'] >= TEXT_PAGE_MIN_CHARS:
+        return 'text', 'text'
+    # Sparse page with little text and no figure (section divider, short note)
+    return 'image', 'layout'
+
+
+def plan_pages(source, max_pages=MAX_PAGES, digest=None, cache_dir=RASTER_CACHE_DIR):
+    """
+    How to send the first max_pages pages of a PDF (bytes or path), in page order:
+    [{'page', 'kind', 'reason', 'text', 'chars', 'width', 'height', 'dpi', 'fmt', 'path'}]
+    kind 'image' entries carry the cached image path; 'skip' entries are kept for stats.
+    """
+    if fitz is None:
+        raise RuntimeError("PyMuPDF (fitz) is not installed")
+    digest = digest or pdf_digest(source)
+    doc = fitz.open(stream=source, filetype="pdf") if isinstance(source, (bytes, bytearray)) else fitz.open(source)
+    plan = []
+    try:
+        for index in range(min(len(doc), max_pages)):
+            score = analyze_page(doc[index])
+            kind, reason = classify(score, index + 1)
+            entry = {'page': index + 1, 'kind': kind, 'reason': reason, 'text': score['text'],
+                     'chars': score['chars'], 'width': score['width'], 'height': score['height'],
+                     'dpi': None, 'fmt': None, 'path': None}
+            if kind == 'image':
+                entry['dpi'] = legible_dpi(score['font_size'], score['width'], score['height'])
+                entry['fmt'] = 'jpg' if score['photo_area'] >= PHOTO_MIN_AREA else 'png'
+            plan.append(entry)
+    finally:
+        doc.close()
+
+    # Render image pages grouped by (dpi, format) - one cached rasterize call per group
+    groups = {}
+    for entry in plan:
+        if entry['kind'] == 'image':
+            groups.setdefault((entry['dpi'], entry['fmt']), []).append(entry)
+    for (dpi, fmt), entries in groups.items():
+        paths = dict((page, path) for path, page in
+                     rasterize(source, pages=[e['page'] for e in entries], dpi=dpi, fmt=fmt, digest=digest,
+                               cache_dir=cache_dir))
+        for entry in entries:
+            entry['path'] = paths[entry['page']]
+
+    print(f"   📑 {summarize(plan)}")
+    return plan
+
+
+def summarize(plan):
+    images = sum(1 for entry in plan if entry['kind'] == 'image')
+    texts = sum(1 for entry in plan if entry['kind'] == 'text')
+    dropped = {}
+    for entry in plan:
+        if entry['kind'] == 'skip':
+            dropped[entry['reason']] = dropped.get(entry['reason'], 0) + 1
+    line = f"{len(plan)} pages: {images} as images, {texts} as text, {sum(dropped.values())} dropped"
+    if dropped:
+        line += " (" + ", ".join(f"{count} {reason}" for reason, count in sorted(dropped.items())) + ")"
+    return line
+
+
+def image_block(entry):
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": "image/jpeg" if entry['fmt'] == 'jpg' else "image/png",
+            "data": page_base64(entry['path'])
+        }
+    }
+
+
+def page_blocks(plan, max_images=None):
+    """
+    Content blocks in page order: images for image pages, one text block per
+    run of consecutive text pages. max_images keeps the first N image pages.
+    """
+    blocks = []
+    texts = []
+    images = 0
+
+    def flush_text():
+        if texts:
+            blocks.append({"type": "text", "text": "\n\n".join(texts)})
+            texts.clear()
+
+    for entry in plan:
+        if entry['kind'] == 'text':
+            texts.append(f"[Page {entry['page']} - extracted text]\n{entry['text'].strip()}")
+        elif entry['kind'] == 'image' and (max_images is None or images < max_images):
+            flush_text()
+            blocks.append(image_block(entry))
+            images += 1
+    flush_text()
+    return blocks
+
+
+def kept_text(plan):
+    """Extracted text of every page that was not dropped"""
+    return "".join(entry['text'] for entry in plan if entry['kind'] != 'skip')
+
+
+def image_tokens(width_pt, height_pt, dpi):
+    """API image tokens for a page rendered at dpi (after the long-edge downscale)"""
+    width_px, height_px = width_pt * dpi / 72.0, height_pt * dpi / 72.0
+    scale = min(1.0, MAX_LONG_EDGE_PX / max(width_px, height_px, 1))
+    return int(width_px * scale * height_px * scale / 750)
+
+
+def estimate_tokens(plan, full_dpi=FULL_DPI):
+    """(input tokens sending every page as a full_dpi image, input tokens with this plan)"""
+    before = after = 0
+    for entry in plan:
+        before += image_tokens(entry['width'], entry['height'], full_dpi)
+        if entry['kind'] == 'image':
+            after += image_tokens(entry['width'], entry['height'], entry['dpi'])
+        elif entry['kind'] == 'text':
+            after += len(entry['text']) // 4
+    return before, after
+
+
+def check(pages=12):
+    """Regression check: every page of the synthetic vector chart deck is sent as an image"""
+    import shutil
+    import tempfile
+
+    from pdf_raster import _synthetic_deck
+
+    cache_dir = tempfile.mkdtemp(prefix='page_select_check_')
+    try:
+        plan = plan_pages(_synthetic_deck(pages), max_pages=pages, cache_dir=cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    missed = [entry['page'] for entry in plan if entry['kind'] != 'image']
+    if missed:
+        print(f"❌ Chart pages not sent as images: {missed}")
+        return False
+    print(f"✅ All {len(plan)} chart pages sent as images")
+    return True
+
+
+def main():
+    import os
+    import sys
+
+    paths = sys.argv[1:]
+    if paths == ['--check']:
+        sys.exit(0 if check() else 1)
+    if not paths:
+        print("Usage: python3 page_select.py report.pdf [more.pdf ...] | --check")
+        return
+    for path in paths:
+        print(f"📄 {os.path.basename(path)}")
+        plan = plan_pages(path)
+        for entry in plan:
+            detail = f"{entry['dpi']} dpi {entry['fmt']}" if entry['kind'] == 'image' else f"{entry['chars']} chars"
+            print(f"   p{entry['page']:>3}  {entry['kind']:<5} {entry['reason']:<12} {detail}")
+        before, after = estimate_tokens(plan)
+        size = sum(os.path.getsize(entry['path']) for entry in plan if entry['kind'] == 'image')
+        print(f"   💰 ~{before:,} -> ~{after:,} input tokens, {size / 1e6:.1f} MB of images\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+SCRAPEX - PDF Rasterization Service
+Renders PDF pages once, for every handler that sends page images to Claude
+
+- Page images are cached on disk keyed by (PDF SHA-256, page, DPI, format):
+  <cache>/<hash[:2]>/<hash>/p<page>-<dpi>.<fmt> - a retried / re-routed PDF
+  is never rendered twice, and the stored PNG bytes go to the API as-is
+  (no pixmap -> PIL -> PNG round trip)
+- Missing pages render in a process pool (one PDF open per worker, contiguous
+  page ranges); small jobs render in-process
+- Files are written atomically (tmp + rename), so concurrent handlers and
+  processes can share the cache
+- One encode per page: pixmap -> PNG/JPEG bytes (encode_pixmap) -> base64;
+  page_base64() memoizes the base64 strings in memory (LRU, ENCODED_CACHE_MB),
+  since the same pages go into retries, batch rounds and several calls per PDF
+- prune() drops PDFs not used for RASTER_CACHE_MAX_AGE_DAYS
+
+Usage:
+    python3 pdf_raster.py --bench fixtures/          # pages/s + peak RSS, cold and warm
+    python3 pdf_raster.py --bench-encode [deck.pdf]  # encode chain: CPU + allocations, 20 pages
+    python3 pdf_raster.py --prune                    # drop old page images
+"""
+
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # only the benchmark / handlers need it
+    fitz = None
+
+RASTER_CACHE_DIR = os.getenv('PDF_RASTER_CACHE', '/home/ubuntu/newspaper_project/cache/page_images')
+RASTER_WORKERS = int(os.getenv('PDF_RASTER_WORKERS', str(min(4, os.cpu_count() or 1))))
+RASTER_CACHE_MAX_AGE_DAYS = int(os.getenv('PDF_RASTER_MAX_AGE_DAYS', '30'))
+
+# 2x the PDF's 72 dpi - the resolution the handlers always rendered at
+DEFAULT_DPI = 144
+DEFAULT_FORMAT = 'png'
+MAX_PAGES = 20
+
+# fmt='jpg' quality (fixed - part of what a cached .jpg file means)
+JPEG_QUALITY = 80
+
+# Memory budget for memoized base64 page images
+ENCODED_CACHE_MB = int(os.getenv('PDF_RASTER_ENCODED_MB', '64'))
+
+# Fewer pages than this render in-process (pool start-up costs more)
+POOL_MIN_PAGES = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pdf_digest(source):
+    """SHA-256 of a PDF given as bytes or a file path (same hash as the blob store)"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_path(digest, page, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT, cache_dir=RASTER_CACHE_DIR):
+    """Cache file for one page (1-based)"""
+    return os.path.join(cache_dir, digest[:2], digest, f"p{page:03d}-{dpi}.{fmt}")
+
+
+def _manifest_path(digest, cache_dir):
+    return os.path.join(cache_dir, digest[:2], digest, 'pdf.json')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def encode_pixmap(pix, fmt=DEFAULT_FORMAT):
+    """Pixmap -> final compressed image bytes, in one encode (no PIL, no re-encode)"""
+    if fmt == 'jpg':
+        return pix.tobytes('jpg', jpg_quality=JPEG_QUALITY)
+    return pix.tobytes(fmt)
+
+
+def encode_base64(data):
+    """Image bytes -> base64 str for an image content block"""
+    return base64.b64encode(data).decode('ascii')
+
+
+def _render_range(source, digest, pages, dpi, fmt, cache_dir):
+    """Render pages (1-based) of one PDF into the cache; runs in a pool worker"""
+    zoom = dpi / 72.0
+    matrix = fitz.Matrix(zoom, zoom)
+    doc = _open(source)
+    try:
+        for page in pages:
+            pix = doc[page - 1].get_pixmap(matrix=matrix)
+            _write_atomic(page_path(digest, page, dpi, fmt, cache_dir), encode_pixmap(pix, fmt))
+    finally:
+        doc.close()
+    return len(pages)
+
+
+def get_pool(workers=RASTER_WORKERS):
+    """Process pool shared by all handler threads (spawned - the parent runs threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def page_count(source, digest, cache_dir=RASTER_CACHE_DIR):
+    """Pages in the PDF (remembered next to its page images)"""
+    manifest = _manifest_path(digest, cache_dir)
+    try:
+        with open(manifest) as f:
+            return json.load(f)['pages']
+    except (OSError, ValueError, KeyError):
+        pass
+    doc = _open(source)
+    count = len(doc)
+    doc.close()
+    _write_atomic(manifest, json.dumps({'pages': count}).encode())
+    return count
+
+
+def rasterize(source, max_pages=MAX_PAGES, dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT, digest=None,
+              cache_dir=RASTER_CACHE_DIR, workers=RASTER_WORKERS, pages=None):
+    """
+    Cached page images of a PDF (bytes or file path): [(path, page_number)]
+    for the first max_pages pages, or for `pages` (1-based) when given.
+    fmt: 'png' or 'jpg'. Only pages missing from the cache are rendered.
+    """
+    if fitz is None:
+        raise RuntimeError("PyMuPDF (fitz) is not installed")
+    digest = digest or pdf_digest(source)
+    if pages is None:
+        pages = range(1, min(page_count(source, digest, cache_dir), max_pages) + 1)
+    pages = list(pages)
+    paths = [(page_path(digest, page, dpi, fmt, cache_dir), page) for page in pages]
+    missing = [page for path, page in paths if not os.path.exists(path)]
+
+    if missing:
+        started = time.time()
+        chunks = max(1, min(workers, len(missing) // POOL_MIN_PAGES))
+        if chunks == 1:
+            _render_range(source, digest, missing, dpi, fmt, cache_dir)
+        else:
+            # One task per worker: contiguous ranges, the PDF is opened once per task
+            size = -(-len(missing) // chunks)
+            pool = get_pool(workers)
+            futures = [pool.submit(_render_range, source, digest, missing[i:i + size], dpi, fmt, cache_dir)
+                       for i in range(0, len(missing), size)]
+            for future in futures:
+                future.result()
+        print(f"   🖼️  Rendered {len(missing)} pages at {dpi} dpi in {time.time() - started:.1f}s "
+              f"({len(paths) - len(missing)} cached)")
+    else:
+        # Touch the directory so prune() keeps PDFs still in use
+        os.utime(os.path.dirname(paths[0][0]) if paths else cache_dir)
+    return paths
+
+
+def page_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class EncodedCache:
+    """LRU of base64 strings keyed by page image path, bounded by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped)
+
+
+_encoded = EncodedCache(ENCODED_CACHE_MB * 1024 * 1024)
+
+
+def page_base64(path):
+    """Base64 of a cached page image (memoized - page files never change)"""
+    encoded = _encoded.get(path)
+    if encoded is None:
+        encoded = encode_base64(page_bytes(path))
+        _encoded.put(path, encoded)
+    return encoded
+
+
+def prune(max_age_days=RASTER_CACHE_MAX_AGE_DAYS, cache_dir=RASTER_CACHE_DIR):
+    """Drop page images of PDFs not rasterized / read for max_age_days; returns PDFs removed"""
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    if not os.path.isdir(cache_dir):
+        return 0
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for digest in os.listdir(prefix_dir):
+            pdf_dir = os.path.join(prefix_dir, digest)
+            if os.path.getmtime(pdf_dir) < cutoff:
+                shutil.rmtree(pdf_dir, ignore_errors=True)
+                removed += 1
+    print(f"🧹 Page image cache: removed {removed} PDFs older than {max_age_days} days")
+    return removed
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BENCHMARK
+# ══════════════════════════════════════════════════════════════════════════════
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its largest finished child (pool worker), MB"""
+    import resource
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024  # ru_maxrss is KB on Linux
+
+
+def benchmark(folder, max_pages=MAX_PAGES, dpi=DEFAULT_DPI, workers=RASTER_WORKERS):
+    """Render every PDF in folder into a scratch cache: cold, then warm"""
+    pdfs = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith('.pdf'))
+    if not pdfs:
+        print(f"❌ No PDFs in {folder}")
+        return
+    cache_dir = tempfile.mkdtemp(prefix='raster_bench_')
+    print(f"📚 {len(pdfs)} PDFs, up to {max_pages} pages at {dpi} dpi, {workers} workers")
+    try:
+        for label in ('cold', 'warm'):
+            started = time.time()
+            pages = 0
+            for pdf in pdfs:
+                pages += len(rasterize(pdf, max_pages=max_pages, dpi=dpi, cache_dir=cache_dir, workers=workers))
+            elapsed = time.time() - started
+            print(f"⏱️  {label}: {pages} pages in {elapsed:.2f}s = {pages / elapsed:.1f} pages/s")
+        shutdown_pool()  # workers must exit to show up in RUSAGE_CHILDREN
+        own, worker = peak_rss_mb()
+        print(f"🧠 Peak RSS: {own:.0f} MB (this process), {worker:.0f} MB (largest pool worker)")
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(cache_dir) for name in names)
+        print(f"💾 Cache: {size / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _synthetic_deck(pages):
+    """Chart-and-text research deck for the encode benchmark"""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((60, 70), f"Research deck - page {number + 1}", fontsize=18)
+        for line in range(18):
+            page.insert_text((60, 100 + line * 13), "Rates, inflation and the dollar across tenors and regions. " * 2, fontsize=8)
+        for bar in range(36):
+            height = 40 + (bar * 37 + number * 11) % 220
+            page.draw_rect(fitz.Rect(70 + bar * 13, 700 - height, 79 + bar * 13, 700),
+                           color=(0.1, 0.2, 0.5), fill=(0.2, 0.4, 0.8))
+    return doc.tobytes()
+
+
+def _measure(label, run, pages):
+    """CPU time and Python allocations (tracemalloc peak / total bytes) of run()"""
+    import tracemalloc
+    tracemalloc.start()
+    started = time.process_time()
+    allocated = run()
+    cpu = time.process_time() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"⏱️  {label:<28} {cpu * 1000 / pages:7.1f} ms/page CPU   peak {peak / 1e6:6.1f} MB   "
+          f"{allocated / 1e6:7.1f} MB of buffers")
+    return cpu
+
+
+def bench_encode(pdf=None, pages=MAX_PAGES, dpi=DEFAULT_DPI):
+    """
+    Legacy chain (pixmap -> PIL PNG -> PIL decode -> PNG again -> base64)
+    vs one encode, vs memoized reads of the cached pages
+    """
+    import io
+    from PIL import Image
+
+    data = open(pdf, 'rb').read() if pdf else _synthetic_deck(pages)
+    doc = fitz.open(stream=data, filetype="pdf")
+    pages = min(pages, len(doc))
+    matrix = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+    print(f"📄 {pdf or 'synthetic deck'}: {pages} pages at {dpi} dpi")
+
+    def legacy():
+        allocated = 0
+        for number in range(pages):
+            pix = doc[number].get_pixmap(matrix=matrix)
+            png = pix.pil_tobytes(format="PNG")
+            img = Image.open(io.BytesIO(png))
+            buffered = io.BytesIO()
+            img.save(buffered, format="PNG")
+            raw = buffered.getvalue()
+            encoded = base64.b64encode(raw).decode()
+            allocated += len(png) + img.width * img.height * 3 + 2 * len(raw) + 2 * len(encoded)
+        return allocated
+
+    def single():
+        allocated = 0
+        for number in range(pages):
+            raw = encode_pixmap(doc[number].get_pixmap(matrix=matrix))
+            encoded = encode_base64(raw)
+            allocated += len(raw) + len(encoded)
+        return allocated
+
+    cache_dir = tempfile.mkdtemp(prefix='encode_bench_')
+    try:
+        paths = [path for path, _ in rasterize(data, max_pages=pages, dpi=dpi, cache_dir=cache_dir, workers=1)]
+
+        def memoized():
+            for path in paths:
+                page_base64(path)
+            return 0
+
+        old = _measure("legacy (2 PNG encodes)", legacy, pages)
+        new = _measure("one encode", single, pages)
+        memoized()  # first read fills the memo
+        _measure("memoized page_base64", memoized, pages)
+        print(f"📉 One encode uses {(1 - new / old) * 100:.0f}% less CPU than the legacy chain")
+    finally:
+        doc.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SCRAPEX PDF rasterization')
+    parser.add_argument('--bench', metavar='FOLDER', help='Benchmark on a folder of PDFs')
+    parser.add_argument('--pages', type=int, default=MAX_PAGES, help='Pages per PDF')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--workers', type=int, default=RASTER_WORKERS)
+    parser.add_argument('--bench-encode', nargs='?', const='', metavar='PDF',
+                        help='Encode micro-benchmark on a deck (synthetic 20 pages if no PDF)')
+    parser.add_argument('--prune', action='store_true', help='Remove page images of old PDFs')
+    args = parser.parse_args()
+
+    if args.bench_encode is not None:
+        bench_encode(args.bench_encode or None, pages=args.pages, dpi=args.dpi)
+    elif args.bench:
+        benchmark(args.bench, max_pages=args.pages, dpi=args.dpi, workers=args.workers)
+    elif args.prune:
+        prune()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
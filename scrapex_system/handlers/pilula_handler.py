@@ -4,7 +4,11 @@ Separate themes + extract details for each story
 Applies to: Pílula, Manchetes, and other Estadão news capsules
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_estadao_pilula(sender_email, sender_display_name, title):
     """
@@ -51,7 +55,7 @@ def enrich_pilula(title, content_text, api_key):
     - Uses Claude 3.7 Sonnet with 2K tokens
     """
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Limit content
     content_for_analysis = content_text[:12000]
@@ -104,7 +108,8 @@ Example format:
 OUTPUT ONLY the formatted summary in Portuguese, starting with "Rule: Pílula"."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "pilula", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=2048,
             messages=[{
@@ -3,6 +3,13 @@ Rosenberg Early Morning - COMPLETE Topic Extraction
 EVERY paragraph/section must be included
 """
 
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
+
+
 def is_rosenberg_deep_research(sender, title, content_text):
     """Detect Rosenberg deep research"""
     is_rosenberg = 'rosenberg' in sender.lower()
@@ -15,7 +22,6 @@ def is_rosenberg_deep_research(sender, title, content_text):
 
 def enrich_rosenberg_deep_research(title, content_text, api_key):
     """COMPLETE extraction - EVERY topic/section included"""
-    from anthropic import Anthropic
     
     prompt = f"""Extract COMPLETE STRUCTURED summary from this Rosenberg "Early Morning with Dave" report.
 YOU MUST INCLUDE EVERY SINGLE TOPIC/PARAGRAPH - DO NOT SKIP ANYTHING.
@@ -151,9 +157,10 @@ Length: ~4000-5000 chars to cover everything comprehensively.
 """
 
     try:
-        client = Anthropic(api_key='YOUR_ANTHROPIC_API_KEY_HERE')
+        client = get_client('YOUR_ANTHROPIC_API_KEY_HERE')
         
-        message = client.messages.create(
+        message = cached_create(
+            client, "rosenberg_deep_research", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
             messages=[{
@@ -7,10 +7,30 @@ October 2025
 import re
 from typing import Dict, List, Optional, Tuple
 from bs4 import BeautifulSoup
-import anthropic
 import base64
 from PIL import Image
 import io
+from blob_store import BlobStore, MEDIA_URL_RE
+from chart_dedup import CHART_NOTES_INSTRUCTIONS, find_prior, get_index, split_chart_notes
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 3
+
+_blob_store = None
+
+
+def load_media_base64(src: str) -> Optional[str]:
+    """Base64 of an image the Gmail fetcher stored in the blob store (/media/<hash>)"""
+    global _blob_store
+    match = MEDIA_URL_RE.search(src)
+    if not match:
+        return None
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    data = _blob_store.get(match.group(1))
+    return base64.b64encode(data).decode() if data else None
 
 
 def is_shadow_price(sender_email: str, sender_display_name: str, title: str, content_text: str) -> bool:
@@ -49,6 +69,13 @@ def extract_images_from_html(content_html: str) -> List[Tuple[str, str]]:
                     images.append((f"Chart {i+1}", base64_str))
             except:
                 pass
+        elif '/media/' in src:
+            try:
+                base64_str = load_media_base64(src)
+                if base64_str:
+                    images.append((f"Chart {i+1}", base64_str))
+            except Exception as e:
+                print(f"   ⚠️ Could not load {src}: {e}")
         
         alt_text = img.get('alt', f'Chart {i+1}')
         if alt_text and i < len(images):
@@ -75,20 +102,11 @@ def extract_clean_text(content_html: str, content_text: str) -> str:
     return content_text[:25000]
 
 
-def analyze_with_vlm(text: str, images: List[Tuple[str, str]], api_key: str) -> str:
-    """Use Claude 3.7 Sonnet with VLM for comprehensive analysis"""
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    message_content = []
-    
-    # Enhanced prompt for more detailed analysis
-    prompt = f"""You are analyzing an economic analysis from Robin J Brooks' Shadow Price Macro newsletter. 
+# Static instructions for analyze_with_vlm (prompt-cached system block)
+SHADOW_VLM_INSTRUCTIONS = """You are analyzing an economic analysis from Robin J Brooks' Shadow Price Macro newsletter. 
 Your task is to write a COMPREHENSIVE, DETAILED analysis AS IF YOU ARE Robin Brooks, using "I" and maintaining his analytical style.
 
-TEXT CONTENT:
-{text}
-
-CHARTS IN THIS ANALYSIS: {len(images)} charts detected
+The newsletter text and its charts follow in the user message.
 
 Write an EXTENSIVE, DETAILED analysis following Robin's style. DO NOT BE BRIEF - provide rich, comprehensive coverage:
 
@@ -231,32 +249,61 @@ REMEMBER:
 - Reference charts as if the reader can see them
 - Include ALL specific numbers with context
 - Develop each point fully - no brief summaries
-- Maintain analytical rigor while being accessible"""
+- Maintain analytical rigor while being accessible
+- Charts marked "seen in an earlier newsletter" come with their prior analysis instead of the image
+""" + CHART_NOTES_INSTRUCTIONS
+
+
+def analyze_with_vlm(text: str, images: List[Tuple[str, str]], api_key: str, title: str = '') -> str:
+    """Use Claude 3.7 Sonnet with VLM for comprehensive analysis"""
+    client = get_client(api_key)
+    
+    message_content = []
+    
+    # Per-item content - the instructions are the cached system block
+    prompt = f"""TEXT CONTENT:
+{text}
+
+CHARTS IN THIS ANALYSIS: {len(images)} charts detected"""
     
     message_content.append({
         "type": "text",
         "text": prompt
     })
     
+    # Charts analyzed before (any newsletter) go as their prior analysis, not as images
+    charts = images[:4]  # Increased to 4 charts
+    index = get_index()
+    fingerprints, priors = find_prior(index, [img_base64 for _, img_base64 in charts])
+    reused = sum(1 for prior in priors if prior)
+    if reused:
+        print(f"   ♻️  {reused} chart(s) analyzed before, {len(charts) - reused} new")
+    
     # Add detected images for VLM analysis
-    for chart_name, img_base64 in images[:4]:  # Increased to 4 charts
-        try:
+    for number, ((chart_name, img_base64), prior) in enumerate(zip(charts, priors), 1):
+        if prior:
             message_content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/png",
-                    "data": img_base64
-                }
+                "type": "text",
+                "text": f"[Chart {number}: {chart_name} - seen in an earlier newsletter, prior analysis]\n{prior['analysis']}"
             })
-        except:
-            pass
+            continue
+        message_content.append({"type": "text", "text": f"[Chart {number}: {chart_name}]"})
+        message_content.append({
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/png",
+                "data": img_base64
+            }
+        })
     
     try:
         # Use Claude 3.7 Sonnet with increased tokens for detailed output
-        message = client.messages.create(
+        message = cached_create(
+            client, "shadow_vlm", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=12000,  # Increased from 8192
+            instructions=SHADOW_VLM_INSTRUCTIONS,
             messages=[
                 {
                     "role": "user",
@@ -265,7 +312,12 @@ REMEMBER:
             ]
         )
         
-        return message.content[0].text
+        analysis, notes = split_chart_notes(message.content[0].text)
+        if index is not None:
+            for number, ((chart_name, _), fp, prior) in enumerate(zip(charts, fingerprints, priors), 1):
+                if fp and not prior and notes.get(number):
+                    index.add(fp, chart_name, notes[number], rule='shadow', title=title)
+        return analysis
         
     except Exception as e:
         print(f"   ❌ VLM analysis error: {e}")
@@ -274,7 +326,7 @@ REMEMBER:
 
 def analyze_text_only(text: str, api_key: str) -> str:
     """Fallback text-only analysis if VLM fails"""
-    client = anthropic.Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     prompt = f"""Analyze this Shadow Price Macro content AS Robin Brooks. 
     
@@ -289,7 +341,8 @@ Reference charts as if visible ("the chart above shows", "as illustrated").
 Provide rich policy recommendations and counterfactual analysis."""
     
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "shadow_text", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=12000,
             messages=[
@@ -325,7 +378,7 @@ def enrich_shadow_price(title: str, content_text: str, content_html: str, api_ke
     print(f"   📈 Found {len(images)} charts for detailed VLM analysis")
     
     # Analyze with VLM for comprehensive output
-    summary = analyze_with_vlm(full_text, images, api_key)
+    summary = analyze_with_vlm(full_text, images, api_key, title=title)
     
     # Extract comprehensive actors list
     actors = ['Robin Brooks', 'Shadow Price Macro']
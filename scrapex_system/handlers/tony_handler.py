@@ -3,7 +3,11 @@ Tony Rule - Tony Pasquariello (Goldman Sachs) Market Commentary
 Preserves his numbered structure, sub-points, and conversational style
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def is_tony_email(sender_email, sender_display_name):
     """
@@ -34,7 +38,7 @@ def enrich_tony(title, content_text, api_key):
     - Uses Claude 3.7 Sonnet with 8K tokens
     """
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Use substantial content (Tony's emails are already concise)
     content_for_analysis = content_text[:25000]
@@ -84,7 +88,8 @@ CRITICAL RULES - Tony:
 Output the formatted commentary, starting with "Rule: Tony"."""
 
     try:
-        message = client.messages.create(
+        message = cached_create(
+            client, "tony", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
             messages=[{
@@ -4,7 +4,11 @@ Preserves original numbered structure and conversational style
 Tony is Head of Global Markets at Goldman Sachs
 """
 
-from anthropic import Anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 1
 
 def enrich_tony_pasquariello(title, content_text, api_key):
     """
@@ -27,7 +31,7 @@ def enrich_tony_pasquariello(title, content_text, api_key):
             'ai_relevance_score': 0.0
         }
     
-    client = Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     # Extract content
     content_for_analysis = content_text[:15000]
@@ -92,7 +96,8 @@ CRITICAL:
 OUTPUT ONLY the formatted summary, starting with "Rule: Tony Pasquariello (Goldman Sachs)"."""
 
     try:
-        response = client.messages.create(
+        response = cached_create(
+            client, "tony_pasquariello", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=4096,
             messages=[{"role": "user", "content": prompt}]
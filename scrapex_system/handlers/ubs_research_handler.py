@@ -9,10 +9,28 @@ import re
 import base64
 import json
 from typing import Dict, List, Optional, Tuple
-import anthropic
-from PIL import Image
-import io
-import fitz  # PyMuPDF
+from blob_store import BlobStore
+from pdf_attachments import first_pdf
+from page_select import page_blocks, plan_pages
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 2
+
+_blob_store = None
+
+
+def load_stored_pdf(pdf_attachments) -> Tuple[Optional[object], int]:
+    """PDF the Gmail fetcher stored as a blob: (local path or bytes, size), or (None, 0)"""
+    global _blob_store
+    if not pdf_attachments:
+        return None, 0
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    source, attachment = first_pdf(_blob_store, pdf_attachments)
+    return source, (attachment['size'] if attachment else 0)
+
 
 def is_ubs_research(sender_email: str, title: str, content_html: str) -> bool:
     """Detect UBS research emails from pribeirojr@me.com"""
@@ -29,13 +47,15 @@ def is_ubs_research(sender_email: str, title: str, content_html: str) -> bool:
 
 
 def extract_pdf_from_email(content_html: str) -> Optional[bytes]:
-    """Extract PDF attachment from email HTML"""
-    pdf_pattern = r'data:application/pdf;base64,([A-Za-z0-9+/=]+)'
-    matches = re.findall(pdf_pattern, content_html)
+    """Extract PDF embedded in email HTML (legacy rows, before PDFs were stored as blobs)"""
+    # Cheap substring check first - most emails have no embedded PDF
+    if 'data:application/pdf;base64,' not in (content_html or ''):
+        return None
+    match = re.search(r'data:application/pdf;base64,([A-Za-z0-9+/=]+)', content_html)
     
-    if matches:
+    if match:
         try:
-            pdf_data = base64.b64decode(matches[0])
+            pdf_data = base64.b64decode(match.group(1))
             return pdf_data
         except Exception as e:
             print(f"Error decoding PDF: {e}")
@@ -43,54 +63,24 @@ def extract_pdf_from_email(content_html: str) -> Optional[bytes]:
     return None
 
 
-def pdf_to_images(pdf_data: bytes, max_pages: int = 20) -> List[Tuple[Image.Image, int]]:
-    """Convert PDF pages to images for Claude Vision"""
-    images = []
-    
+def pdf_to_pages(pdf_data, max_pages: int = 20) -> List[Dict]:
+    """Page plan for Claude Vision - figures as images, text pages as text, boilerplate dropped
+    (pdf_data: bytes or a file path)"""
     try:
-        pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
-        
-        for page_num in range(min(len(pdf_doc), max_pages)):
-            page = pdf_doc[page_num]
-            mat = fitz.Matrix(2.0, 2.0)  # 2x resolution
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.pil_tobytes(format="PNG")
-            img = Image.open(io.BytesIO(img_data))
-            images.append((img, page_num + 1))
-        
-        pdf_doc.close()
-        
+        return [page for page in plan_pages(pdf_data, max_pages=max_pages) if page['kind'] != 'skip']
     except Exception as e:
         print(f"Error converting PDF: {e}")
-    
-    return images
-
-
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+        return []
 
 
-def process_with_beautiful_claude(images: List[Tuple[Image.Image, int]], api_key: str) -> Dict:
+def process_with_beautiful_claude(pages: List[Dict], api_key: str) -> Dict:
     """
     Process with Claude 3.7 - MAXIMUM TOKENS & BEAUTIFUL OUTPUT
     """
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    # Prepare images
-    image_messages = []
-    for img, page_num in images[:15]:  # Increased to 15 pages
-        img_b64 = image_to_base64(img)
-        image_messages.append({
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": "image/png",
-                "data": img_b64
-            }
-        })
+    client = get_client(api_key)
+    
+    # Page images (figures, cover) and extracted text, in page order
+    page_content = page_blocks(pages)
     
     # Enhanced prompt for BEAUTIFUL, ORGANIZED output
     beautiful_prompt = """You are an elite financial analyst creating a BEAUTIFUL, CLEAN research summary.
@@ -162,16 +152,15 @@ Return this BEAUTIFUL JSON:
     
     try:
         # Use Claude 3.7 Sonnet with MAXIMUM tokens
-        response = client.messages.create(
+        response = cached_create(
+            client, "ubs_research", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",  # Latest Feb 2025 model
             max_tokens=16384,  # DOUBLED from 8192 to 16384!
+            instructions=beautiful_prompt,  # static - prompt-cached system block
             messages=[
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": beautiful_prompt},
-                        *image_messages
-                    ]
+                    "content": page_content
                 }
             ]
         )
@@ -388,12 +377,18 @@ def format_beautiful_output(vision_result: Dict, title: str) -> Dict:
     }
 
 
-def enrich_ubs_research(title: str, content_html: str, api_key: str) -> Dict:
-    """Main enrichment with BEAUTIFUL output"""
+def enrich_ubs_research(title: str, content_html: str, api_key: str, pdf_attachments=None) -> Dict:
+    """Main enrichment with BEAUTIFUL output
+    
+    pdf_attachments: the row's pdf_attachments column (PDFs stored as blobs by the fetcher)
+    """
     print(f"   🎨 BEAUTIFUL Processing: {title[:50]}...")
     
-    # Extract PDF
-    pdf_data = extract_pdf_from_email(content_html)
+    # Extract PDF - stored blob first, legacy data URL in the HTML otherwise
+    pdf_data, pdf_size = load_stored_pdf(pdf_attachments)
+    if pdf_data is None:
+        pdf_data = extract_pdf_from_email(content_html)
+        pdf_size = len(pdf_data) if pdf_data else 0
     
     if not pdf_data:
         from bs4 import BeautifulSoup
@@ -417,12 +412,12 @@ def enrich_ubs_research(title: str, content_html: str, api_key: str) -> Dict:
                 'ai_relevance_score': 7.0
             }
     
-    print(f"   ✅ PDF found ({len(pdf_data)} bytes)")
+    print(f"   ✅ PDF found ({pdf_size} bytes)")
     
-    # Convert to images
-    images = pdf_to_images(pdf_data, max_pages=15)  # More pages
+    # Select pages (images / text)
+    pages = pdf_to_pages(pdf_data, max_pages=15)  # More pages
     
-    if not images:
+    if not pages:
         return {
             'smart_summary': f"Rule: UBS Research\n\n📄 {title}\n\n[Conversion failed]",
             'actors': ['UBS'],
@@ -431,11 +426,11 @@ def enrich_ubs_research(title: str, content_html: str, api_key: str) -> Dict:
             'ai_relevance_score': 7.0
         }
     
-    print(f"   📸 {len(images)} pages ready")
+    print(f"   📸 {len(pages)} pages ready")
     print(f"   🎨 Creating BEAUTIFUL summary with Claude 3.7...")
     
     # Process with BEAUTIFUL Claude
-    vision_result = process_with_beautiful_claude(images, api_key)
+    vision_result = process_with_beautiful_claude(pages, api_key)
     
     # Format beautifully
     result = format_beautiful_output(vision_result, title)
@@ -25,6 +25,40 @@ from itau_daily_handler import enrich_itau_daily
 from shadow_handler import enrich_shadow_price
 from macrocharts_handler import enrich_macro_charts
 from elerian_rep_handler import enrich_elerian_rep
+from aaa_universal_handler import enrich_aaa_research, is_aaa_research
+from ubs_research_handler import enrich_ubs_research, is_ubs_research
+from pdf_attachments import parse_attachments
+from enrichment_pool import EnrichmentJob, EnrichmentPool
+from enrichment_queue import EnrichmentQueue, MAX_ATTEMPTS, id_filter, is_enriched
+from enrichment_writer import ResultWriter
+from chart_dedup import get_index
+from llm_cache import get_cache
+from llm_client import get_client, metrics, set_client, set_rate_limit
+from llm_batch import AnthropicBatchTransport, BatchCollector, MAX_ROUNDS, run_batch
+
+# ══════════════════════════════════════════════════════════════════════════════
+# CONCURRENCY
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Handler calls running in parallel (each is a 10-60s Anthropic request)
+ENRICH_WORKERS = int(os.getenv('ENRICH_WORKERS', '4'))
+
+# Anthropic requests per minute across all workers (token bucket in llm_client,
+# one token per request sent - cache hits take none)
+ANTHROPIC_RPM = int(os.getenv('ANTHROPIC_RPM', '50'))
+
+# Per-rule caps below ENRICH_WORKERS (vision rules send many images per call)
+RULE_CONCURRENCY = {
+    "shadow_vlm": 2,
+    "charts_vlm": 2,
+}
+
+# Queue ids leased per batch, and how long a lease lasts before it is re-queued
+CLAIM_BATCH = 40
+ENRICH_LEASE_SECONDS = int(os.getenv('ENRICH_LEASE_SECONDS', '1800'))
+
+# --batch: leases must outlive a Message Batch (up to 24h)
+BATCH_LEASE_SECONDS = int(os.getenv('BATCH_LEASE_SECONDS', str(25 * 3600)))
 
 # ══════════════════════════════════════════════════════════════════════════════
 # TAG → RULE MAPPING TABLE
@@ -81,10 +115,11 @@ TAG_TO_RULE = {
 }
 
 
-def apply_rule(tag, rule, title, content_text, content_html, api_key):
+def apply_rule(tag, rule, title, content_text, content_html, api_key, pdf_attachments=None):
     """
     Apply the enrichment rule based on tag
     Simple switch statement - no complex detection!
+    pdf_attachments: the row's stored PDF blobs, for the PDF research rules
     """
     
     print(f"   📋 Tag: {tag} → Rule: {rule}")
@@ -129,6 +164,13 @@ def apply_rule(tag, rule, title, content_text, content_html, api_key):
         elif rule == "charts_vlm":
             return enrich_macro_charts(title, content_text, content_html, api_key)
         
+        # PDF research (stored PDF blobs, legacy data URL in the HTML otherwise)
+        elif rule == "ubs_research":
+            return enrich_ubs_research(title, content_html, api_key, pdf_attachments=pdf_attachments)
+        
+        elif rule == "aaa_research":
+            return enrich_aaa_research(title, content_html, api_key, pdf_attachments=pdf_attachments)
+        
         # El-Erian REP
         elif rule == "elerian_rep":
             return enrich_elerian_rep(title, content_text, api_key)
@@ -155,9 +197,148 @@ def apply_rule(tag, rule, title, content_text, content_html, api_key):
         }
 
 
-def enrich_items(last_n=None):
+def has_pdf(pdf_attachments, content_html):
+    """Stored PDF blobs, or a PDF still embedded in the HTML (rows fetched before blobs)"""
+    return bool(pdf_attachments) or 'data:application/pdf;base64,' in content_html
+
+
+def sender_email(row):
+    """Sender address from custom_fields.email (empty when missing)"""
+    custom_fields = row.get('custom_fields')
+    email_fields = custom_fields.get('email') if isinstance(custom_fields, dict) else None
+    return str((email_fields or {}).get('sender_email') or '')
+
+
+def pdf_rule(row, title, content_html, pdf_attachments):
+    """PDF research rule for a row carrying a PDF, or None"""
+    if not has_pdf(pdf_attachments, content_html):
+        return None
+    if is_ubs_research(sender_email(row), title, content_html):
+        return "ubs_research"
+    if is_aaa_research(sender_email(row), title, content_html):
+        return "aaa_research"
+    return None
+
+
+def build_job(row):
+    """EnrichmentJob for a feed row, or None if it is already enriched"""
+    # Get fields
+    item_id = row.get('id', '')
+    tag = str(row.get('display_name', 'Unknown'))
+    title = str(row.get('title', ''))
+    content_text = str(row.get('content_text', ''))
+    content_html = str(row.get('content_html', ''))
+    
+    # Skip if already enriched (has Rule: label and content)
+    if is_enriched(row.get('smart_summary')):
+        return None
+    
+    # CRITICAL FIX (Oct 29): Extract from HTML if content_text is empty
+    # Prevents hallucination when content_text is not populated by fetcher
+    if not content_text or len(content_text.strip()) < 100:
+        if content_html and len(content_html) > 100:
+            try:
+                # Extract clean text from HTML using BeautifulSoup
+                from bs4 import BeautifulSoup
+                import re
+                
+                soup = BeautifulSoup(content_html, 'html.parser')
+                # Remove script and style elements
+                for script in soup(["script", "style"]):
+                    script.decompose()
+                
+                # Get text
+                extracted_text = soup.get_text(separator='\n', strip=True)
+                # Clean up multiple newlines
+                extracted_text = re.sub(r'\n\s*\n+', '\n\n', extracted_text)
+                
+                if len(extracted_text) > 100:
+                    content_text = extracted_text
+                    print(f"   ⚠️  Extracted {len(content_text)} chars from HTML (content_text was empty)")
+            except Exception as e:
+                print(f"   ❌ HTML extraction failed: {e}")
+    
+    # Stored PDF blobs (NULL / NaN for rows without attachments)
+    value = row.get('pdf_attachments')
+    pdf_attachments = parse_attachments(value) if isinstance(value, str) else []
+    
+    # Look up rule for this tag (PDF research first - it needs the attachment)
+    rule = pdf_rule(row, title, content_html, pdf_attachments) or TAG_TO_RULE.get(tag, "gold_standard_enhanced")
+    return EnrichmentJob(item_id, rule, (tag, title, content_text, content_html, pdf_attachments))
+
+
+def load_rows(tbl, ids):
+    """Feed rows for claimed ids, newest first"""
+    df = tbl.search().where(id_filter(ids)).limit(len(ids)).to_pandas()
+    if 'pdf_attachments' not in df.columns:  # table not backfilled yet
+        df['pdf_attachments'] = None
+    df['created_at'] = pd.to_datetime(df['created_at'], format='mixed', errors='coerce', utc=True)
+    return df.sort_values('created_at', ascending=False)
+
+
+def claim_jobs(queue, tbl, limit):
+    """Lease up to `limit` queue ids -> (jobs, claimed, skipped); already-enriched rows are marked done"""
+    ids = queue.claim(limit)
+    if not ids:
+        return [], 0, 0
+    
+    jobs = []
+    already_done = []
+    for _, row in load_rows(tbl, ids).iterrows():
+        job = build_job(row)
+        if job is None:
+            already_done.append(row['id'])
+        else:
+            jobs.append(job)
+    queue.complete(already_done)
+    return jobs, len(ids), len(already_done)
+
+
+def enrich_in_batches(jobs, handle, commit, workers, transport):
+    """
+    Batch mode: handlers run against a BatchCollector (no API calls), the
+    requests they make go out as one Message Batch per round, and an item is
+    committed once all its requests are answered.
+    Returns the jobs still waiting after MAX_ROUNDS.
+    """
+    answers, errors = {}, {}
+    pool = EnrichmentPool(workers=workers)  # handler passes make no API calls
+    
+    for round_number in range(1, MAX_ROUNDS + 1):
+        collector = BatchCollector(answers, errors)
+        waiting = []
+        
+        def commit_answered(job, outcome, error):
+            if error is None and outcome[1]:
+                waiting.append(job)
+            else:
+                commit(job, None if error is not None else outcome[0], error)
+        
+        set_client(collector)
+        try:
+            pool.run(jobs, lambda job: collector.run(handle, job), commit_answered)
+        finally:
+            set_client(None)
+        
+        if not waiting:
+            return []
+        print(f"\n🔁 Round {round_number}: {len(waiting)} items wait on {len(collector.requests)} requests\n")
+        round_answers, round_errors = run_batch(transport, collector.requests)
+        answers.update(round_answers)
+        errors.update(round_errors)
+        jobs = waiting
+    
+    return jobs
+
+
+def enrich_items(last_n=None, workers=ENRICH_WORKERS, rpm=ANTHROPIC_RPM, retry_failed=False,
+                 batch=False, batch_transport=None):
     """
     Main enrichment function - SIMPLE TAG → RULE routing
+    Work comes from the enrichment_queue table (pending ids, leased per batch);
+    handler calls run on a worker pool, results are merged back in batches.
+    batch=True: all pending items go through the Message Batches API instead
+    (batch_transport defaults to AnthropicBatchTransport on the real client)
     """
     
     print("\n" + "="*80)
@@ -165,125 +346,125 @@ def enrich_items(last_n=None):
     print("="*80)
     print(f"Time: {datetime.now()}\n")
     
+    # Get API key
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        print("❌ Error: ANTHROPIC_API_KEY not found")
+        return
+    
     # Connect to database
     db = lancedb.connect("s3://sage-unified-feed-lance/sage4_fresh/")
     tbl = db.open_table("unified_feed")
-    df = tbl.to_pandas()
     
-    # Convert timestamp
-    df['created_at'] = pd.to_datetime(df['created_at'], format='mixed', errors='coerce', utc=True)
-    
-    # Sort by newest first
-    df = df.sort_values('created_at', ascending=False)
+    # Enqueue new feed items, put back crashed leases
+    queue = EnrichmentQueue(db, tbl, lease_seconds=BATCH_LEASE_SECONDS if batch else ENRICH_LEASE_SECONDS)
+    queue.sync()
+    if retry_failed:
+        queue.retry_failed()
+    print(f"📋 Queue: {queue.counts()}")
     
     # Limit if requested
     if last_n:
-        df = df.head(last_n)
-        print(f"MODE: Backlog - Processing last {last_n} emails")
+        print(f"MODE: Backlog - Processing last {last_n} pending emails")
     else:
-        print(f"MODE: All emails")
+        print(f"MODE: All pending emails")
     
-    print(f"Items to check: {len(df)}\n")
-    
-    # Get API key
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    if not api_key:
-        print("❌ Error: ANTHROPIC_API_KEY not found")
-        return
+    def handle(job):
+        tag, title, content_text, content_html, pdf_attachments = job.payload
+        print(f"{tag} - {title[:60]}")
+        return apply_rule(tag, job.rule, title, content_text, content_html, api_key, pdf_attachments)
     
-    enriched = 0
-    skipped = 0
+    counts = {'failed': 0, 'skipped': 0}
+    writer = ResultWriter(tbl, queue)
     
-    for idx, row in df.iterrows():
-        # Get fields
-        item_id = row.get('id', '')
-        tag = str(row.get('display_name', 'Unknown'))
-        title = str(row.get('title', ''))
-        content_text = str(row.get('content_text', ''))
-        content_html = str(row.get('content_html', ''))
-        
-        # CRITICAL FIX (Oct 29): Extract from HTML if content_text is empty
-        # Prevents hallucination when content_text is not populated by fetcher
-        if not content_text or len(content_text.strip()) < 100:
-            if content_html and len(content_html) > 100:
-                try:
-                    # Extract clean text from HTML using BeautifulSoup
-                    from bs4 import BeautifulSoup
-                    import re
-                    
-                    soup = BeautifulSoup(content_html, 'html.parser')
-                    # Remove script and style elements
-                    for script in soup(["script", "style"]):
-                        script.decompose()
-                    
-                    # Get text
-                    extracted_text = soup.get_text(separator='\n', strip=True)
-                    # Clean up multiple newlines
-                    extracted_text = re.sub(r'\n\s*\n+', '\n\n', extracted_text)
-                    
-                    if len(extracted_text) > 100:
-                        content_text = extracted_text
-                        print(f"   ⚠️  Extracted {len(content_text)} chars from HTML (content_text was empty)")
-                except Exception as e:
-                    print(f"   ❌ HTML extraction failed: {e}")
+    def commit(job, result, error):
+        tag, title = job.payload[:2]
+        if error is not None:
+            print(f"   ❌ Error ({tag} - {title[:40]}): {error}\n")
+            queue.fail(job.key, error)
+            counts['failed'] += 1
+            return
         
-        current_summary = str(row.get('smart_summary', ''))
+        # Handle result (can be dict or tuple)
+        if isinstance(result, dict):
+            summary = result.get('smart_summary', '')
+            actors = result.get('actors', [])
+            themes = result.get('themes', [])
+            category = result.get('smart_category', 'ANALYSIS')
+            score = result.get('ai_relevance_score', 8.0)
+        elif isinstance(result, tuple) and len(result) >= 5:
+            summary, actors, themes, category, score = result[:5]
+        else:
+            print(f"   ❌ Unexpected result format ({tag} - {title[:40]})")
+            queue.fail(job.key, "unexpected result format")
+            counts['failed'] += 1
+            return
         
-        # Skip if already enriched (has Rule: label and content)
-        if current_summary and len(current_summary) > 100 and "Rule:" in current_summary:
-            skipped += 1
-            continue
+        # Convert lists to strings if needed
+        if isinstance(actors, list):
+            actors = str(actors)
+        if isinstance(themes, list):
+            themes = str(themes)
         
-        print(f"{tag} - {title[:60]}")
+        # Handler errors are retried (the queue keeps the message)
+        if category == 'ERROR':
+            queue.fail(job.key, summary)
+            counts['failed'] += 1
+            return
         
-        # Look up rule for this tag
-        rule = TAG_TO_RULE.get(tag, "gold_standard_enhanced")
+        # Buffered - written with the rest of the batch in one merge
+        writer.add(job.key, {
+            'smart_summary': summary,
+            'actors': actors,
+            'themes': themes,
+            'smart_category': category,
+            'ai_relevance_score': float(score)
+        })
+        print(f"   ✅ {tag} - {title[:40]}: {len(summary)} chars\n")
+    
+    pool = EnrichmentPool(workers=workers, rule_limits=RULE_CONCURRENCY)
+    set_rate_limit(rpm if rpm > 0 else None)
+    
+    if batch:
+        print(f"📦 Batch mode: Message Batches API, {workers} workers preparing requests\n")
+    else:
+        print(f"⚡ {workers} workers, {rpm} requests/min\n")
+    remaining = last_n
+    batch_jobs = []
+    while remaining is None or remaining > 0:
+        claim_size = CLAIM_BATCH if remaining is None else min(CLAIM_BATCH, remaining)
+        jobs, claimed, skipped = claim_jobs(queue, tbl, claim_size)
+        if not claimed:
+            break
+        if remaining is not None:
+            remaining -= claimed
+        counts['skipped'] += skipped
         
-        # Apply rule
-        try:
-            result = apply_rule(tag, rule, title, content_text, content_html, api_key)
-            
-            # Handle result (can be dict or tuple)
-            if isinstance(result, dict):
-                summary = result.get('smart_summary', '')
-                actors = result.get('actors', [])
-                themes = result.get('themes', [])
-                category = result.get('smart_category', 'ANALYSIS')
-                score = result.get('ai_relevance_score', 8.0)
-            elif isinstance(result, tuple) and len(result) >= 5:
-                summary, actors, themes, category, score = result[:5]
-            else:
-                print(f"   ❌ Unexpected result format")
-                continue
-            
-            # Convert lists to strings if needed
-            if isinstance(actors, list):
-                actors = str(actors)
-            if isinstance(themes, list):
-                themes = str(themes)
-            
-            # Update database
-            tbl.update(
-                where=f"id = '{item_id}'",
-                values={
-                    'smart_summary': summary,
-                    'actors': actors,
-                    'themes': themes,
-                    'smart_category': category,
-                    'ai_relevance_score': float(score)
-                }
-            )
-            
-            print(f"   ✅ {len(summary)} chars\n")
-            enriched += 1
-            
-        except Exception as e:
-            print(f"   ❌ Error: {e}\n")
-            continue
+        if batch:
+            batch_jobs.extend(jobs)  # everything goes into one batch
+        else:
+            pool.run(jobs, handle, commit)
+    
+    if batch_jobs:
+        transport = batch_transport or AnthropicBatchTransport(get_client(api_key))
+        for job in enrich_in_batches(batch_jobs, handle, commit, workers, transport):
+            queue.fail(job.key, f"still waiting for a batch answer after {MAX_ROUNDS} rounds")
+            counts['failed'] += 1
+    
+    writer.close()
     
     print("\n" + "="*80)
-    print(f"✅ Enriched {enriched}/{len(df)} items")
-    print(f"⏭️  Skipped {skipped} (already enriched)")
+    print(f"✅ Enriched {writer.written} items ({writer.flushes} writes)")
+    print(f"❌ Failed {counts['failed']} (retried in a later run, up to {MAX_ATTEMPTS} attempts)")
+    print(f"⏭️  Skipped {counts['skipped']} (already enriched)")
+    cache = get_cache()
+    if cache is not None:
+        print(f"💰 {cache.summary()}")
+    index = get_index()
+    if index is not None and index.stats['hits'] + index.stats['misses']:
+        print(f"♻️  {index.summary()}")
+    for line in metrics.summary():
+        print(f"📊 {line}")
     print("="*80)
 
 
@@ -292,7 +473,12 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='SCRAPEX Simple Enrichment')
     parser.add_argument('--last', type=int, help='Process last N emails')
+    parser.add_argument('--workers', type=int, default=ENRICH_WORKERS, help='Concurrent handler calls')
+    parser.add_argument('--rpm', type=int, default=ANTHROPIC_RPM, help='Anthropic requests per minute (0 = no limit)')
+    parser.add_argument('--retry-failed', action='store_true', help='Re-queue items that used up their attempts')
+    parser.add_argument('--batch', action='store_true', help='Submit pending items as a Message Batch (async, half price)')
     
     args = parser.parse_args()
     
-    enrich_items(last_n=args.last)
+    enrich_items(last_n=args.last, workers=args.workers, rpm=args.rpm, retry_failed=args.retry_failed,
+                 batch=args.batch)
@@ -7,7 +7,11 @@ October 2025
 import re
 from typing import Dict, Optional
 from bs4 import BeautifulSoup
-import anthropic
+from llm_cache import cached_create
+from llm_client import get_client
+
+# Bump when the prompt changes (cached responses are keyed on it)
+PROMPT_VERSION = 2
 
 
 def is_video_transcript(sender_email: str, sender_display_name: str, title: str, content_text: str) -> bool:
@@ -89,42 +93,13 @@ def identify_speakers(text: str) -> list:
             if match not in speakers and len(match) < 30:
                 speakers.append(match.strip())
     
-    return list(set(speakers))[:10]  # Return up to 10 unique speakers
-
-
-def enrich_video_transcript(title: str, content_text: str, content_html: str, api_key: str) -> Dict:
-    """
-    Video Rule:
-    Transform video transcripts into detailed, fluid explanations
-    """
-    print("   📹 Processing video transcript...")
-    
-    # Extract and clean transcript
-    raw_transcript = extract_clean_transcript(content_html, content_text)
-    cleaned_text, effects = clean_transcript_artifacts(raw_transcript)
-    
-    if len(cleaned_text) < 200:
-        return {
-            'smart_summary': f"Rule: Video\n\n# 📹 {title}\n\n[Transcript too short for analysis]",
-            'actors': ['Video Analysis'],
-            'themes': ['Transcript'],
-            'smart_category': 'VIDEO_ANALYSIS',
-            'ai_relevance_score': 6.0
-        }
-    
-    # Identify speakers if present
-    speakers = identify_speakers(raw_transcript)
-    
-    # Create comprehensive analysis prompt
-    prompt = f"""You are analyzing a video transcript. Your task is to transform this raw transcript into a DETAILED, FLUID, and COMPREHENSIVE explanation of the discussion, ideas, and thesis presented.
+    return list(dict.fromkeys(speakers))[:10]  # Up to 10 unique speakers, first-seen order (stable prompt / cache key)
 
-TITLE: {title}
 
-TRANSCRIPT:
-{cleaned_text}
+# Static instructions (prompt-cached system block); per-item content goes in the user message
+VIDEO_INSTRUCTIONS = """You are analyzing a video transcript. Your task is to transform this raw transcript into a DETAILED, FLUID, and COMPREHENSIVE explanation of the discussion, ideas, and thesis presented.
 
-{f"IDENTIFIED SPEAKERS: {', '.join(speakers)}" if speakers else ""}
-{f"NOTED EFFECTS: {', '.join(set(effects[:10]))}" if effects else ""}
+The title, transcript, speakers and noted effects follow in the user message.
 
 Create a detailed, flowing analysis following these guidelines:
 
@@ -142,7 +117,7 @@ Format as:
 Rule: Video
 
 # 📹 Video Analysis
-## {title}
+## [Video title]
 
 ### 🎯 Core Thesis & Overview
 [2-3 flowing paragraphs explaining the main argument and what this video is about]
@@ -191,7 +166,7 @@ There's also careful attention paid to... [another nuanced aspect]. This shows i
 
 The presentation style is notably... [describe tone and approach]. The speakers employ... [rhetorical techniques]. This approach is effective because... [explain effectiveness].
 
-{f"The interaction between {speakers[0] if speakers else 'the speakers'} creates..." if speakers else "The flow of ideas demonstrates..."}
+The interaction between the speakers creates... (or, for a single speaker: The flow of ideas demonstrates...)
 
 ### 📈 Implications & Takeaways
 
@@ -226,13 +201,48 @@ CRITICAL INSTRUCTIONS:
 - Maintain logical flow between sections
 - Include specific examples and quotes when notable
 - Aim for 6,000-10,000 characters of rich analysis"""
+
+
+def enrich_video_transcript(title: str, content_text: str, content_html: str, api_key: str) -> Dict:
+    """
+    Video Rule:
+    Transform video transcripts into detailed, fluid explanations
+    """
+    print("   📹 Processing video transcript...")
+    
+    # Extract and clean transcript
+    raw_transcript = extract_clean_transcript(content_html, content_text)
+    cleaned_text, effects = clean_transcript_artifacts(raw_transcript)
+    
+    if len(cleaned_text) < 200:
+        return {
+            'smart_summary': f"Rule: Video\n\n# 📹 {title}\n\n[Transcript too short for analysis]",
+            'actors': ['Video Analysis'],
+            'themes': ['Transcript'],
+            'smart_category': 'VIDEO_ANALYSIS',
+            'ai_relevance_score': 6.0
+        }
+    
+    # Identify speakers if present
+    speakers = identify_speakers(raw_transcript)
+    
+    # Per-item content - the instructions are the cached system block
+    prompt = f"""TITLE: {title}
+
+TRANSCRIPT:
+{cleaned_text}
+
+{f"IDENTIFIED SPEAKERS: {', '.join(speakers)}" if speakers else ""}
+{f"NOTED EFFECTS: {', '.join(dict.fromkeys(effects[:10]))}" if effects else ""}"""
     
     try:
         # Use Claude 3.7 Sonnet for comprehensive analysis
-        client = anthropic.Anthropic(api_key=api_key)
-        message = client.messages.create(
+        client = get_client(api_key)
+        message = cached_create(
+            client, "video_transcript", PROMPT_VERSION,
             model="claude-3-7-sonnet-20250219",
             max_tokens=8192,
+            instructions=VIDEO_INSTRUCTIONS,
             messages=[
                 {
                     "role": "user",
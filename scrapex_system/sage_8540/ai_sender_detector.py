@@ -3,9 +3,9 @@ AI-Powered Sender Detection - v2
 Enhanced to separate WSJ Opinion from other WSJ content
 """
 
-import anthropic
 import re
 from bs4 import BeautifulSoup
+from llm_client import get_client
 
 def extract_email_metadata(author, content_html, title):
     """Extract key metadata for sender identification"""
@@ -96,7 +96,7 @@ Examples:
 """
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_client(api_key)
         
         response = client.messages.create(
             model="claude-3-5-haiku-20241022",  # Cheap, fast
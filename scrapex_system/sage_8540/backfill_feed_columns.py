@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 - Feed Columns Backfill (one-shot)
+Adds the materialized sender_tag / detected_sender / feed_type_flag / is_goldman columns and
+the top-level (indexed) email message_id to unified_feed, and fills them in
+for rows written before the Gmail fetcher started populating them at ingest.
+Also adds the pdf_attachments column (blob metadata, filled by the fetcher only).
+
+Safe to re-run: only rows with empty columns are classified.
+
+Usage:
+    python3 backfill_feed_columns.py              # backfill everything pending
+    python3 backfill_feed_columns.py --dry-run    # classify and report, no writes
+"""
+
+import argparse
+import logging
+import time
+import pandas as pd
+import lancedb
+from feed_columns import FEED_COLUMNS, derive_feed_columns
+from lance_indexes import ensure_scalar_index
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DB_PATH = "s3://sage-unified-feed-lance/sage4/"
+TABLE_NAME = "unified_feed"
+
+# SQL types for add_columns
+COLUMN_TYPES = {
+    'sender_tag': 'string',
+    'detected_sender': 'string',
+    'feed_type_flag': 'string',
+    'is_goldman': 'boolean',
+    'message_id': 'string',
+    'pdf_attachments': 'string'  # written by the fetcher only (older rows stay NULL)
+}
+
+# Everything the sender / Goldman detection looks at
+SOURCE_COLUMNS = [
+    'id', 'source_type', 'author', 'author_email', 'title',
+    'content_text', 'content_html', 'custom_fields'
+]
+
+PENDING_FILTER = (
+    "feed_type_flag IS NULL OR is_goldman IS NULL OR detected_sender IS NULL "
+    "OR (source_type = 'email' AND message_id IS NULL)"
+)
+
+
+def ensure_columns(table, columns=COLUMN_TYPES):
+    """Add any missing materialized columns (NULL for existing rows)"""
+    missing = {
+        name: f"CAST(NULL AS {sql_type})"
+        for name, sql_type in columns.items()
+        if name not in table.schema.names
+    }
+    if missing:
+        logger.info(f"➕ Adding columns: {', '.join(missing)}")
+        table.add_columns(missing)
+    return list(missing)
+
+
+def email_message_id(row):
+    """custom_fields.email.message_id of an email row (None for other sources)"""
+    custom_fields = row.get('custom_fields') or {}
+    email_fields = custom_fields.get('email') if isinstance(custom_fields, dict) else None
+    if row.get('source_type') != 'email' or not isinstance(email_fields, dict):
+        return None
+    return email_fields.get('message_id')
+
+
+def backfill(table, batch_size=500, dry_run=False):
+    """Classify pending rows batch by batch, then write all results in one merge"""
+    # Before the columns exist (dry run) every row is pending
+    pending_filter = PENDING_FILTER if all(c in table.schema.names for c in COLUMN_TYPES) else None
+    pending = table.count_rows(pending_filter)
+    logger.info(f"📋 {pending} rows need feed columns")
+    if pending == 0:
+        return 0
+
+    columns = [c for c in SOURCE_COLUMNS if c in table.schema.names]
+    query = table.search().select(columns)
+    if pending_filter:
+        query = query.where(pending_filter)
+    reader = query.limit(None).to_batches(batch_size)
+
+    results = []
+    started = time.time()
+    for batch in reader:
+        for row in batch.to_pylist():
+            derived = derive_feed_columns(row)
+            derived['id'] = row['id']
+            derived['message_id'] = email_message_id(row)
+            results.append(derived)
+        logger.info(f"  classified {len(results)}/{pending} ({time.time() - started:.1f}s)")
+
+    df = pd.DataFrame(results, columns=['id'] + FEED_COLUMNS + ['message_id'])
+    logger.info(f"📊 Sender tags: {df['sender_tag'].value_counts().head(15).to_dict()}")
+    logger.info(f"📊 Feed types: {df['feed_type_flag'].value_counts().to_dict()}")
+    logger.info(f"📊 Goldman Sachs: {int(df['is_goldman'].sum())}")
+
+    if dry_run:
+        logger.info("Dry run - nothing written")
+        return len(df)
+
+    # One merge keyed on id -> one new table version for the whole backfill
+    table.merge_insert("id").when_matched_update_all().execute(df)
+    logger.info(f"✅ Backfilled {len(df)} rows")
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill materialized feed columns')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows read per batch')
+    parser.add_argument('--dry-run', action='store_true', help='Classify without writing')
+    args = parser.parse_args()
+
+    db = lancedb.connect(DB_PATH)
+    table = db.open_table(TABLE_NAME)
+
+    if not args.dry_run:
+        ensure_columns(table)
+    backfill(table, batch_size=args.batch_size, dry_run=args.dry_run)
+    if not args.dry_run:
+        # Gmail fetcher dedup is a membership query on message_id
+        ensure_scalar_index(table, 'message_id')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.2 MIME Walker Benchmark
+Per-message CPU time of the legacy three-pass extraction vs the single-pass walker
+
+Both sides produce the same output (HTML with cid: images inlined as data
+URLs + plain text), which is checked for every message before timing.
+
+Usage:
+    python3 bench_mime_walker.py /path/to/eml_folder          # saved .eml files
+    python3 bench_mime_walker.py --synthetic 200              # generated newsletters
+    python3 bench_mime_walker.py /path/to/eml_folder --repeat 10
+"""
+
+import argparse
+import base64
+import email
+import glob
+import os
+import random
+import time
+from email.message import EmailMessage
+from mime_walker import replace_cids, walk_message
+
+
+# ----------------------------------------------------------------------
+# Legacy extraction (RobustGmailFetcher before the single-pass walker)
+# ----------------------------------------------------------------------
+
+def legacy_html(msg):
+    html_content = ""
+    plain_content = ""
+    embedded_images = {}
+
+    if msg.is_multipart():
+        # First pass: collect embedded images
+        for part in msg.walk():
+            content_id = part.get("Content-ID", "")
+            if content_id and part.get_content_maintype() == 'image':
+                try:
+                    image_data = part.get_payload(decode=True)
+                    image_type = part.get_content_subtype()
+                    data_url = f"data:image/{image_type};base64,{base64.b64encode(image_data).decode()}"
+                    embedded_images[content_id.strip('<>')] = data_url
+                except:
+                    pass
+
+        # Second pass: extract HTML
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if "attachment" in str(part.get("Content-Disposition", "")):
+                continue
+            if content_type == "text/html":
+                try:
+                    charset = part.get_content_charset() or 'utf-8'
+                    html_content = part.get_payload(decode=True).decode(charset, errors='ignore')
+                    for cid, data_url in embedded_images.items():
+                        html_content = html_content.replace(f'cid:{cid}', data_url)
+                    break
+                except:
+                    pass
+            elif content_type == "text/plain" and not html_content:
+                try:
+                    charset = part.get_content_charset() or 'utf-8'
+                    plain_content = part.get_payload(decode=True).decode(charset, errors='ignore')
+                except:
+                    pass
+
+    if html_content:
+        return html_content[:200000]
+    elif plain_content:
+        return f"<pre>{plain_content[:50000]}</pre>"
+    return "<p>No content available</p>"
+
+
+def legacy_text(msg):
+    try:
+        if msg.is_multipart():
+            for part in msg.walk():
+                if part.get_content_type() == "text/plain":
+                    charset = part.get_content_charset() or 'utf-8'
+                    return part.get_payload(decode=True).decode(charset, errors='ignore')[:10000]
+        elif msg.get_content_type() == "text/plain":
+            charset = msg.get_content_charset() or 'utf-8'
+            return msg.get_payload(decode=True).decode(charset, errors='ignore')[:10000]
+    except:
+        pass
+    return ""
+
+
+def legacy_extract(msg):
+    return legacy_html(msg), legacy_text(msg)
+
+
+# ----------------------------------------------------------------------
+# Single pass
+# ----------------------------------------------------------------------
+
+def single_pass_extract(msg):
+    parts = walk_message(msg)
+    html_content = parts.html or ""
+
+    def data_url(cid):
+        if cid not in parts.inline_images:
+            return None
+        image_data, image_type = parts.inline_images[cid]
+        return f"data:image/{image_type};base64,{base64.b64encode(image_data).decode()}"
+
+    if html_content and parts.inline_images:
+        html_content = replace_cids(html_content, data_url)
+
+    if html_content:
+        html = html_content[:200000]
+    elif parts.plain:
+        html = f"<pre>{parts.plain[:50000]}</pre>"
+    else:
+        html = "<p>No content available</p>"
+    return html, (parts.text or "")[:10000]
+
+
+# ----------------------------------------------------------------------
+# Corpus
+# ----------------------------------------------------------------------
+
+def load_corpus(folder):
+    messages = []
+    for path in sorted(glob.glob(os.path.join(folder, '**', '*.eml'), recursive=True)):
+        with open(path, 'rb') as f:
+            messages.append(f.read())
+    return messages
+
+
+def synthetic_corpus(count, seed=42):
+    """Newsletter-like messages: text + HTML, a few inline images, sometimes a PDF"""
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        n_images = rng.randint(0, 6)
+        msg = EmailMessage()
+        msg['Subject'] = f"Daily note {i}"
+        msg['From'] = "Research <research@example.com>"
+        msg['Message-ID'] = f"<bench{i}@example.com>"
+        paragraphs = ' '.join(f"Parágrafo {j} sobre juros e câmbio." for j in range(rng.randint(20, 400)))
+        msg.set_content(paragraphs)
+        images = ''.join(f'<img src="cid:img{j}">' for j in range(n_images))
+        msg.add_alternative(f"<html><body><p>{paragraphs}</p>{images}</body></html>", subtype='html')
+        html_part = msg.get_payload()[1]
+        for j in range(n_images):
+            data = b'\x89PNG\r\n\x1a\n' + rng.randbytes(rng.randint(2000, 60000))
+            html_part.add_related(data, 'image', 'png', cid=f'<img{j}>')
+        if rng.random() < 0.3:
+            msg.add_attachment(b'%PDF-1.4\n' + rng.randbytes(200000), maintype='application',
+                               subtype='pdf', filename='report.pdf')
+        messages.append(msg.as_bytes())
+    return messages
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def cpu_per_message(extract, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        parsed = [email.message_from_bytes(raw) for raw in messages]
+        started = time.process_time()
+        for msg in parsed:
+            extract(msg)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-pass MIME extraction')
+    parser.add_argument('folder', nargs='?', help='Folder of saved .eml files')
+    parser.add_argument('--synthetic', type=int, default=0, help='Generate N messages instead')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing rounds (best is reported)')
+    args = parser.parse_args()
+
+    if args.folder:
+        messages = load_corpus(args.folder)
+    elif args.synthetic:
+        messages = synthetic_corpus(args.synthetic)
+    else:
+        parser.error('give an .eml folder or --synthetic N')
+    if not messages:
+        parser.error(f'no .eml files in {args.folder}')
+
+    mismatches = 0
+    for raw in messages:
+        if legacy_extract(email.message_from_bytes(raw)) != single_pass_extract(email.message_from_bytes(raw)):
+            mismatches += 1
+
+    legacy = cpu_per_message(legacy_extract, messages, args.repeat)
+    single = cpu_per_message(single_pass_extract, messages, args.repeat)
+    total_mb = sum(len(raw) for raw in messages) / 1e6
+
+    print(f"📧 {len(messages)} messages ({total_mb:.1f} MB), best of {args.repeat}")
+    print(f"  legacy three-pass : {legacy * 1000:8.3f} ms CPU / message")
+    print(f"  single-pass walker: {single * 1000:8.3f} ms CPU / message")
+    print(f"  speedup           : {legacy / single:8.2f}x")
+    print(f"  output mismatches : {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 Blob Store
+Content-addressed storage for email media (inline images, attachments)
+
+- Key = SHA-256 of the bytes, so identical logos / banners are stored once
+- Sharded layout: <root>/ab/cd/abcd...  (root is s3://bucket/prefix or a local dir)
+- Blobs are immutable: put() is a no-op when the hash already exists
+- Served by the SAGE interface at /media/<hash>
+
+Root: $SAGE_BLOB_ROOT, default s3://sage-unified-feed-lance/blobs/
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOB_ROOT = "s3://sage-unified-feed-lance/blobs/"
+
+MEDIA_PREFIX = "/media/"
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+MEDIA_URL_RE = re.compile(r'/media/([0-9a-f]{64})')
+
+# Magic bytes -> mimetype, for serving blobs without a metadata lookup
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'BM', 'image/bmp'),
+]
+
+
+def blob_hash(data):
+    """SHA-256 hex digest used as the blob key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def media_url(digest):
+    """URL the SAGE interface serves a blob at"""
+    return f"{MEDIA_PREFIX}{digest}"
+
+
+def guess_mimetype(data):
+    """Mimetype from the first bytes of a blob"""
+    for signature, mimetype in _SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    head = data[:512].lstrip().lower()
+    if head.startswith(b'<svg') or (head.startswith(b'<?xml') and b'<svg' in head):
+        return 'image/svg+xml'
+    return 'application/octet-stream'
+
+
+class BlobStore:
+    """Write-once blob store on S3 (boto3) or a local directory"""
+
+    def __init__(self, root=None):
+        root = root or os.getenv('SAGE_BLOB_ROOT', DEFAULT_BLOB_ROOT)
+        self.root = root.rstrip('/')
+        self.s3 = None
+        if self.root.startswith('s3://'):
+            import boto3
+            from botocore.exceptions import ClientError
+            self.client_error = ClientError
+            bucket, _, prefix = self.root[len('s3://'):].partition('/')
+            self.s3 = boto3.client('s3')
+            self.bucket = bucket
+            self.prefix = prefix
+        self.known = set()  # hashes already confirmed present in this process
+        self.lock = threading.Lock()
+
+    def _key(self, digest):
+        return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def _local_path(self, digest):
+        return os.path.join(self.root, self._key(digest))
+
+    def _s3_key(self, digest):
+        return f"{self.prefix}/{self._key(digest)}" if self.prefix else self._key(digest)
+
+    def exists(self, digest):
+        if digest in self.known:
+            return True
+        if self.s3 is not None:
+            try:
+                self.s3.head_object(Bucket=self.bucket, Key=self._s3_key(digest))
+                found = True
+            except self.client_error:
+                found = False
+        else:
+            found = os.path.exists(self._local_path(digest))
+        if found:
+            with self.lock:
+                self.known.add(digest)
+        return found
+
+    def put(self, data):
+        """Store bytes (once) and return their hash"""
+        digest = blob_hash(data)
+        if self.exists(digest):
+            return digest
+
+        if self.s3 is not None:
+            self.s3.put_object(
+                Bucket=self.bucket, Key=self._s3_key(digest), Body=data,
+                ContentType=guess_mimetype(data)
+            )
+        else:
+            path = self._local_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self.lock:
+            self.known.add(digest)
+        return digest
+
+    def local_path(self, digest):
+        """Filesystem path of a blob in a local store, or None (S3 / missing)"""
+        if self.s3 is not None or not HASH_RE.match(digest or ''):
+            return None
+        path = self._local_path(digest)
+        return path if os.path.exists(path) else None
+
+    def get(self, digest):
+        """Bytes of a blob, or None if it does not exist"""
+        if not HASH_RE.match(digest or ''):
+            return None
+        if self.s3 is not None:
+            try:
+                response = self.s3.get_object(Bucket=self.bucket, Key=self._s3_key(digest))
+            except self.client_error:
+                return None
+            return response['Body'].read()
+        try:
+            with open(self._local_path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 Blocklist
+Single sender blocklist for the Gmail fetcher, backed by the LanceDB
+blocked_senders table that /api/block-sender and /api/unblock-sender manage
+
+- Loaded once, reloaded only when the table version changes
+- All patterns compiled into one regex per field (named group per pattern),
+  so checking an email is one match per field instead of a loop per pattern
+- Per-pattern hit counters, written back to emails_blocked with flush_hits()
+
+Pattern types:
+    exact / domain / keyword / subdomain   glob on the sender email (config page)
+    sender                                 exact sender display name
+    text                                   substring of "sender name + subject"
+
+The legacy blocked_senders.json (and the built-in defaults) seed the table
+the first time it is missing.
+"""
+
+import fnmatch
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_TABLE = "blocked_senders"
+LEGACY_BLOCKED_FILE = '/home/ubuntu/newspaper_project/blocked_senders.json'
+
+BLOCKED_SCHEMA = pa.schema([
+    pa.field('pattern', pa.string()),
+    pa.field('pattern_type', pa.string()),
+    pa.field('added_date', pa.string()),
+    pa.field('added_by', pa.string()),
+    pa.field('reason', pa.string()),
+    pa.field('emails_blocked', pa.int64()),
+])
+
+# Default blocked senders (used when there is no table and no legacy file)
+DEFAULT_BLOCKLIST = {
+    'blocked_senders': [
+        'News Alert (BLOOMBERG)',
+        'BI Alert (BLOOMBERG BI ANALYST)'
+    ],
+    'blocked_emails': ['noreply@email.com'],
+    'blocked_patterns': ['Bloomberg', 'Barron']
+}
+
+
+def legacy_entries(path=LEGACY_BLOCKED_FILE):
+    """blocked_senders.json (or the defaults) as blocked_senders rows"""
+    data = DEFAULT_BLOCKLIST
+    source = 'defaults'
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            source = os.path.basename(path)
+    except Exception as e:
+        logger.warning(f"Could not read {path}: {e}")
+
+    now = datetime.now().isoformat()
+    rows = []
+    for name in data.get('blocked_senders', []):
+        rows.append(('sender', name))
+    for address in data.get('blocked_emails', []):
+        # Was a substring check on the From field
+        rows.append(('keyword', f"*{address}*"))
+    for text in data.get('blocked_patterns', []):
+        rows.append(('text', text))
+
+    return [
+        {
+            'pattern': pattern,
+            'pattern_type': pattern_type,
+            'added_date': now,
+            'added_by': source,
+            'reason': 'migrated from legacy blocklist',
+            'emails_blocked': 0
+        }
+        for pattern_type, pattern in rows
+    ]
+
+
+def open_blocked_table(db):
+    """Open blocked_senders, creating it from the legacy blocklist if missing"""
+    try:
+        return db.open_table(BLOCKED_TABLE)
+    except ValueError:
+        rows = legacy_entries()
+        logger.info(f"➕ Creating {BLOCKED_TABLE} table with {len(rows)} legacy patterns")
+        return db.create_table(BLOCKED_TABLE, pa.Table.from_pylist(rows, schema=BLOCKED_SCHEMA))
+
+
+def sql_quote(value):
+    """Quote a string literal for a LanceDB filter"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _combine(parts, flags=0):
+    """One alternation with a named group per pattern; None if nothing to match"""
+    if not parts:
+        return None
+    return re.compile('|'.join(f"(?P<p{i}>{regex})" for i, regex in parts), flags)
+
+
+class Blocklist:
+    """Compiled view of blocked_senders with hit counters"""
+
+    def __init__(self, db, refresh_interval=60):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self.last_check = 0.0
+        self.patterns = []
+        self.group_names = {}  # regex group name -> index into patterns
+        self.sender_regex = None
+        self.email_regex = None
+        self.text_regex = None
+        self.hits = Counter()
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Recompile if blocked_senders changed since the last load"""
+        if not force and self.version is not None and time.time() - self.last_check < self.refresh_interval:
+            return
+        with self.lock:
+            self.last_check = time.time()
+            table = open_blocked_table(self.db)
+            if table.version == self.version:
+                return
+            df = table.to_pandas()
+            self._compile(list(zip(df['pattern'], df['pattern_type'])))
+            self.version = table.version
+            logger.info(f"🚫 Loaded {len(self.patterns)} blocked sender patterns (v{self.version})")
+
+    def _compile(self, entries):
+        self.patterns = []
+        self.group_names = {}
+        sender_parts, email_parts, text_parts = [], [], []
+        for pattern, pattern_type in entries:
+            if not pattern or not isinstance(pattern, str):
+                continue
+            i = len(self.patterns)
+            self.patterns.append(pattern)
+            self.group_names[f"p{i}"] = i
+            if pattern_type == 'sender':
+                sender_parts.append((i, re.escape(pattern)))
+            elif pattern_type == 'text':
+                text_parts.append((i, re.escape(pattern)))
+            else:
+                # exact / domain / keyword / subdomain and anything unknown: email glob
+                email_parts.append((i, fnmatch.translate(pattern)))
+
+        self.sender_regex = _combine(sender_parts)
+        self.email_regex = _combine(email_parts, re.IGNORECASE)
+        self.text_regex = _combine(text_parts, re.IGNORECASE)
+
+    def match(self, sender_name, sender_email, subject=""):
+        """Blocked pattern that matches this email, or None"""
+        self.refresh()
+
+        checks = (
+            (self.sender_regex, sender_name, re.Pattern.fullmatch),
+            (self.email_regex, sender_email, re.Pattern.fullmatch),
+            (self.text_regex, f"{sender_name} {subject}", re.Pattern.search),
+        )
+        for regex, value, method in checks:
+            if regex is None or not value:
+                continue
+            m = method(regex, value)
+            if m:
+                group = next(name for name, value in m.groupdict().items()
+                             if value is not None and name in self.group_names)
+                pattern = self.patterns[self.group_names[group]]
+                self.hits[pattern] += 1
+                return pattern
+        return None
+
+    def flush_hits(self):
+        """Add this run's hit counts to emails_blocked"""
+        if not self.hits:
+            return
+        table = self.db.open_table(BLOCKED_TABLE)
+        for pattern, count in self.hits.items():
+            table.update(
+                where=f"pattern = {sql_quote(pattern)}",
+                values_sql={'emails_blocked': f"coalesce(emails_blocked, 0) + {count}"}
+            )
+        logger.info(f"🚫 Recorded hits for {len(self.hits)} blocked patterns")
+        self.hits.clear()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 Feed Index
+Resident, pre-sorted view of unified_feed for /api/feed
+
+- Loads the table once, then only reads Lance fragments added since the last seen version
+- Reads only the list-view columns (no content_html)
+- Keeps rows in created_at order (newest first)
+- Keeps per-filter posting lists (email, twitter, newsfeed, goldman_sachs, sender:*)
+  so a feed page is an O(limit) slice instead of a full scan + sort;
+  sender:X holds rows whose sender_tag or detected_sender is X
+"""
+
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from feed_columns import FEED_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class FeedIndex:
+    """In-memory feed index, refreshed incrementally from the Lance table version"""
+
+    def __init__(self, db, table_name, classify_row, columns=None, refresh_interval=10):
+        """
+        classify_row(row) -> dict with every FEED_COLUMNS value,
+        only called for rows whose materialized columns are still empty
+        columns: projection applied to every fragment read (None = all columns)
+        """
+        self.db = db
+        self.table_name = table_name
+        self.classify_row = classify_row
+        self.columns = columns
+        self.refresh_interval = refresh_interval
+        self.read_columns = None
+
+        self.table = None
+        self.version = None
+        self.last_check = 0.0
+        self.fragment_state = {}  # fragment_id -> deletion file marker
+        self.lock = threading.Lock()
+
+        # (rows sorted newest first, {filter_tag: positions}) - swapped atomically
+        self._snapshot = (pd.DataFrame(), {'all': np.arange(0)})
+
+    @property
+    def ready(self):
+        """True once the first full load has completed"""
+        return self.version is not None
+
+    def warm_up(self):
+        """Run the first (full) load in the background"""
+        def _load():
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                logger.error(f"Feed index warm-up failed: {e}")
+
+        thread = threading.Thread(target=_load, name='feed-index-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def refresh(self, force=False):
+        """Bring the index up to the latest table version; returns the open table"""
+        now = time.time()
+        if not force and self.table is not None and now - self.last_check < self.refresh_interval:
+            return self.table
+
+        with self.lock:
+            if not force and self.table is not None and time.time() - self.last_check < self.refresh_interval:
+                return self.table
+
+            table = self.db.open_table(self.table_name)
+            self.table = table
+            self.last_check = time.time()
+
+            if table.version == self.version:
+                return table
+
+            started = time.time()
+            dataset = table.to_lance()
+            if self.columns is not None:
+                self.read_columns = [c for c in self.columns if c in table.schema.names]
+            fragments = {frag.fragment_id: frag for frag in dataset.get_fragments()}
+
+            rows = self._snapshot[0]
+            if self.version is None or not set(self.fragment_state) <= set(fragments):
+                # First load, or fragments were rewritten (compaction / overwrite)
+                rows = self._read_fragments(fragments.values())
+                mode = 'full'
+            else:
+                rows = self._apply_changes(rows, fragments)
+                mode = 'incremental'
+
+            self.fragment_state = {
+                frag_id: self._deletion_marker(frag) for frag_id, frag in fragments.items()
+            }
+            self._snapshot = self._build(rows)
+            logger.info(
+                f"📇 Feed index {mode} refresh: v{self.version} → v{table.version}, "
+                f"{len(rows)} rows in {time.time() - started:.2f}s"
+            )
+            self.version = table.version
+            return table
+
+    def _apply_changes(self, rows, fragments):
+        """Merge new fragments and drop rows deleted from existing fragments"""
+        new_frags = [frag for frag_id, frag in fragments.items() if frag_id not in self.fragment_state]
+        changed_frags = [
+            frag for frag_id, frag in fragments.items()
+            if frag_id in self.fragment_state
+            and self._deletion_marker(frag) != self.fragment_state[frag_id]
+        ]
+
+        # Rows deleted in place (updates write a deletion vector + a new fragment)
+        for frag in changed_frags:
+            alive = set(frag.to_table(columns=['id']).column('id').to_pylist())
+            in_frag = rows['_fragment'] == frag.fragment_id
+            rows = rows[~in_frag | rows['id'].isin(alive)]
+
+        if new_frags:
+            new_rows = self._read_fragments(new_frags)
+            # Upsert by id - an updated row lands in a new fragment
+            rows = rows[~rows['id'].isin(new_rows['id'])]
+            rows = pd.concat([rows, new_rows], ignore_index=True)
+
+        return rows
+
+    def _read_fragments(self, fragments):
+        """Read fragments and compute the per-row derived fields once"""
+        frames = []
+        for frag in fragments:
+            df = frag.to_table(columns=self.read_columns).to_pandas()
+            df['_fragment'] = frag.fragment_id
+            frames.append(df)
+
+        if not frames:
+            return self._fill_feed_columns(pd.DataFrame(columns=['id', '_fragment', 'source_type', 'created_at']))
+
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates(subset='id', keep='last')
+
+        df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
+        return self._fill_feed_columns(df)
+
+    def _fill_feed_columns(self, df):
+        """Classify only the rows that predate the materialized filter columns"""
+        for column in FEED_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+
+        missing = df['feed_type_flag'].isna() | df['is_goldman'].isna() | df['detected_sender'].isna()
+        if missing.any():
+            derived = [self.classify_row(row) for _, row in df[missing].iterrows()]
+            for column in FEED_COLUMNS:
+                df.loc[missing, column] = pd.Series([d[column] for d in derived], index=df.index[missing], dtype=object)
+            logger.info(f"Classified {int(missing.sum())} rows without materialized feed columns")
+
+        df['is_goldman'] = df['is_goldman'].fillna(False).astype(bool)
+        return df
+
+    @staticmethod
+    def _deletion_marker(fragment):
+        """Identify a fragment's deletion vector so in-place deletes are noticed"""
+        deletion_file = getattr(fragment.metadata, 'deletion_file', None)
+        return repr(deletion_file)
+
+    @staticmethod
+    def _build(rows):
+        """Sort newest first and build posting lists"""
+        if len(rows) == 0:
+            return rows, {'all': np.arange(0)}
+
+        rows = rows.sort_values('created_at', ascending=False, na_position='last', kind='stable')
+        rows = rows.reset_index(drop=True)
+
+        postings = {'all': np.arange(len(rows))}
+        source_type = rows['source_type'].to_numpy()
+        postings['email'] = np.flatnonzero(source_type == 'email')
+        postings['twitter'] = np.flatnonzero(source_type == 'twitter')
+        postings['newsfeed'] = np.flatnonzero(rows['feed_type_flag'].to_numpy() == 'newsfeed')
+        postings['goldman_sachs'] = np.flatnonzero(rows['is_goldman'].to_numpy(dtype=bool))
+
+        # Stored tag OR detected sender (positions stay sorted, i.e. newest first)
+        for column in ('sender_tag', 'detected_sender'):
+            for sender, positions in rows.groupby(column, sort=False).indices.items():
+                if sender:
+                    key = f"sender:{sender}"
+                    postings[key] = np.union1d(postings[key], positions) if key in postings else positions
+
+        return rows, postings
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def rows(self, columns=None):
+        """Current rows (optionally a subset of columns)"""
+        rows = self._snapshot[0]
+        return rows if columns is None else rows[columns]
+
+    def page(self, filter_tag=None, offset=0, limit=100):
+        """Return (rows for the page, total matching count)"""
+        rows, postings = self._snapshot
+
+        if not filter_tag or filter_tag == 'all':
+            positions = postings['all']
+        elif filter_tag.startswith('sender:'):
+            sender_name = filter_tag.replace('sender:', '').strip()
+            positions = postings.get(f"sender:{sender_name}", np.arange(0))
+        else:
+            positions = postings.get(filter_tag, postings['all'])
+
+        return rows.iloc[positions[offset:offset + limit]], len(positions)
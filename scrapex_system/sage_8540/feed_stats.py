@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 Feed Stats
+Small pre-aggregated counts table (feed_stats) next to unified_feed
+
+One row per (sender_tag, feed_type_flag, source_type, day) with an item count.
+- Ingest adds the counts of the rows it just wrote (record_items)
+- /api/sender-stats and /api/feed-type-stats read the aggregate, never the feed
+- ?since=YYYY-MM-DD sums only the days from that date on
+
+Usage:
+    python3 feed_stats.py --rebuild    # recompute from unified_feed (first run / repair)
+"""
+
+import argparse
+import logging
+import threading
+import time
+import pandas as pd
+import lancedb
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "s3://sage-unified-feed-lance/sage4/"
+FEED_TABLE = "unified_feed"
+STATS_TABLE = "feed_stats"
+
+KEY_COLUMNS = ['sender_tag', 'feed_type_flag', 'source_type', 'day']
+
+# Keys must be non-null for merge_insert to match; '' means "no value"
+NO_VALUE = ''
+
+
+def aggregate(df):
+    """Count rows of a feed DataFrame by (sender_tag, feed_type_flag, source_type, day)"""
+    if len(df) == 0:
+        return pd.DataFrame(columns=KEY_COLUMNS + ['count'])
+
+    keys = pd.DataFrame({
+        'sender_tag': df['sender_tag'] if 'sender_tag' in df else None,
+        'feed_type_flag': df['feed_type_flag'] if 'feed_type_flag' in df else None,
+        'source_type': df['source_type'] if 'source_type' in df else None,
+        # created_at is stored as naive UTC
+        'day': pd.to_datetime(df['created_at'], errors='coerce').dt.strftime('%Y-%m-%d'),
+    }, index=df.index)
+    keys = keys.fillna(NO_VALUE).astype(str)
+
+    counts = keys.groupby(KEY_COLUMNS, sort=False).size().reset_index(name='count')
+    counts['count'] = counts['count'].astype('int64')
+    return counts
+
+
+def record_items(db, records):
+    """Add the counts of newly written feed rows to feed_stats"""
+    delta = aggregate(pd.DataFrame(records))
+    if len(delta) == 0:
+        return
+
+    try:
+        table = db.open_table(STATS_TABLE)
+    except Exception:
+        logger.warning(f"{STATS_TABLE} table missing - run feed_stats.py --rebuild; skipping stats update")
+        return
+
+    # Add to the current counts for the touched keys (a few rows per run)
+    days = ', '.join(f"'{d}'" for d in delta['day'].unique())
+    current = table.search().where(f"day IN ({days})").limit(None).to_pandas()
+    merged = delta.merge(current, on=KEY_COLUMNS, how='left', suffixes=('', '_current'))
+    merged['count'] = merged['count'] + merged['count_current'].fillna(0).astype('int64')
+
+    (
+        table.merge_insert(KEY_COLUMNS)
+        .when_matched_update_all()
+        .when_not_matched_insert_all()
+        .execute(merged[KEY_COLUMNS + ['count']])
+    )
+    logger.info(f"📊 feed_stats: +{int(delta['count'].sum())} items across {len(delta)} keys")
+
+
+def rebuild(db):
+    """Recompute feed_stats from the materialized columns of unified_feed"""
+    feed = db.open_table(FEED_TABLE)
+    columns = [c for c in ['sender_tag', 'feed_type_flag', 'source_type', 'created_at'] if c in feed.schema.names]
+    df = feed.search().select(columns).limit(None).to_pandas()
+
+    counts = aggregate(df)
+    db.create_table(STATS_TABLE, counts, mode="overwrite")
+    logger.info(f"✅ Rebuilt {STATS_TABLE}: {len(df)} items → {len(counts)} rows")
+    return counts
+
+
+class FeedStatsCache:
+    """Read side of feed_stats for the SAGE interface"""
+
+    def __init__(self, db, refresh_interval=10):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self.last_check = 0.0
+        self.stats = None
+        self.results = {}  # (column, since) -> counts, for the current version
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        if self.stats is not None and time.time() - self.last_check < self.refresh_interval:
+            return
+        with self.lock:
+            if self.stats is not None and time.time() - self.last_check < self.refresh_interval:
+                return
+            self.last_check = time.time()
+            try:
+                table = self.db.open_table(STATS_TABLE)
+            except Exception:
+                self.stats = None
+                return
+            if table.version != self.version:
+                self.stats = table.to_pandas()
+                self.results = {}
+                self.version = table.version
+
+    def counts(self, column, since=None):
+        """{value: count} for a key column, or None when feed_stats is unavailable"""
+        self._refresh()
+        stats = self.stats
+        if stats is None:
+            return None
+
+        if since:
+            # Whole days - the aggregate has no finer granularity
+            since = pd.Timestamp(since).strftime('%Y-%m-%d')
+
+        cache_key = (column, since)
+        if cache_key not in self.results:
+            if since:
+                stats = stats[stats['day'] >= since]
+            totals = stats[stats[column] != NO_VALUE].groupby(column)['count'].sum()
+            self.results[cache_key] = {str(k): int(v) for k, v in totals.items()}
+        return self.results[cache_key]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='SAGE feed_stats aggregate')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute feed_stats from unified_feed')
+    args = parser.parse_args()
+
+    db = lancedb.connect(DB_PATH)
+    if args.rebuild:
+        rebuild(db)
+    else:
+        stats = FeedStatsCache(db)
+        print(stats.counts('sender_tag'))
+        print(stats.counts('feed_type_flag'))
+
+
+if __name__ == "__main__":
+    main()
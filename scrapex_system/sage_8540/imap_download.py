@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.2 IMAP Body Download
+Pipelined RFC822 download for the Gmail fetcher
+
+- UIDs are grouped into chunks, each chunk is one UID FETCH command
+- One or more IMAP connections download chunks in background threads
+- Messages are handed over through a bounded queue, so parsing and record
+  building in the caller overlap the network wait
+- Failures are per chunk: the chunk's UIDs are reported in .failed, the
+  connection is re-opened and the download carries on
+"""
+
+import logging
+import queue
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def uid_set(uids):
+    """Compress sorted UIDs into an IMAP sequence set (1:3,7,9:10)"""
+    ranges = []
+    for uid in sorted(uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+def fetch_literals(data):
+    """
+    (uid, literal bytes) per message of an imaplib UID FETCH response.
+    The server may send the UID before the literal (in the tuple's prefix)
+    or after it (in the bytes element that closes the response) - both are
+    checked; the literal itself is never searched.
+    """
+    for index, part in enumerate(data):
+        if not isinstance(part, tuple):
+            continue
+        uid = re.search(rb'UID (\d+)', part[0])
+        if uid is None and index + 1 < len(data) and isinstance(data[index + 1], bytes):
+            uid = re.search(rb'UID (\d+)', data[index + 1])
+        if uid:
+            yield int(uid.group(1)), part[1]
+
+
+def fetch_chunk(imap, uids):
+    """UID FETCH a set of messages; returns {uid: raw RFC822 bytes}"""
+    result, data = imap.uid('FETCH', uid_set(uids), '(UID RFC822)')
+    if result != 'OK':
+        raise RuntimeError(f"Body fetch failed: {result}")
+
+    return dict(fetch_literals(data))
+
+
+class BodyDownloader:
+    """Iterate (uid, raw message) for a list of UIDs, downloaded in the background"""
+
+    def __init__(self, imap, connect, uids, chunk_size=20, connections=1, queue_size=50):
+        """
+        imap: an open, selected connection (used by the first worker)
+        connect(): opens another selected connection for the extra workers / reconnects
+        """
+        self.imap = imap
+        self.connect = connect
+        self.chunks = queue.Queue()
+        for start in range(0, len(uids), chunk_size):
+            self.chunks.put(uids[start:start + chunk_size])
+        self.connections = max(1, min(connections, self.chunks.qsize()))
+        self.messages = queue.Queue(maxsize=queue_size)
+        self.failed = []
+        self.opened = []  # extra connections, closed by close()
+        self.lock = threading.Lock()
+
+    def _mark_failed(self, uids):
+        with self.lock:
+            self.failed.extend(uids)
+
+    def _worker(self, imap):
+        try:
+            while True:
+                try:
+                    chunk = self.chunks.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    messages = fetch_chunk(imap, chunk)
+                except Exception as e:
+                    logger.warning(f"  ⚠️ Fetch of {len(chunk)} emails failed ({e}) - reconnecting")
+                    self._mark_failed(chunk)
+                    try:
+                        imap = self.connect()
+                        with self.lock:
+                            self.opened.append(imap)
+                    except Exception as e:
+                        logger.error(f"  ❌ Reconnect failed: {e}")
+                        return
+                    continue
+
+                self._mark_failed([uid for uid in chunk if uid not in messages])
+                for uid in chunk:
+                    if uid in messages:
+                        self.messages.put((uid, messages[uid]))
+        finally:
+            self.messages.put(_DONE)
+
+    def __iter__(self):
+        workers = [self.imap]
+        for _ in range(self.connections - 1):
+            try:
+                imap = self.connect()
+                self.opened.append(imap)
+                workers.append(imap)
+            except Exception as e:
+                logger.warning(f"Could not open extra IMAP connection: {e}")
+                break
+
+        threads = [
+            threading.Thread(target=self._worker, args=(imap,), name=f'imap-download-{i}', daemon=True)
+            for i, imap in enumerate(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        running = len(threads)
+        while running:
+            item = self.messages.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            yield item
+
+        # Chunks nobody could download (all workers gave up)
+        while True:
+            try:
+                self._mark_failed(self.chunks.get_nowait())
+            except queue.Empty:
+                break
+
+    def close(self):
+        """Log out of the extra connections"""
+        for imap in self.opened:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+        self.opened = []
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 Lance Indexes
+Scalar (BTree) indexes for point lookups on unified_feed
+
+Rows appended after the index was built are still found (Lance scans the
+unindexed fragments), they are just not accelerated until the next rebuild.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def has_scalar_index(table, column):
+    """True if some index already covers the column"""
+    return any(column in index.columns for index in table.list_indices())
+
+
+def ensure_scalar_index(table, column):
+    """Create a BTree index on column if there is none; returns True if the column is indexed"""
+    try:
+        if has_scalar_index(table, column):
+            return True
+        logger.info(f"🗂️ Creating scalar index on {column}...")
+        table.create_scalar_index(column, replace=False)
+        logger.info(f"✅ Scalar index on {column} ready")
+        return True
+    except Exception as e:
+        # Lookups still work without the index, they just scan the column
+        logger.warning(f"Could not create scalar index on {column}: {e}")
+        return False
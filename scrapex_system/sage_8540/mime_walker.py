@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.2 MIME Walker
+Single-pass extraction of everything the Gmail fetcher needs from a message
+
+One walk over the MIME tree classifies every leaf part and decodes each
+payload at most once, producing together:
+- html           first inline text/html body
+- plain          text/plain body shown when there is no HTML (last one before the HTML)
+- text           first text/plain body (content_text)
+- inline_images  {content-id: (bytes, subtype)} for cid: references
+- attachments    [Attachment] - payload decoded lazily, on first .data access
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CID_RE = re.compile(r'cid:([^"\'\s<>()]+)')
+
+
+class Attachment:
+    """Attachment descriptor; the payload is decoded once, when first needed"""
+
+    def __init__(self, part):
+        self.part = part
+        self.filename = part.get_filename() or ''
+        self.content_type = part.get_content_type()
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.part.get_payload(decode=True) or b''
+        return self._data
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+@dataclass
+class MimeParts:
+    html: Optional[str] = None
+    plain: Optional[str] = None
+    text: Optional[str] = None
+    inline_images: Dict[str, Tuple[bytes, str]] = field(default_factory=dict)
+    attachments: List[Attachment] = field(default_factory=list)
+
+
+def _decode_text(payload, part):
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return payload.decode(charset, errors='ignore')
+    except LookupError:
+        # Unknown charset name in the header
+        return payload.decode('utf-8', errors='ignore')
+
+
+def walk_message(msg):
+    """Classify and decode all parts of an email.message.Message in one pass"""
+    parts = MimeParts()
+
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+
+        content_type = part.get_content_type()
+        maintype = part.get_content_maintype()
+        disposition = str(part.get("Content-Disposition", ""))
+        content_id = part.get("Content-ID", "")
+        is_attachment = "attachment" in disposition
+
+        wants_text = content_type == "text/plain" and (
+            parts.text is None or (parts.html is None and not is_attachment)
+        )
+        wants_html = content_type == "text/html" and parts.html is None and not is_attachment
+        wants_image = bool(content_id) and maintype == 'image'
+
+        if is_attachment and not (wants_text or wants_image):
+            parts.attachments.append(Attachment(part))
+            continue
+        if not (wants_text or wants_html or wants_image):
+            continue
+
+        try:
+            payload = part.get_payload(decode=True)
+        except Exception as e:
+            logger.debug(f"Could not decode {content_type} part: {e}")
+            continue
+        if payload is None:
+            continue
+
+        if wants_html:
+            parts.html = _decode_text(payload, part)
+        elif wants_text:
+            text = _decode_text(payload, part)
+            if parts.text is None:
+                parts.text = text
+            if parts.html is None and not is_attachment:
+                parts.plain = text
+
+        if wants_image:
+            parts.inline_images[content_id.strip('<>')] = (payload, part.get_content_subtype())
+
+        if is_attachment:
+            attachment = Attachment(part)
+            attachment._data = payload
+            parts.attachments.append(attachment)
+
+    return parts
+
+
+def replace_cids(html, resolve):
+    """Rewrite every cid: reference in one scan; resolve(cid) -> URL or None to keep it"""
+    cache = {}
+
+    def _sub(match):
+        cid = match.group(1)
+        if cid not in cache:
+            cache[cid] = resolve(cid)
+        return cache[cid] or match.group(0)
+
+    return CID_RE.sub(_sub, html)
@@ -7,6 +7,10 @@ SAGE 4.2 Gmail Fetcher - ROBUST PRODUCTION VERSION
 - Progress tracking
 - Duplicate prevention
 - Batch processing for efficiency
+- Header-first fetch: UID watermark + headers only, full bodies just for new mail
+- Pipelined body download (chunked UID FETCH, optional connection pool)
+- Inline images stored once in the content-addressed blob store (/media/<hash>)
+- PDF attachments stored as blobs, metadata (hash / size / pages) in pdf_attachments
 """
 
 import os
@@ -17,16 +21,24 @@ import imaplib
 import email
 import logging
 import traceback
-import signal
 import time
 from datetime import datetime, timedelta
 import pandas as pd
 from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
 from email.utils import parsedate_to_datetime
 import lancedb
 import re
 import pytz
 import base64
+from feed_columns import derive_feed_columns
+from feed_stats import record_items
+from blocklist import Blocklist
+from imap_download import BodyDownloader, fetch_literals, uid_set
+from lance_indexes import ensure_scalar_index
+from blob_store import BlobStore, media_url
+from mime_walker import replace_cids, walk_message
+from pdf_attachments import store_pdf_attachments
 
 # Setup logging with more detail
 logging.basicConfig(
@@ -39,12 +51,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Timeout handler
-class TimeoutError(Exception):
-    pass
+# UIDVALIDITY + last fully handled UID, persisted between cron runs
+STATE_FILE = '/home/ubuntu/newspaper_project/sage4_gmail_state.json'
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Operation timed out")
+# Look-back used when there is no valid watermark (first run / mailbox reset)
+BOOTSTRAP_DAYS = 2
+
+# Runs a message that fails to parse / build holds the watermark before it is skipped
+MAX_PROCESS_ATTEMPTS = 3
+
+HEADER_FIELDS = 'BODY.PEEK[HEADER.FIELDS (MESSAGE-ID FROM SUBJECT DATE)]'
+
+# Socket timeout for every IMAP command (replaces the per-email SIGALRM)
+IMAP_TIMEOUT = 60
+
+
+def parse_sender(msg):
+    """Decoded subject, From field, sender name and sender email of a message"""
+    subject = str(make_header(decode_header(msg['Subject'] or 'No Subject')))
+    from_field = str(make_header(decode_header(msg['From'] or '')))
+    sender_name = from_field.split('<')[0].strip().strip('"')
+    sender_email = re.search(r'<(.+?)>', from_field)
+    sender_email = sender_email.group(1) if sender_email else from_field
+    return subject, from_field, sender_name, sender_email
 
 class RobustGmailFetcher:
     def __init__(self):
@@ -60,11 +89,16 @@ class RobustGmailFetcher:
         
         # Connection settings
         self.imap = None
+        self.uidvalidity = None
         self.db = None
         self.table = None
+        self.blocklist = None
         
-        # Batch settings
-        self.batch_limit = 25  # Safer batch size
+        # Batch settings - how many new emails one run downloads
+        self.batch_limit = int(os.getenv('GMAIL_BATCH_LIMIT', '500'))
+        self.fetch_chunk_size = 20  # emails per UID FETCH command
+        self.imap_connections = int(os.getenv('GMAIL_IMAP_CONNECTIONS', '2'))
+        self.save_every = 50  # records per table.add
         self.max_retries = 3
         self.retry_delay = 5
         
@@ -77,6 +111,9 @@ class RobustGmailFetcher:
             'errors': 0
         }
         
+        # Content-addressed store for inline images and PDF attachments
+        self.blob_store = BlobStore()
+        
         # Initialize connections
         self.connect_to_database()
     
@@ -87,6 +124,12 @@ class RobustGmailFetcher:
                 logger.info(f"Connecting to LanceDB (attempt {attempt + 1})...")
                 self.db = lancedb.connect("s3://sage-unified-feed-lance/sage4/")
                 self.table = self.db.open_table("unified_feed")
+                # Dedup is a membership query on message_id
+                if 'message_id' in self.table.schema.names:
+                    ensure_scalar_index(self.table, 'message_id')
+                # Blocklist is shared with the SAGE config page (blocked_senders table)
+                self.blocklist = Blocklist(self.db)
+                self.blocklist.refresh(force=True)
                 logger.info("✅ Database connected successfully")
                 return
             except Exception as e:
@@ -97,14 +140,21 @@ class RobustGmailFetcher:
                     logger.error("Failed to connect to database after all retries")
                     sys.exit(1)
     
+    def open_imap(self):
+        """Open a logged-in IMAP connection with INBOX selected"""
+        imap = imaplib.IMAP4_SSL('imap.gmail.com', timeout=IMAP_TIMEOUT)
+        imap.login(self.gmail_user, self.gmail_password)
+        imap.select('INBOX')
+        return imap
+    
     def connect_to_gmail(self):
         """Connect to Gmail with retry logic"""
         for attempt in range(self.max_retries):
             try:
                 logger.info(f"Connecting to Gmail (attempt {attempt + 1})...")
-                self.imap = imaplib.IMAP4_SSL('imap.gmail.com')
-                self.imap.login(self.gmail_user, self.gmail_password)
-                self.imap.select('INBOX')
+                self.imap = self.open_imap()
+                _, data = self.imap.response('UIDVALIDITY')
+                self.uidvalidity = int(data[0]) if data and data[0] else None
                 logger.info("✅ Gmail connected successfully")
                 return
             except Exception as e:
@@ -124,51 +174,13 @@ class RobustGmailFetcher:
         except:
             pass
     
-    def get_blocked_senders(self):
-        """Load blocked senders from file if exists"""
-        blocked_file = '/home/ubuntu/newspaper_project/blocked_senders.json'
-        try:
-            if os.path.exists(blocked_file):
-                with open(blocked_file, 'r') as f:
-                    data = json.load(f)
-                    self.blocked_senders = data.get('blocked_senders', [])
-                    self.blocked_emails = data.get('blocked_emails', [])
-                    self.blocked_patterns = data.get('blocked_patterns', [])
-                    return self.blocked_senders
-        except:
-            pass
-        
-        # Default blocked senders (fallback)
-        self.blocked_senders = [
-            'News Alert (BLOOMBERG)',
-            'BI Alert (BLOOMBERG BI ANALYST)'
-        ]
-        self.blocked_emails = ['noreply@email.com']
-        self.blocked_patterns = ['Bloomberg', 'Barron']
-        return self.blocked_senders
-    
-    def is_blocked_sender(self, from_field, sender_name, subject=""):
-        """Check if sender is blocked using comprehensive patterns"""
-        # Load current blocked configuration
-        self.get_blocked_senders()
-        
-        # Check exact sender name match
-        if sender_name in self.blocked_senders:
+    def is_blocked_sender(self, from_field, sender_name, sender_email, subject=""):
+        """Check if sender is blocked (compiled blocked_senders patterns)"""
+        if self.blocklist.match(sender_name, sender_email, subject):
             return True
         
-        # Check email domain patterns
-        from_lower = from_field.lower()
-        for blocked_email in self.blocked_emails:
-            if blocked_email.lower() in from_lower:
-                return True
-        
-        # Check patterns in sender name and subject
-        combined_text = f"{sender_name} {subject}".lower()
-        for pattern in self.blocked_patterns:
-            if pattern.lower() in combined_text:
-                return True
-        
         # Legacy checks for noreply
+        from_lower = from_field.lower()
         if 'noreply' in from_lower:
             return True
         if 'no-reply' in from_lower:
@@ -213,111 +225,106 @@ class RobustGmailFetcher:
         
         return None, None
     
-    def get_existing_message_ids(self):
-        """Get set of existing message IDs from database"""
-        existing_ids = set()
-        try:
-            df = self.table.to_pandas()
-            
-            for _, row in df[df['source_type'] == 'email'].iterrows():
-                custom = row.get('custom_fields', {})
-                if isinstance(custom, dict) and 'email' in custom:
-                    msg_id = custom['email'].get('message_id')
-                    if msg_id:
-                        existing_ids.add(msg_id)
-            
-            logger.info(f"📋 Loaded {len(existing_ids)} existing message IDs")
-        except Exception as e:
-            logger.warning(f"Could not load existing IDs: {e}")
+    def existing_message_ids(self, message_ids, chunk_size=500):
+        """Subset of message_ids already stored (indexed lookup, no table scan)"""
+        if 'message_id' in self.table.schema.names:
+            column = 'message_id'
+        else:
+            # Before backfill_feed_columns.py added the top-level column
+            column = 'custom_fields.email.message_id'
         
-        return existing_ids
+        existing = set()
+        message_ids = list(message_ids)
+        for start in range(0, len(message_ids), chunk_size):
+            chunk = message_ids[start:start + chunk_size]
+            id_list = ', '.join("'" + m.replace("'", "''") + "'" for m in chunk)
+            df = (
+                self.table.search()
+                .where(f"{column} IN ({id_list})")
+                .select({'message_id': column})
+                .limit(None)
+                .to_pandas()
+            )
+            existing.update(df['message_id'].dropna())
+        return existing
     
-    def get_last_email_date(self):
-        """Get the date of the most recent email in database"""
+    def load_state(self):
+        """Last run's UID watermark ({'uidvalidity', 'last_uid', 'attempts'}) or {}"""
         try:
-            df = self.table.to_pandas()
-            emails = df[df['source_type'] == 'email']
-            
-            if len(emails) == 0:
-                # No emails yet, fetch last 24 hours
-                return datetime.now(self.et) - timedelta(hours=24)
-            
-            df['created_at'] = pd.to_datetime(df['created_at'])
-            most_recent = emails['created_at'].max()
-            
-            if hasattr(most_recent, 'to_pydatetime'):
-                most_recent = most_recent.to_pydatetime()
-            
-            # Make timezone-aware
-            if most_recent.tzinfo is None:
-                most_recent = self.et.localize(most_recent)
-            
-            logger.info(f"📅 Most recent email: {most_recent.strftime('%Y-%m-%d %I:%M %p ET')}")
-            return most_recent
-            
+            if os.path.exists(STATE_FILE):
+                with open(STATE_FILE, 'r') as f:
+                    return json.load(f)
         except Exception as e:
-            logger.warning(f"Could not get last email date: {e}")
-            return datetime.now(self.et) - timedelta(hours=6)
+            logger.warning(f"Could not read fetch state: {e}")
+        return {}
     
-    def extract_html_with_images(self, msg):
-        """Extract HTML content with embedded images converted to data URLs"""
+    def save_state(self, last_uid, attempts=None):
+        """Persist the UID watermark and failed-processing attempts per UID (atomic replace)"""
+        tmp_file = STATE_FILE + '.tmp'
+        attempts = {str(uid): count for uid, count in (attempts or {}).items() if uid > last_uid}
+        with open(tmp_file, 'w') as f:
+            json.dump({'uidvalidity': self.uidvalidity, 'last_uid': last_uid, 'attempts': attempts}, f)
+        os.replace(tmp_file, STATE_FILE)
+        logger.info(f"📌 Watermark: UID {last_uid} (UIDVALIDITY {self.uidvalidity})")
+    
+    def search_candidate_uids(self, state):
+        """UIDs above the watermark, or a short date window when there is none"""
+        if state.get('uidvalidity') == self.uidvalidity and state.get('last_uid') is not None:
+            last_uid = int(state['last_uid'])
+            logger.info(f"🔍 Searching for emails after UID {last_uid}")
+            result, data = self.imap.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+            floor = last_uid
+        else:
+            if state:
+                logger.warning("UIDVALIDITY changed - ignoring the stored watermark")
+            search_date = (datetime.now(self.et) - timedelta(days=BOOTSTRAP_DAYS)).strftime('%d-%b-%Y')
+            logger.info(f"🔍 No watermark - searching for emails since {search_date}")
+            result, data = self.imap.uid('SEARCH', None, f'(SINCE {search_date})')
+            floor = 0
+        
+        if result != 'OK':
+            raise RuntimeError(f"Search failed: {result}")
+        
+        # "n:*" always returns the highest UID, even when it is below n
+        return sorted(uid for uid in map(int, data[0].split()) if uid > floor)
+    
+    def fetch_headers(self, uids):
+        """Message-ID / From / Subject / Date for all candidates in one UID FETCH"""
+        result, data = self.imap.uid('FETCH', uid_set(uids), f'(UID {HEADER_FIELDS})')
+        if result != 'OK':
+            raise RuntimeError(f"Header fetch failed: {result}")
+        
+        headers = {}
+        parser = BytesHeaderParser()
+        for uid, header in fetch_literals(data):
+            headers[uid] = parser.parsebytes(header)
+        return headers
+    
+    def extract_html_with_images(self, parts):
+        """HTML content with embedded images stored as blobs (/media/<hash>)"""
         try:
-            html_content = ""
-            plain_content = ""
-            embedded_images = {}
+            html_content = parts.html or ""
             
-            # First pass: collect embedded images
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_disposition = str(part.get("Content-Disposition", ""))
-                    content_id = part.get("Content-ID", "")
-                    
-                    if content_id and part.get_content_maintype() == 'image':
-                        try:
-                            image_data = part.get_payload(decode=True)
-                            image_type = part.get_content_subtype()
-                            
-                            # Create data URL
-                            data_url = f"data:image/{image_type};base64,{base64.b64encode(image_data).decode()}"
-                            
-                            # Store by Content-ID (remove < >)
-                            cid = content_id.strip('<>')
-                            embedded_images[cid] = data_url
-                        except:
-                            pass
-                
-                # Second pass: extract HTML
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition", ""))
-                    
-                    if "attachment" in content_disposition:
-                        continue
-                    
-                    if content_type == "text/html":
-                        try:
-                            charset = part.get_content_charset() or 'utf-8'
-                            html_content = part.get_payload(decode=True).decode(charset, errors='ignore')
-                            
-                            # Replace CID references with data URLs
-                            for cid, data_url in embedded_images.items():
-                                html_content = html_content.replace(f'cid:{cid}', data_url)
-                            
-                            break
-                        except:
-                            pass
-                    elif content_type == "text/plain" and not html_content:
-                        try:
-                            charset = part.get_content_charset() or 'utf-8'
-                            plain_content = part.get_payload(decode=True).decode(charset, errors='ignore')
-                        except:
-                            pass
+            def image_url(cid):
+                if cid not in parts.inline_images:
+                    return None
+                image_data, image_type = parts.inline_images[cid]
+                # Store once by content hash; inline data URL only if the store is unreachable
+                try:
+                    return media_url(self.blob_store.put(image_data))
+                except Exception as e:
+                    logger.warning(f"Blob store write failed, inlining image: {e}")
+                    return f"data:image/{image_type};base64,{base64.b64encode(image_data).decode()}"
+            
+            # Replace CID references with blob URLs (one scan, only referenced images are stored)
+            if html_content and parts.inline_images:
+                html_content = replace_cids(html_content, image_url)
             
             # Return HTML if available, otherwise plain text
             if html_content:
                 return html_content[:200000]  # Limit size
-            elif plain_content:
-                return f"<pre>{plain_content[:50000]}</pre>"
+            elif parts.plain:
+                return f"<pre>{parts.plain[:50000]}</pre>"
             else:
                 return "<p>No content available</p>"
                 
@@ -325,41 +332,17 @@ class RobustGmailFetcher:
             logger.warning(f"Error extracting HTML: {e}")
             return "<p>Error extracting content</p>"
     
-    def extract_plain_text(self, msg):
-        """Extract plain text from email"""
-        try:
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        charset = part.get_content_charset() or 'utf-8'
-                        return part.get_payload(decode=True).decode(charset, errors='ignore')[:10000]
-            else:
-                if msg.get_content_type() == "text/plain":
-                    charset = msg.get_content_charset() or 'utf-8'
-                    return msg.get_payload(decode=True).decode(charset, errors='ignore')[:10000]
-        except:
-            pass
-        return ""
+    def extract_plain_text(self, parts):
+        """Plain text from email"""
+        return (parts.text or "")[:10000]
     
     def process_email(self, msg, msg_id):
-        """Process a single email message"""
+        """Process a single email message into a record; raises if it cannot be processed"""
         try:
-            # Extract headers
-            subject = str(make_header(decode_header(msg['Subject'] or 'No Subject')))
-            from_field = str(make_header(decode_header(msg['From'] or '')))
+            # Extract headers (blocked senders were already dropped at the header phase)
+            subject, from_field, sender_name, sender_email = parse_sender(msg)
             date_str = msg['Date']
             
-            # Parse sender
-            sender_name = from_field.split('<')[0].strip().strip('"')
-            sender_email = re.search(r'<(.+?)>', from_field)
-            sender_email = sender_email.group(1) if sender_email else from_field
-            
-            # Check if blocked
-            if self.is_blocked_sender(from_field, sender_name, subject):
-                self.stats['skipped_blocked'] += 1
-                logger.info(f"  🚫 Blocked: {sender_name[:30]} - {subject[:30]}")
-                return None
-            
             # Parse date
             try:
                 email_date = parsedate_to_datetime(date_str)
@@ -373,8 +356,10 @@ class RobustGmailFetcher:
                 email_date = datetime.now(pytz.utc)
             
             # Extract content
-            html_content = self.extract_html_with_images(msg)
-            text_content = self.extract_plain_text(msg)
+            parts = walk_message(msg)  # single pass over the MIME tree
+            html_content = self.extract_html_with_images(parts)
+            text_content = self.extract_plain_text(parts)
+            pdf_attachments = store_pdf_attachments(self.blob_store, parts.attachments)
             
             # Detect sender tag
             sender_tag, sender_category = self.detect_sender_tag(
@@ -395,6 +380,7 @@ class RobustGmailFetcher:
                 'id': unique_id,
                 'source_type': 'email',
                 'source_id': msg_id,
+                'message_id': msg_id,
                 'created_at': email_date_naive,
                 
                 
@@ -404,6 +390,7 @@ class RobustGmailFetcher:
                 'subject': subject[:500],
                 'content_text': text_content,
                 'content_html': html_content,
+                'pdf_attachments': json.dumps(pdf_attachments) if pdf_attachments else None,
                 'custom_fields': {
                     'Feed_Type_Flag': 'email',
                     'SenderTag': sender_tag,
@@ -411,7 +398,7 @@ class RobustGmailFetcher:
                         'message_id': msg_id,
                         'sender_name': sender_name,
                         'sender_email': sender_email,
-                        'has_attachments': False
+                        'has_attachments': bool(parts.attachments)
                     },
                     'media': {
                         'images': [],
@@ -421,12 +408,56 @@ class RobustGmailFetcher:
                 }
             }
             
+            # Materialized filter columns (sender_tag / feed_type_flag / is_goldman)
+            record.update(derive_feed_columns(record))
+            
             return record
             
         except Exception as e:
-            logger.error(f"Error processing email: {e}")
-            self.stats['errors'] += 1
-            return None
+            # Re-raised: fetch_emails counts it and keeps the UID pending for a retry
+            logger.error(f"Error processing email {msg_id}: {e}")
+            raise
+    
+    def conform_to_schema(self, df):
+        """Drop columns the table doesn't have yet (e.g. before the feed column backfill)"""
+        extra = [c for c in df.columns if c not in self.table.schema.names]
+        if extra:
+            logger.warning(f"Table has no {extra} columns yet - run backfill_feed_columns.py; saving without them")
+            df = df.drop(columns=extra)
+        return df
+    
+    def save_emails(self, new_emails, record_uids):
+        """Add records to unified_feed; returns the UIDs that could not be saved"""
+        if not new_emails:
+            return []
+        
+        logger.info(f"💾 Saving {len(new_emails)} new emails...")
+        failed_uids = []
+        try:
+            df = self.conform_to_schema(pd.DataFrame(new_emails))
+            self.table.add(df)
+            logger.info(f"✅ Successfully saved {len(new_emails)} emails")
+            saved_emails = new_emails
+        except Exception as e:
+            logger.error(f"Failed to save emails: {e}")
+            # Try saving one by one as fallback
+            saved_emails = []
+            for email_record, uid in zip(new_emails, record_uids):
+                try:
+                    self.table.add(self.conform_to_schema(pd.DataFrame([email_record])))
+                    saved_emails.append(email_record)
+                except:
+                    failed_uids.append(uid)
+            if saved_emails:
+                logger.info(f"✅ Saved {len(saved_emails)}/{len(new_emails)} emails individually")
+        
+        # Keep the feed_stats aggregate in step with what was written
+        try:
+            record_items(self.db, saved_emails)
+        except Exception as e:
+            logger.warning(f"Failed to update feed_stats: {e}")
+        
+        return failed_uids
     
     def fetch_emails(self):
         """Main fetch process with robust error handling"""
@@ -434,25 +465,13 @@ class RobustGmailFetcher:
             # Connect to Gmail
             self.connect_to_gmail()
             
-            # Get existing IDs
-            existing_ids = self.get_existing_message_ids()
-            
-            # Get last email date
-            last_date = self.get_last_email_date()
-            search_date = (last_date - timedelta(hours=1)).strftime('%d-%b-%Y')
-            
-            logger.info(f"🔍 Searching for emails since {search_date}")
-            
-            # Search for emails
-            search_criteria = f'(SINCE {search_date})'
-            result, data = self.imap.search(None, search_criteria)
-            
-            if result != 'OK':
-                logger.error(f"Search failed: {result}")
-                return
-            
-            message_ids = data[0].split()
-            total_found = len(message_ids)
+            # Candidate UIDs above the persisted watermark
+            state = self.load_state()
+            uids = self.search_candidate_uids(state)
+            attempts = {}
+            if state.get('uidvalidity') == self.uidvalidity:
+                attempts = {int(uid): count for uid, count in state.get('attempts', {}).items()}
+            total_found = len(uids)
             
             if total_found == 0:
                 logger.info("📭 No new emails found")
@@ -460,81 +479,92 @@ class RobustGmailFetcher:
             
             logger.info(f"📧 Found {total_found} emails to check")
             
-            # Process in reverse order (newest first)
-            message_ids = message_ids[::-1]
+            # Phase 1: headers only, one round-trip for the whole candidate set
+            headers = self.fetch_headers(uids)
+            message_ids = {
+                uid: header.get('Message-ID', '') or f"no-id-{uid}" for uid, header in headers.items()
+            }
+            existing_ids = self.existing_message_ids(set(message_ids.values()))
+            wanted = []
+            for uid in uids:
+                header = headers.get(uid)
+                if header is None:
+                    continue
+                message_id = message_ids[uid]
+                if message_id in existing_ids:
+                    self.stats['skipped_existing'] += 1
+                    continue
+                subject, from_field, sender_name, sender_email = parse_sender(header)
+                if self.is_blocked_sender(from_field, sender_name, sender_email, subject):
+                    self.stats['skipped_blocked'] += 1
+                    logger.info(f"  🚫 Blocked: {sender_name[:30]} - {subject[:30]}")
+                    continue
+                wanted.append((uid, message_id))
+            
+            logger.info(
+                f"📋 Headers: {len(wanted)} new, {self.stats['skipped_existing']} existing, "
+                f"{self.stats['skipped_blocked']} blocked"
+            )
             
-            # Limit to batch size
-            to_process = message_ids[:self.batch_limit]
-            logger.info(f"⚡ Processing {len(to_process)} emails (batch limit: {self.batch_limit})")
+            # Phase 2: full bodies for new messages only (newest first)
+            wanted.reverse()
+            to_process = wanted[:self.batch_limit]
+            if to_process:
+                logger.info(
+                    f"⚡ Processing {len(to_process)} emails (batch limit: {self.batch_limit}, "
+                    f"{self.imap_connections} connection(s))"
+                )
+            
+            downloader = BodyDownloader(
+                self.imap, self.open_imap, [uid for uid, _ in to_process],
+                chunk_size=self.fetch_chunk_size, connections=self.imap_connections
+            )
             
             new_emails = []
+            record_uids = []
+            failed_uids = []
             
-            for idx, msg_id in enumerate(to_process, 1):
-                try:
-                    # Set timeout for each email
-                    signal.signal(signal.SIGALRM, timeout_handler)
-                    signal.alarm(30)  # 30 second timeout per email
-                    
-                    result, msg_data = self.imap.fetch(msg_id, '(RFC822)')
-                    
-                    if result != 'OK':
-                        continue
-                    
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    
-                    # Get Message-ID
-                    message_id = msg.get('Message-ID', '')
-                    if not message_id:
-                        message_id = f"no-id-{msg_id.decode()}"
-                    
-                    # Check if already exists
-                    if message_id in existing_ids:
-                        self.stats['skipped_existing'] += 1
-                        logger.debug(f"  [{idx}/{len(to_process)}] Skipping existing: {message_id[:30]}")
-                        continue
-                    
-                    # Process the email
-                    record = self.process_email(msg, message_id)
-                    
-                    if record:
+            try:
+                # Parse while the next chunks are still downloading
+                for idx, (uid, raw_email) in enumerate(downloader, 1):
+                    try:
+                        msg = email.message_from_bytes(raw_email)
+                        record = self.process_email(msg, message_ids[uid])
                         new_emails.append(record)
+                        record_uids.append(uid)
                         self.stats['new'] += 1
                         logger.info(f"  ✅ [{idx}/{len(to_process)}] NEW: {record['created_at'].strftime('%I:%M %p')} - {record['author'][:30]}")
+                    except Exception as e:
+                        logger.error(f"  ❌ [{idx}] Error: {e}")
+                        self.stats['errors'] += 1
+                        # Keep the watermark below it for a retry, up to MAX_PROCESS_ATTEMPTS runs
+                        attempts[uid] = attempts.get(uid, 0) + 1
+                        if attempts[uid] < MAX_PROCESS_ATTEMPTS:
+                            failed_uids.append(uid)
+                        else:
+                            logger.error(f"  ⛔ UID {uid} failed {attempts[uid]} times - skipping it")
                     
-                    # Cancel timeout
-                    signal.alarm(0)
+                    self.stats['processed'] += 1
                     
-                except TimeoutError:
-                    logger.warning(f"  ⏱️ [{idx}] Email processing timed out")
-                    self.stats['errors'] += 1
-                    signal.alarm(0)
-                except Exception as e:
-                    logger.error(f"  ❌ [{idx}] Error: {e}")
-                    self.stats['errors'] += 1
-                    signal.alarm(0)
-                
-                self.stats['processed'] += 1
+                    if len(new_emails) >= self.save_every:
+                        failed_uids += self.save_emails(new_emails, record_uids)
+                        new_emails, record_uids = [], []
+            finally:
+                downloader.close()
             
-            # Save to database if we have new emails
-            if new_emails:
-                logger.info(f"💾 Saving {len(new_emails)} new emails...")
-                try:
-                    df = pd.DataFrame(new_emails)
-                    self.table.add(df)
-                    logger.info(f"✅ Successfully saved {len(new_emails)} emails")
-                except Exception as e:
-                    logger.error(f"Failed to save emails: {e}")
-                    # Try saving one by one as fallback
-                    saved = 0
-                    for email_record in new_emails:
-                        try:
-                            self.table.add(pd.DataFrame([email_record]))
-                            saved += 1
-                        except:
-                            pass
-                    if saved > 0:
-                        logger.info(f"✅ Saved {saved}/{len(new_emails)} emails individually")
+            if downloader.failed:
+                logger.warning(f"  ⏱️ {len(downloader.failed)} emails could not be downloaded")
+                self.stats['errors'] += len(downloader.failed)
+            
+            # Save whatever is left
+            failed_uids += self.save_emails(new_emails, record_uids)
+            
+            # UIDs that still need a body download next run
+            pending_uids = failed_uids + downloader.failed + [uid for uid, _ in wanted[self.batch_limit:]]
+            
+            # Advance the watermark up to the first message that still needs work
+            last_uid = min(pending_uids) - 1 if pending_uids else uids[-1]
+            self.save_state(last_uid, attempts)
             
             # Print summary
             logger.info("\n📊 Fetch Summary:")
@@ -545,8 +575,14 @@ class RobustGmailFetcher:
             logger.info(f"  Blocked: {self.stats['skipped_blocked']}")
             logger.info(f"  Errors: {self.stats['errors']}")
             
-            if total_found > self.batch_limit:
-                logger.info(f"  📌 {total_found - self.batch_limit} emails remaining for next run")
+            if pending_uids:
+                logger.info(f"  📌 {len(pending_uids)} emails remaining for next run")
+            
+            # Per-pattern block counts for the SAGE config page
+            try:
+                self.blocklist.flush_hits()
+            except Exception as e:
+                logger.warning(f"Failed to update blocked sender counts: {e}")
             
         except Exception as e:
             logger.error(f"Fatal error in fetch process: {e}")
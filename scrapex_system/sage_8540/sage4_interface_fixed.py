@@ -8,12 +8,26 @@ import os
 import json
 import logging
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 from flask_cors import CORS
 import lancedb
+from lancedb.query import ColumnOrdering
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import re
+import threading
+from collections import OrderedDict
+from feed_index import FeedIndex
+from feed_stats import FeedStatsCache
+from lance_indexes import ensure_scalar_index
+from user_ratings import UserRatings
+from blocklist import BLOCKED_SCHEMA, open_blocked_table
+from blob_store import BlobStore, guess_mimetype, HASH_RE
+from feed_columns import (
+    FEED_COLUMNS, SENDER_RULES, check_goldman_sachs, derive_feed_columns,
+    detect_sender_from_email, determine_feed_type_flag, is_from_sender
+)
 
 # Setup logging
 logging.basicConfig(
@@ -31,6 +45,9 @@ app.config['JSON_SORT_KEYS'] = False
 @app.after_request
 def add_cache_headers(response):
     """Add cache control headers to prevent browser caching"""
+    if request.path.startswith('/media/'):
+        # Content-addressed blobs never change - keep their immutable headers
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '-1'
@@ -48,33 +65,27 @@ def add_cache_headers(response):
     return default
 
 
+def sql_quote(value):
+    """Quote a string literal for a LanceDB filter"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
 class SAGE4Interface:
     """SAGE 4.0 Interface - Single LanceDB with infinite flexibility"""
     
-    # Define sender detection rules (domain -> sender tag)
-    SENDER_RULES = {
-        '@gs.com': 'Goldman Sachs',
-        '@goldmansachs.com': 'Goldman Sachs',
-        '@itau.com.br': 'Itau',
-        '@itau.com': 'Itau',
-        '@itaubba.com.br': 'Itau',
-        '@bloomberg.com': 'Bloomberg',
-        '@bloomberg.net': 'Bloomberg',
-        '@ft.com': 'Financial Times',
-        '@wsj.com': 'Wall Street Journal',
-        '@dowjones.com': 'Wall Street Journal',
-        '@jpmorgan.com': 'J.P. Morgan',
-        '@jpmchase.com': 'J.P. Morgan',
-        '@rosenbergresearch.com': 'Rosenberg Research',
-        '@substack.com': 'Substack Newsletters',
-        '@morganstanley.com': 'Morgan Stanley',
-        '@citi.com': 'Citigroup',
-        '@citigroup.com': 'Citigroup',
-        '@bankofamerica.com': 'Bank of America',
-        '@barclays.com': 'Barclays',
-        '@db.com': 'Deutsche Bank',
-        '@deutschebank.com': 'Deutsche Bank'
-    }
+    # Sender detection rules (domain -> sender tag) live in feed_columns
+    SENDER_RULES = SENDER_RULES
+    
+    # Columns the feed list view needs - content_html is fetched by id only for the current page
+    LIST_COLUMNS = [
+        'id', 'source_type', 'created_at', 'author', 'author_email', 'title', 'subject',
+        'content_text', 'custom_fields',
+        'ai_relevance_score', 'ai_sentiment', 'ai_summary', 'ai_keywords', 'ai_category',
+        'ai_market_impact', 'ai_reasoning', 'user_rating'
+    ] + FEED_COLUMNS
+    
+    # Recently opened emails kept for /api/email/<id>
+    EMAIL_CACHE_SIZE = 256
     
     def safe_float(self, value, default=None):
         """Safely convert a value to float"""
@@ -98,76 +109,57 @@ class SAGE4Interface:
             self.db = lancedb.connect("s3://sage-unified-feed-lance/sage4/")
             self.table = self.db.open_table("unified_feed")
             logger.info("✅ Connected to SAGE 4.0 single database")
+            
+            # Resident feed index - loaded once in the background, then refreshed incrementally
+            self.feed_index = FeedIndex(
+                self.db, "unified_feed", derive_feed_columns, columns=self.LIST_COLUMNS
+            )
+            self.feed_index.warm_up()
+            
+            # Pre-aggregated counts for the stats endpoints
+            self.feed_stats = FeedStatsCache(self.db)
+            
+            # Point lookups for /api/email/<id>: BTree index on id + small LRU
+            ensure_scalar_index(self.table, 'id')
+            self.email_cache = OrderedDict()
+            self.email_cache_lock = threading.Lock()
+            
+            # Rating clicks append to a small side table, folded into the feed in the background
+            self.user_ratings = UserRatings(self.db, "unified_feed")
+            self.user_ratings.start_compactor()
+            
+            # Inline email images (content_html references /media/<hash>)
+            self.blob_store = BlobStore()
         except Exception as e:
             logger.error(f"Failed to connect to SAGE 4.0: {e}")
             raise
     
-    def get_feed(self, filter_tag=None, limit=100, offset=0):
+    def get_feed(self, filter_tag=None, limit=100, offset=0, include_html=False):
         """Get feed items with filtering"""
         try:
-            # ALWAYS refresh table connection to get latest data from S3
-            self.table = self.db.open_table("unified_feed")
-            
-            # Get all data
-            df = self.table.to_pandas()
+            if self.feed_index.ready:
+                # Pick up new rows from S3 (only fragments added since the last seen version)
+                self.table = self.feed_index.refresh()
+                
+                # Slice the pre-sorted posting list for this filter
+                df_page, total_count = self.feed_index.page(filter_tag, offset=offset, limit=limit)
+            else:
+                # Index still warming up - let LanceDB filter, sort and paginate
+                df_page, total_count = self._query_feed_page(filter_tag, limit=limit, offset=offset)
             
-            # Filter by tag if specified
             if filter_tag and filter_tag != 'all':
-                if filter_tag == 'email':
-                    df = df[df['source_type'] == 'email']
-                elif filter_tag == 'twitter':
-                    df = df[df['source_type'] == 'twitter']
-                elif filter_tag == 'newsfeed':
-                    # Filter by Feed_Type_Flag = 'newsfeed'
-                    mask = df.apply(
-                        lambda row: row.get('custom_fields', {}).get('Feed_Type_Flag') == 'newsfeed' 
-                        if isinstance(row.get('custom_fields'), dict) else False,
-                        axis=1
-                    )
-                    df = df[mask]
-                    logger.info(f"Found {mask.sum()} items with Feed_Type_Flag='newsfeed'")
-                elif filter_tag == 'goldman_sachs':
-                    # Check for Goldman Sachs with enhanced email detection
-                    mask = df.apply(
-                        lambda row: self._check_goldman_sachs(
-                            row.get('custom_fields', {}) if isinstance(row.get('custom_fields'), dict) else {},
-                            row
-                        ),
-                        axis=1
-                    )
-                    df = df[mask]
-                elif filter_tag.startswith('sender:'):
-                    # Handle sender-specific filters
-                    sender_name = filter_tag.replace('sender:', '').strip()
-                    logger.info(f"Filtering by sender: {sender_name}")
-                    
-                    # First check stored SenderTag, then fall back to dynamic detection
-                    def check_sender(row):
-                        # Check stored SenderTag first (faster)
-                        custom_fields = row.get('custom_fields', {})
-                        if isinstance(custom_fields, dict):
-                            if custom_fields.get('SenderTag') == sender_name:
-                                return True
-                        
-                        # Fall back to dynamic detection
-                        return self.detect_sender_from_email(row) == sender_name
-                    
-                    mask = df.apply(check_sender, axis=1)
-                    df = df[mask]
-                    logger.info(f"Found {mask.sum()} items for sender: {sender_name} (using stored tags + dynamic detection)")
-            
-            # Sort by created_at
-            df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-            df = df.sort_values('created_at', ascending=False, na_position='last')
-            
-            # Apply pagination
-            total_count = len(df)
-            df_page = df.iloc[offset:offset + limit]
+                logger.info(f"Found {total_count} items for filter: {filter_tag}")
+            
+            # Large HTML bodies are only read for the rows on this page
+            html_by_id = self._fetch_html(df_page['id'].tolist()) if include_html and len(df_page) else {}
             
             # Convert to records
             items = []
             for _, row in df_page.iterrows():
                 item = self._format_item(row)
+                item['user_rating'] = self.user_ratings.overlay(item['id'], item.get('user_rating'))
+                if include_html:
+                    item['content_html'] = html_by_id.get(item['id'], '')
                 items.append(item)
             
             return {
@@ -182,62 +174,122 @@ class SAGE4Interface:
             traceback.print_exc()
             return {'items': [], 'total': 0, 'has_more': False}
     
+    def column_counts(self, column, since=None):
+        """Value counts for a materialized filter column (optionally created_at >= since)"""
+        counts = self.feed_stats.counts(column, since=since)
+        if counts is not None:
+            return counts
+        
+        # feed_stats not built yet - count from the feed itself
+        if self.feed_index.ready:
+            self.table = self.feed_index.refresh()
+            df = self.feed_index.rows(columns=[column, 'created_at'])
+            if since:
+                df = df[df['created_at'] >= pd.Timestamp(since)]
+        elif column in self.table.schema.names:
+            query = self.table.search().select([column])
+            if since:
+                query = query.where(f"created_at >= timestamp {sql_quote(since)}")
+            df = query.limit(None).to_pandas()
+        else:
+            return {}
+        counts = df[column].dropna().value_counts()
+        return {str(k): int(v) for k, v in counts.items()}
+    
+    def _list_columns(self):
+        """List-view columns present in the current table schema"""
+        names = self.table.schema.names
+        return [c for c in self.LIST_COLUMNS if c in names]
+    
+    def _materialized(self, columns=FEED_COLUMNS):
+        """True once backfill_feed_columns.py has added the derived filter columns"""
+        return all(c in self.table.schema.names for c in columns)
+    
+    def _feed_predicate(self, filter_tag):
+        """SQL predicate for a feed filter, evaluated inside LanceDB"""
+        if not filter_tag or filter_tag == 'all':
+            return None
+        
+        # Materialized columns when backfilled, nested custom_fields otherwise
+        if filter_tag in ('email', 'twitter'):
+            return f"source_type = {sql_quote(filter_tag)}"
+        if filter_tag == 'newsfeed':
+            if self._materialized(['feed_type_flag']):
+                return "feed_type_flag = 'newsfeed'"
+            return "custom_fields.Feed_Type_Flag = 'newsfeed'"
+        if filter_tag == 'goldman_sachs' and self._materialized(['is_goldman']):
+            return "is_goldman = true"
+        if filter_tag.startswith('sender:') and self._materialized(['sender_tag', 'detected_sender']):
+            # Stored tag OR detected sender, like the dynamic check
+            sender_name = sql_quote(filter_tag.replace('sender:', '').strip())
+            return f"(sender_tag = {sender_name} OR detected_sender = {sender_name})"
+        return None
+    
+    def _row_filter(self, filter_tag):
+        """
+        (keep(row) -> bool, extra columns it reads) for feed filters with no SQL
+        form before the backfill, or None
+        (check_goldman_sachs: content regex, nested sender / tags; sender:X: detection)
+        """
+        if filter_tag == 'goldman_sachs' and not self._materialized(['is_goldman']):
+            return self._row_is_goldman, []
+        if filter_tag and filter_tag.startswith('sender:') and not self._materialized(['sender_tag', 'detected_sender']):
+            sender_name = filter_tag.replace('sender:', '').strip()
+            return (lambda row: is_from_sender(row, sender_name)), ['content_html']
+        return None
+    
+    def _query_feed_page(self, filter_tag, limit=100, offset=0):
+        """One feed page with projection, filter and created_at ordering pushed down"""
+        row_filter = self._row_filter(filter_tag)
+        if row_filter is not None:
+            keep, extra_columns = row_filter
+            return self._scan_feed_page(keep, limit=limit, offset=offset, extra_columns=extra_columns)
+        
+        predicate = self._feed_predicate(filter_tag)
+        
+        query = self.table.search().select(self._list_columns())
+        if predicate:
+            query = query.where(predicate)
+        df_page = (
+            query.order_by([ColumnOrdering(column_name='created_at', ascending=False)])
+            .offset(offset)
+            .limit(limit)
+            .to_pandas()
+        )
+        total_count = self.table.count_rows(predicate)
+        return df_page, total_count
+    
+    def _row_is_goldman(self, row):
+        custom_fields = row.get('custom_fields')
+        return check_goldman_sachs(custom_fields if isinstance(custom_fields, dict) else {}, row)
+    
+    def _scan_feed_page(self, keep, limit=100, offset=0, extra_columns=()):
+        """Filter (keep(row) -> bool), sort and paginate in pandas - for filters with no SQL form"""
+        columns = self._list_columns()
+        read_columns = columns + [c for c in extra_columns if c in self.table.schema.names]
+        df = self.table.search().select(read_columns).limit(None).to_pandas()
+        if len(df):
+            df = df[df.apply(keep, axis=1).astype(bool)]
+        df = df.sort_values('created_at', ascending=False)
+        return df.iloc[offset:offset + limit][columns].reset_index(drop=True), len(df)
+    
+    def _fetch_html(self, ids):
+        """Read content_html for a handful of ids"""
+        if not ids:
+            return {}
+        id_list = ', '.join(sql_quote(i) for i in ids)
+        df = (
+            self.table.search()
+            .where(f"id IN ({id_list})")
+            .select(['id', 'content_html'])
+            .limit(len(ids))
+            .to_pandas()
+        )
+        return dict(zip(df['id'], df['content_html']))
+    
     def _check_goldman_sachs(self, custom_fields, row_data=None):
         """Check if item is from Goldman Sachs - Enhanced with email domain detection"""
-        # Method 1: Check email domain for @gs.com
-        if row_data is not None:
-            # Check author_email field
-            author_email = row_data.get('author_email', '')
-            if author_email and '@gs.com' in str(author_email).lower():
-                logger.info(f"Detected Goldman Sachs by email: {author_email}")
-                return True
-            
-            # Check author field for email patterns
-            author = row_data.get('author', '')
-            if author and '@gs.com' in str(author).lower():
-                logger.info(f"Detected Goldman Sachs in author field: {author}")
-                return True
-            
-            # Check content_text for From: lines with @gs.com
-            content = row_data.get('content_text', '')
-            if content:
-                import re
-                # Look for email patterns in content
-                from_pattern = r'From:.*@gs\.com'
-                sender_pattern = r'Sender:.*@gs\.com'
-                reply_to_pattern = r'Reply-To:.*@gs\.com'
-                
-                if (re.search(from_pattern, content, re.IGNORECASE) or 
-                    re.search(sender_pattern, content, re.IGNORECASE) or
-                    re.search(reply_to_pattern, content, re.IGNORECASE)):
-                    logger.info("Detected Goldman Sachs by email header in content")
-                    return True
-        
-        if not custom_fields:
-            return False
-        
-        # Method 2: Check sender in custom_fields
-        sender = custom_fields.get('sender', {})
-        if sender:
-            # Check sender email
-            sender_email = sender.get('email', '')
-            if sender_email and '@gs.com' in str(sender_email).lower():
-                logger.info(f"Detected Goldman Sachs by sender email in custom_fields: {sender_email}")
-                return True
-            # Check sender tag
-            if sender.get('tag', '').lower() == 'goldman sachs':
-                return True
-        
-        # Method 3: Check tags (existing)
-        tags = custom_fields.get('tags', {})
-        if tags:
-            custom_tags = tags.get('custom_tags', [])
-            if isinstance(custom_tags, list):
-                for tag in custom_tags:
-                    if 'goldman' in str(tag).lower():
-                        return True
-        
-        return False
+        return check_goldman_sachs(custom_fields, row_data)
     
     def _format_item(self, row):
         """Format item for API response"""
@@ -330,91 +382,18 @@ class SAGE4Interface:
     
     def determine_feed_type_flag(self, row_data):
         """Determine Feed_Type_Flag for an item"""
-        # Check source_type first
-        source_type = row_data.get('source_type', '')
-        if source_type == 'twitter':
-            return 'newsfeed'
-        
-        # Check SenderTag - ONLY Bloomberg Feed (alerts), NOT Bloomberg News (editorial)
-        custom_fields = row_data.get('custom_fields', {})
-        if isinstance(custom_fields, dict):
-            sender_tag = custom_fields.get('SenderTag', '')
-            if sender_tag == 'Bloomberg Feed':  # Alerts/feeds only
-                return 'newsfeed'
-        
-        # Everything else is "other" (including Bloomberg News)
-        return 'other'
+        return determine_feed_type_flag(row_data)
     
     def detect_sender_from_email(self, row_data):
         """Detect sender organization from email patterns"""
-        # Check author field for specific patterns first
-        author = str(row_data.get('author', '')).lower()
-        title = str(row_data.get('title', '')).lower()
-        
-        # PRIORITY 1: Check Itau BEFORE Bloomberg (to prevent mis-tagging)
-        if 'itau' in author or 'itaú' in author or 'itaù' in author:
-            logger.info(f"Detected Itau from author: {row_data.get('author')}")
-            return 'Itau'
-        if 'itau' in title or 'itaú' in title or 'ita ' in title:
-            logger.info(f"Detected Itau from title: {row_data.get('title')}")
-            return 'Itau'
-        
-        # PRIORITY 2: Check Substack (independent media)
-        if 'substack' in author:
-            logger.info(f"Detected Substack from author: {row_data.get('author')}")
-            return 'Substack Newsletters'
-        if 'substack' in title:
-            logger.info(f"Detected Substack from title: {row_data.get('title')}")
-            return 'Substack Newsletters'
-        # Check content for substack.com
-        content_text = str(row_data.get('content_text', '') or '')[:2000].lower()
-        content_html = str(row_data.get('content_html', '') or '')[:2000].lower()
-        if 'substack.com' in content_text or 'substack.com' in content_html:
-            logger.info(f"Detected Substack from content")
-            return 'Substack Newsletters'
-        
-        # PRIORITY 3: Other direct author pattern matching
-        if 'gs macro' in author or 'goldman sachs' in author or 'gs research' in author:
-            logger.info(f"Detected Goldman Sachs from author: {row_data.get('author')}")
-            return 'Goldman Sachs'
-        if 'bloomberg' in author:
-            return 'Bloomberg'
-        if 'wsj' in author or 'wall street journal' in author:
-            return 'Wall Street Journal'
-        if 'rosenberg' in author:
-            return 'Rosenberg Research'
-        if 'ft.com' in author or 'financial times' in author:
-            return 'Financial Times'
-        if 'jpmorgan' in author or 'j.p. morgan' in author or 'jp morgan' in author:
-            return 'J.P. Morgan'
-        
-        # Check various fields for email addresses
-        fields_to_check = ['author_email', 'author', 'content_text']
-        
-        for field in fields_to_check:
-            value = row_data.get(field, '')
-            if value:
-                value_str = str(value).lower()
-                # Check each sender rule
-                for domain, sender_tag in self.SENDER_RULES.items():
-                    if domain in value_str:
-                        logger.info(f"Detected {sender_tag} from {domain} in {field}")
-                        return sender_tag
-        
-        # Check custom_fields
-        custom_fields = row_data.get('custom_fields', {})
-        if isinstance(custom_fields, dict):
-            sender = custom_fields.get('sender', {})
-            if sender and isinstance(sender, dict):
-                sender_email = sender.get('email', '')
-                if sender_email:
-                    email_lower = str(sender_email).lower()
-                    for domain, sender_tag in self.SENDER_RULES.items():
-                        if domain in email_lower:
-                            logger.info(f"Detected {sender_tag} from {domain} in custom_fields")
-                            return sender_tag
-        
-        return None
+        return detect_sender_from_email(row_data)
+    
+    def _is_goldman(self, row, custom_fields):
+        """Materialized is_goldman column, falling back to detection for old rows"""
+        is_goldman = row.get('is_goldman')
+        if is_goldman is None or pd.isna(is_goldman):
+            return self._check_goldman_sachs(custom_fields, row)
+        return bool(is_goldman)
     
     def _get_filter_tags(self, row, custom_fields):
         """Get filter tags for an item"""
@@ -425,31 +404,43 @@ class SAGE4Interface:
         if source_type:
             tags.append(source_type)
         
-        # Check for Goldman Sachs with full row data
-        if self._check_goldman_sachs(custom_fields, row):
+        # Check for Goldman Sachs (materialized is_goldman column when available)
+        if self._is_goldman(row, custom_fields):
             tags.append('goldman_sachs')
         
         return tags
     
     def get_email(self, email_id):
         """Get a single email by ID"""
+        with self.email_cache_lock:
+            if email_id in self.email_cache:
+                self.email_cache.move_to_end(email_id)
+                return self.email_cache[email_id]
+        
+        email_data = self._load_email(email_id)
+        if email_data is not None:
+            with self.email_cache_lock:
+                self.email_cache[email_id] = email_data
+                self.email_cache.move_to_end(email_id)
+                while len(self.email_cache) > self.EMAIL_CACHE_SIZE:
+                    self.email_cache.popitem(last=False)
+        return email_data
+    
+    def _load_email(self, email_id):
+        """Read one email row by id (scalar index lookup) and format it"""
         try:
-            # Get fresh data from database
-            df = self.table.to_pandas()
-            logger.info(f"Looking for email ID: {email_id}")
-            logger.info(f"Total records in database: {len(df)}")
-            
-            # Find the email by ID
-            mask = df['id'] == email_id
-            logger.info(f"Matching records found: {mask.sum()}")
-            
-            if not mask.any():
-                # Debug: show some sample IDs
-                sample_ids = df['id'].head(3).tolist()
-                logger.warning(f"Email {email_id} not found. Sample IDs: {sample_ids}")
+            query = lambda table: table.search().where(f"id = {sql_quote(email_id)}").limit(1).to_pandas()
+            df = query(self.table)
+            if len(df) == 0:
+                # Maybe ingested after our table handle was opened
+                self.table = self.db.open_table("unified_feed")
+                df = query(self.table)
+            
+            if len(df) == 0:
+                logger.warning(f"Email {email_id} not found")
                 return None
             
-            row = df[mask].iloc[0]
+            row = df.iloc[0]
             
             # Get custom fields
             custom_fields = row.get('custom_fields', {})
@@ -494,7 +485,7 @@ class SAGE4Interface:
                 'subject': row.get('title', row.get('subject', '')),
                 'content_html': row.get('content_html', ''),
                 'content_text': row.get('content_text', ''),
-                'is_goldman': self._check_goldman_sachs(custom_fields, row),
+                'is_goldman': self._is_goldman(row, custom_fields),
                 'filter_tags': self._get_filter_tags(row, custom_fields)
             }
             
@@ -554,11 +545,14 @@ def api_feed():
     filter_tag = request.args.get('type') or request.args.get('filter', 'all')
     limit = int(request.args.get('limit', 100))
     offset = int(request.args.get('offset', 0))
+    # List view only needs metadata; pass include_html=1 to also get the page's HTML bodies
+    include_html = request.args.get('include_html', '0').lower() in ('1', 'true', 'yes')
     
     result = sage4.get_feed(
         filter_tag=filter_tag,
         limit=limit,
-        offset=offset
+        offset=offset,
+        include_html=include_html
     )
     
     # Fix timezone - timestamps are stored as UTC, convert to ET
@@ -588,17 +582,10 @@ def config_page():
 def feed_type_stats():
     """Get Feed_Type_Flag statistics"""
     try:
-        # Get all data
-        df = sage4.table.to_pandas()
-        
-        # Count by Feed_Type_Flag
+        # Count by Feed_Type_Flag (feed_stats aggregate, ?since=YYYY-MM-DD for a window)
+        since = request.args.get('since')
         type_counts = {'newsfeed': 0, 'other': 0}
-        
-        for _, row in df.iterrows():
-            custom_fields = row.get('custom_fields', {})
-            if isinstance(custom_fields, dict):
-                feed_type = custom_fields.get('Feed_Type_Flag', 'other')
-                type_counts[feed_type] = type_counts.get(feed_type, 0) + 1
+        type_counts.update(sage4.column_counts('feed_type_flag', since=since))
         
         return jsonify(type_counts)
         
@@ -610,38 +597,9 @@ def feed_type_stats():
 def sender_stats():
     """Get sender statistics with enhanced email detection"""
     try:
-        # Get all data
-        df = sage4.table.to_pandas()
-        
-        # Count by sender using enhanced detection
-        sender_counts = {}
-        detected_senders = []
-        
-        for _, row in df.iterrows():
-            # First check stored SenderTag (priority)
-            custom_fields = row.get('custom_fields', {})
-            sender_tag = None
-            
-            if isinstance(custom_fields, dict):
-                sender_tag = custom_fields.get('SenderTag')
-            
-            if sender_tag:
-                # Use stored SenderTag
-                sender_counts[sender_tag] = sender_counts.get(sender_tag, 0) + 1
-                if sender_tag not in detected_senders:
-                    detected_senders.append(sender_tag)
-            else:
-                # Fall back to dynamic detection for untagged items
-                detected_sender = sage4.detect_sender_from_email(row)
-                
-                if detected_sender:
-                    sender_counts[detected_sender] = sender_counts.get(detected_sender, 0) + 1
-                    if detected_sender not in detected_senders:
-                        detected_senders.append(detected_sender)
-        
-        # Log detection results
-        if detected_senders:
-            logger.info(f"Detected senders by email domain: {detected_senders}")
+        # Count by sender_tag (feed_stats aggregate, ?since=YYYY-MM-DD for a window)
+        since = request.args.get('since')
+        sender_counts = sage4.column_counts('sender_tag', since=since)
         
         return jsonify(sender_counts)
     except Exception as e:
@@ -667,6 +625,33 @@ def api_email(email_id):
         logger.error(f"Error in api_email: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/media/<digest>')
+def media(digest):
+    """Serve a content-addressed blob (inline email image)"""
+    if not HASH_RE.match(digest):
+        return jsonify({'error': 'Invalid media id'}), 404
+    
+    etag = f'"{digest}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        # Email content is untrusted - never let a blob (e.g. SVG) run script
+        'Content-Security-Policy': "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        'X-Content-Type-Options': 'nosniff'
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    
+    try:
+        data = sage4.blob_store.get(digest)
+    except Exception as e:
+        logger.error(f"Error reading media {digest}: {e}")
+        return jsonify({'error': str(e)}), 500
+    if data is None:
+        return jsonify({'error': 'Media not found'}), 404
+    
+    return Response(data, mimetype=guess_mimetype(data), headers=headers)
+
 @app.route('/api/manual-fetch', methods=['POST'])
 def manual_fetch():
     """Manually trigger a Gmail fetch"""
@@ -776,20 +761,11 @@ def set_user_rating():
         
         logger.info(f"Setting user rating for {item_id}: {rating}")
         
-        # Update in LanceDB
-        import lancedb
-        import pandas as pd
-        
-        db = lancedb.connect("s3://sage-unified-feed-lance/sage4/")
-        table = db.open_table("unified_feed")
-        df = table.to_pandas()
+        if not item_id:
+            return jsonify({'success': False, 'error': 'item_id is required'}), 400
         
-        # Update the rating
-        df.loc[df['id'] == item_id, 'user_rating'] = rating
-        
-        # Save back to LanceDB
-        db.drop_table("unified_feed")
-        table = db.create_table("unified_feed", df)
+        # Append to user_ratings - folded into unified_feed by the background compactor
+        sage4.user_ratings.set_rating(item_id, rating)
         
         return jsonify({'success': True, 'message': 'Rating saved'})
         
@@ -818,32 +794,22 @@ def block_sender():
         s3_path = "s3://sage-unified-feed-lance/sage4/"
         db = lancedb.connect(s3_path)
         
-        # Get existing blocked senders
-        try:
-            blocked_table = db.open_table("blocked_senders")
-            blocked_df = blocked_table.to_pandas()
-        except:
-            # Table doesn't exist, create it
-            blocked_df = pd.DataFrame(columns=['pattern', 'pattern_type', 'added_date', 'added_by', 'reason', 'emails_blocked'])
+        # Shared with the Gmail fetcher's blocklist (created from the legacy file if missing)
+        blocked_table = open_blocked_table(db)
         
         # Check if pattern already exists
-        if not blocked_df.empty and pattern in blocked_df['pattern'].values:
+        if blocked_table.count_rows(f"pattern = {sql_quote(pattern)}") > 0:
             return jsonify({'success': False, 'error': 'Pattern already blocked'})
         
-        # Add new pattern
-        new_block = pd.DataFrame([{
+        # Append the new pattern - no rewrite, so hit counts written by the fetcher are kept
+        blocked_table.add(pa.Table.from_pylist([{
             'pattern': pattern,
             'pattern_type': pattern_type,
             'added_date': datetime.now().isoformat(),
             'added_by': 'user',
             'reason': reason,
             'emails_blocked': 0
-        }])
-        
-        blocked_df = pd.concat([blocked_df, new_block], ignore_index=True)
-        
-        # Update table
-        db.create_table("blocked_senders", blocked_df, mode="overwrite")
+        }], schema=BLOCKED_SCHEMA))
         
         logger.info(f"Blocked sender pattern: {pattern} ({pattern_type})")
         return jsonify({'success': True, 'message': f'Blocked {pattern}'})
@@ -862,7 +828,7 @@ def get_blocked_senders():
         
         # Get blocked senders
         try:
-            blocked_table = db.open_table("blocked_senders")
+            blocked_table = open_blocked_table(db)
             blocked_df = blocked_table.to_pandas()
             
             # Convert to list of dicts
@@ -901,22 +867,13 @@ def unblock_sender():
         # Get blocked senders
         try:
             blocked_table = db.open_table("blocked_senders")
-            blocked_df = blocked_table.to_pandas()
             
             # Remove the pattern
-            original_count = len(blocked_df)
-            blocked_df = blocked_df[blocked_df['pattern'] != pattern]
-            
-            if len(blocked_df) == original_count:
+            predicate = f"pattern = {sql_quote(pattern)}"
+            if blocked_table.count_rows(predicate) == 0:
                 return jsonify({'success': False, 'error': 'Pattern not found'})
             
-            # Update table
-            if blocked_df.empty:
-                # If no patterns left, still keep the table with empty dataframe
-                empty_df = pd.DataFrame(columns=['pattern', 'pattern_type', 'added_date', 'added_by', 'reason', 'emails_blocked'])
-                db.create_table("blocked_senders", empty_df, mode="overwrite")
-            else:
-                db.create_table("blocked_senders", blocked_df, mode="overwrite")
+            blocked_table.delete(predicate)
             
             logger.info(f"Unblocked sender pattern: {pattern}")
             return jsonify({'success': True, 'message': f'Unblocked {pattern}'})
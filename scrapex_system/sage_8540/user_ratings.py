@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+SAGE 4.0 User Ratings
+Append-only user_ratings side table for /api/set_user_rating
+
+- A rating click appends one (id, rating, rated_at) row - unified_feed is never rewritten
+- Reads overlay the latest pending rating per id on top of unified_feed.user_rating
+- A background thread periodically folds pending ratings into unified_feed with
+  one keyed merge (user_rating only) and trims the side table
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+RATINGS_TABLE = "user_ratings"
+
+RATINGS_SCHEMA = pa.schema([
+    pa.field('id', pa.string()),
+    pa.field('rating', pa.float64()),
+    pa.field('rated_at', pa.timestamp('us')),
+])
+
+
+class UserRatings:
+    """Rating writes + read-time overlay + background compaction"""
+
+    def __init__(self, db, feed_table_name="unified_feed", compact_interval=60, refresh_interval=10):
+        self.db = db
+        self.feed_table_name = feed_table_name
+        self.compact_interval = compact_interval
+        self.refresh_interval = refresh_interval
+
+        self.table = self._open_or_create()
+        self.version = None
+        self.last_check = 0.0
+        self.pending = {}  # id -> latest rating (side table + this process's writes)
+        self.folded_cutoff = None  # rated_at already merged by the previous compaction
+        self.lock = threading.Lock()
+        self._refresh(force=True)
+
+    def _open_or_create(self):
+        try:
+            return self.db.open_table(RATINGS_TABLE)
+        except ValueError:
+            logger.info(f"➕ Creating {RATINGS_TABLE} table")
+            return self.db.create_table(RATINGS_TABLE, schema=RATINGS_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def set_rating(self, item_id, rating):
+        """Append one rating row (a few KB, no feed rewrite)"""
+        rating = None if rating is None else float(rating)
+        row = pa.Table.from_pylist(
+            [{'id': str(item_id), 'rating': rating, 'rated_at': datetime.utcnow()}],
+            schema=RATINGS_SCHEMA
+        )
+        self.table.add(row)
+        with self.lock:
+            self.pending[str(item_id)] = rating
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _refresh(self, force=False):
+        """Reload pending ratings when another process appended or compacted"""
+        if not force and time.time() - self.last_check < self.refresh_interval:
+            return
+        with self.lock:
+            self.last_check = time.time()
+            table = self.db.open_table(RATINGS_TABLE)
+            self.table = table
+            if table.version == self.version:
+                return
+            df = table.to_pandas()
+            latest = df.sort_values('rated_at', kind='stable').drop_duplicates('id', keep='last')
+            self.pending = {
+                item_id: (None if pd.isna(rating) else float(rating))
+                for item_id, rating in zip(latest['id'], latest['rating'])
+            }
+            self.version = table.version
+
+    def overlay(self, item_id, stored_rating):
+        """Rating to show for an item: pending side-table rating, else the stored one"""
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.warning(f"Could not refresh {RATINGS_TABLE}: {e}")
+        return self.pending.get(str(item_id), stored_rating)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self):
+        """Fold pending ratings into unified_feed.user_rating with a single merge"""
+        table = self.db.open_table(RATINGS_TABLE)
+        df = table.to_pandas()
+        if len(df) == 0:
+            return 0
+
+        cutoff = df['rated_at'].max()
+        if self.folded_cutoff is not None and cutoff <= self.folded_cutoff:
+            # Nothing new since the last pass - just trim what was folded then
+            table.delete(self._folded_filter())
+            return 0
+
+        latest = df.sort_values('rated_at', kind='stable').drop_duplicates('id', keep='last')
+        if self.folded_cutoff is not None:
+            latest = latest[latest['rated_at'] > self.folded_cutoff]
+        updates = pd.DataFrame({
+            'id': latest['id'].astype(str),
+            'user_rating': latest['rating'].astype('float64'),
+        })
+
+        feed = self.db.open_table(self.feed_table_name)
+        if 'user_rating' not in feed.schema.names:
+            feed.add_columns({'user_rating': 'CAST(NULL AS double)'})
+        feed.merge_insert("id").when_matched_update_all().execute(updates)
+
+        # Keep the rows folded in this pass for one more cycle so readers whose
+        # feed view lags behind still see them; drop the previous pass's rows
+        if self.folded_cutoff is not None:
+            table.delete(self._folded_filter())
+        self.folded_cutoff = cutoff
+
+        logger.info(f"⭐ Folded {len(updates)} user ratings into {self.feed_table_name}")
+        return len(updates)
+
+    def _folded_filter(self):
+        return f"rated_at <= timestamp '{self.folded_cutoff.isoformat(sep=' ')}'"
+
+    def start_compactor(self):
+        """Run compact() every compact_interval seconds in a daemon thread"""
+        def _loop():
+            while True:
+                time.sleep(self.compact_interval)
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"User rating compaction failed: {e}")
+
+        thread = threading.Thread(target=_loop, name='user-ratings-compactor', daemon=True)
+        thread.start()
+        return thread